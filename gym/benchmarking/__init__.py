@@ -0,0 +1,2 @@
+from gym.benchmarking.throughput import benchmark_env, run_benchmarks
+from gym.benchmarking.regression import ResultStore, collect, compare
@@ -0,0 +1,394 @@
+"""
+Catches performance regressions between gym versions: records repeated
+benchmark samples per environment (and for a few library functions)
+under the running version, and compares two such recordings with
+confidence intervals.
+"""
+from __future__ import division
+
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import tempfile
+import timeit
+
+import numpy as np
+
+from gym import error, version
+from gym.benchmarking.throughput import _measure_resets, _measure_steps
+from gym.envs import registry
+
+logger = logging.getLogger(__name__)
+
+# For each metric, whether larger values are better
+METRICS = {
+    'steps_per_second': True,
+    'reset_seconds': False,
+    # With the monitor running (video disabled). Compared as is rather
+    # than as the difference from steps_per_second: that difference of
+    # two noisy timings is near zero for most envs, so relative changes
+    # in it would mean nothing.
+    'monitored_steps_per_second': True,
+    'seconds': False,
+}
+
+# Library functions are recorded alongside the environments, under
+# these keys
+MERGE_STATS_FILES = 'gym.monitoring.merge_stats_files'
+WRITE_ARCHIVE = 'gym.scoreboard.api.write_archive'
+
+def _monitored_steps_per_second(spec, steps, max_seconds):
+    env = spec.make()
+    directory = tempfile.mkdtemp()
+    try:
+        env.monitor.start(directory, video_callable=lambda episode_id: False)
+        result = _measure_steps(env, steps, max_seconds)
+        env.monitor.close()
+    finally:
+        shutil.rmtree(directory)
+    return result['steps_per_second']
+
+def sample_env(spec, steps=1000, resets=10, max_seconds=2., seed=0):
+    """Takes one sample of each environment metric.
+
+    Returns:
+        dict: from metric name to value; or None if the environment's
+        optional dependencies are missing
+
+    Raises:
+        Exception: whatever the environment raised otherwise
+    """
+    np.random.seed(seed)
+    try:
+        env = spec.make()
+    except (error.DependencyNotInstalled, ImportError) as e:
+        logger.info('Skipping %s: %s', spec.id, e)
+        return None
+
+    try:
+        reset = _measure_resets(env, resets)
+        step = _measure_steps(env, steps, max_seconds)
+    finally:
+        env.render(close=True)
+    return {
+        'steps_per_second': step['steps_per_second'],
+        'reset_seconds': reset['median'],
+        'monitored_steps_per_second': _monitored_steps_per_second(spec, steps, max_seconds),
+    }
+
+def _write_stats_files(directory, files, episodes):
+    paths = []
+    for i in range(files):
+        path = os.path.join(directory, 'openaigym.episode_batch.{}.stats.json'.format(i))
+        with open(path, 'w') as f:
+            json.dump({
+                'initial_reset_timestamp': float(i),
+                'timestamps': (i + np.arange(episodes) * files).tolist(),
+                'episode_lengths': np.random.randint(1, 200, size=episodes).tolist(),
+                'episode_rewards': np.random.randn(episodes).tolist(),
+            }, f)
+        paths.append(path)
+    return paths
+
+def _write_videos(directory, count, size):
+    videos = []
+    for i in range(count):
+        video_path = os.path.join(directory, 'openaigym.video.{}.json'.format(i))
+        metadata_path = os.path.join(directory, 'openaigym.video.{}.meta.json'.format(i))
+        with open(video_path, 'w') as f:
+            # Recordings compress well, so don't make gzip's job too hard
+            json.dump({'stdout': [[0.5, 'x' * 64 + str(j)] for j in range(size // 80)]}, f)
+        with open(metadata_path, 'w') as f:
+            json.dump({'episode_id': i}, f)
+        videos.append((video_path, metadata_path))
+    return videos
+
+def sample_library(trials=5, stats_files=8, episodes=5000, videos=20, video_bytes=100000):
+    """Times merge_stats_files and write_archive `trials` times each,
+    on synthetic files of the given sizes.
+
+    Returns:
+        dict: from MERGE_STATS_FILES and WRITE_ARCHIVE to {'seconds': samples}
+    """
+    # Imported here since the scoreboard pulls in requests
+    from gym.monitoring.monitor import merge_stats_files
+    from gym.scoreboard.api import write_archive
+
+    timer = timeit.default_timer
+    directory = tempfile.mkdtemp()
+    try:
+        paths = _write_stats_files(directory, stats_files, episodes)
+        recordings = _write_videos(directory, videos, video_bytes)
+        merge_seconds = []
+        archive_seconds = []
+        for _ in range(trials):
+            start = timer()
+            merge_stats_files(paths)
+            merge_seconds.append(timer() - start)
+
+            with tempfile.TemporaryFile() as archive_file:
+                start = timer()
+                write_archive(recordings, archive_file)
+                archive_seconds.append(timer() - start)
+    finally:
+        shutil.rmtree(directory)
+    return {
+        MERGE_STATS_FILES: {'seconds': merge_seconds},
+        WRITE_ARCHIVE: {'seconds': archive_seconds},
+    }
+
+def collect(env_ids=None, trials=5, library=True, **kwargs):
+    """Samples every metric `trials` times, for the given environments
+    (or every registered one) and, if `library` is set, the library
+    functions. Keyword arguments are passed to sample_env.
+
+    Returns:
+        dict: {key: {metric: [samples]}}, keyed by environment id or
+        library function. Environments whose dependencies are missing,
+        or that fail, are left out.
+    """
+    if env_ids is None:
+        specs = sorted(registry.all(), key=lambda spec: spec.id)
+    else:
+        specs = [registry.spec(env_id) for env_id in env_ids]
+
+    results = {}
+    for spec in specs:
+        logger.info('Sampling %s', spec.id)
+        samples = {}
+        for trial in range(trials):
+            try:
+                sample = sample_env(spec, seed=trial, **kwargs)
+            except Exception as e:
+                # Don't keep the trials before the failure either
+                logger.warn('Sampling %s failed: %s', spec.id, e)
+                samples = {}
+                break
+            if sample is None:
+                break
+            for metric, value in sample.items():
+                samples.setdefault(metric, []).append(value)
+        if samples:
+            results[spec.id] = samples
+    if library:
+        results.update(sample_library(trials))
+    return results
+
+class ResultStore(object):
+    """Keeps recorded samples as one JSON file per gym version,
+    `gym-<version>.json` in the given directory.
+
+    Args:
+        directory (str): Where to keep the files (created if needed)
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, gym_version):
+        return os.path.join(self.directory, 'gym-{}.json'.format(gym_version))
+
+    def versions(self):
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[len('gym-'):-len('.json')] for name in os.listdir(self.directory)
+                      if name.startswith('gym-') and name.endswith('.json'))
+
+    def load(self, gym_version):
+        path = self.path(gym_version)
+        if not os.path.exists(path):
+            raise error.Error('No benchmark results for gym version {} in {}'.format(gym_version, self.directory))
+        with open(path) as f:
+            return json.load(f)['results']
+
+    def save(self, results, gym_version=None):
+        """Stores `results` (as returned by collect) under the given
+        version, by default the running one. Keys recorded before
+        are replaced; the others are kept."""
+        if gym_version is None:
+            gym_version = version.VERSION
+        try:
+            stored = self.load(gym_version)
+        except error.Error:
+            stored = {}
+        stored.update(results)
+
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        with open(self.path(gym_version), 'w') as f:
+            json.dump({'gym_version': gym_version, 'results': stored}, f, indent=2, sort_keys=True)
+        return self.path(gym_version)
+
+def _betacf(a, b, x):
+    """Continued fraction for the incomplete beta function, by the
+    modified Lentz method"""
+    tiny = 1e-300
+    c = 1.
+    d = 1. - (a + b) * x / (a + 1.)
+    d = 1. / (d if abs(d) > tiny else tiny)
+    h = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        for numerator in [m * (b - m) * x / ((a + m2 - 1.) * (a + m2)),
+                          -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1.))]:
+            d = 1. + numerator * d
+            d = 1. / (d if abs(d) > tiny else tiny)
+            c = 1. + numerator / c
+            c = c if abs(c) > tiny else tiny
+            h *= d * c
+        if abs(d * c - 1.) < 1e-12:
+            break
+    return h
+
+def _betainc(a, b, x):
+    """The regularized incomplete beta function I_x(a, b)"""
+    if x <= 0.:
+        return 0.
+    if x >= 1.:
+        return 1.
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1. - x))
+    if x < (a + 1.) / (a + b + 2.):
+        return front * _betacf(a, b, x) / a
+    return 1. - front * _betacf(b, a, 1. - x) / b
+
+def t_cdf(t, df):
+    """The cumulative distribution function of Student's t distribution"""
+    tail = .5 * _betainc(df / 2., .5, df / (df + t * t))
+    return 1. - tail if t > 0 else tail
+
+def t_quantile(p, df):
+    """The inverse of t_cdf, found by bisection"""
+    if p < .5:
+        return -t_quantile(1. - p, df)
+    low, high = 0., 1.
+    while t_cdf(high, df) < p:
+        high *= 2.
+    for _ in range(100):
+        middle = (low + high) / 2.
+        if t_cdf(middle, df) < p:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2.
+
+def mean_difference_interval(baseline, candidate, confidence=0.95):
+    """Welch's confidence interval for mean(candidate) - mean(baseline),
+    which doesn't assume the two have equal variances.
+
+    Returns:
+        (low, high) tuple; or None with fewer than two samples on either side
+    """
+    if len(baseline) < 2 or len(candidate) < 2:
+        return None
+    baseline = np.asarray(baseline, dtype=np.float64)
+    candidate = np.asarray(candidate, dtype=np.float64)
+    difference = candidate.mean() - baseline.mean()
+    baseline_error = baseline.var(ddof=1) / len(baseline)
+    candidate_error = candidate.var(ddof=1) / len(candidate)
+    standard_error = math.sqrt(baseline_error + candidate_error)
+    if standard_error == 0:
+        return difference, difference
+    # Welch-Satterthwaite
+    df = (baseline_error + candidate_error) ** 2 / (
+        baseline_error ** 2 / (len(baseline) - 1) + candidate_error ** 2 / (len(candidate) - 1))
+    margin = t_quantile(1. - (1. - confidence) / 2., df) * standard_error
+    return difference - margin, difference + margin
+
+def compare(baseline, candidate, confidence=0.95, min_change=0.1):
+    """Compares every metric recorded in both result sets.
+
+    A metric has regressed (or improved) when the whole confidence
+    interval of its change in mean lies on the worse (or better) side
+    of zero, and the observed change is at least `min_change` of the
+    baseline mean, so that tiny but consistent differences don't
+    count.
+
+    Returns:
+        list: one dict per metric, sorted by key and metric, with the
+        'key', 'metric', both means, the relative 'change' and its
+        'interval', and a 'status' of 'regression', 'improvement',
+        'unchanged' or 'insufficient data'
+    """
+    comparisons = []
+    for key in sorted(set(baseline) & set(candidate)):
+        for metric in sorted(set(baseline[key]) & set(candidate[key])):
+            if metric not in METRICS:
+                continue
+            before, after = baseline[key][metric], candidate[key][metric]
+            comparison = {'key': key, 'metric': metric, 'change': None, 'interval': None,
+                          'baseline_mean': float(np.mean(before)) if before else None,
+                          'candidate_mean': float(np.mean(after)) if after else None}
+            comparisons.append(comparison)
+
+            interval = mean_difference_interval(before, after, confidence)
+            scale = abs(comparison['baseline_mean'] or 0.)
+            if interval is None or scale == 0:
+                comparison['status'] = 'insufficient data'
+                continue
+
+            change = (comparison['candidate_mean'] - comparison['baseline_mean']) / scale
+            low, high = interval[0] / scale, interval[1] / scale
+            if not METRICS[metric]:
+                # Lower is better, so flip everything to make larger better
+                change, low, high = -change, -high, -low
+            comparison['change'] = change
+            comparison['interval'] = (low, high)
+            if high < 0 and change <= -min_change:
+                comparison['status'] = 'regression'
+            elif low > 0 and change >= min_change:
+                comparison['status'] = 'improvement'
+            else:
+                comparison['status'] = 'unchanged'
+    return comparisons
+
+def _format_comparison(comparison):
+    if comparison['change'] is None:
+        change = '{:>8}'.format('n/a')
+    else:
+        change = '{:+7.1%} [{:+.1%}, {:+.1%}]'.format(comparison['change'], *comparison['interval'])
+    return '{:<45} {:<26} {:<30} {}'.format(comparison['key'], comparison['metric'], change, comparison['status'])
+
+def main(argv=None):
+    """The command line interface of examples/scripts/benchmark_regression.
+
+    Returns:
+        int: the exit status; 1 if `compare` found any regressions
+    """
+    parser = argparse.ArgumentParser(description='Records benchmark samples per gym version, and compares them.')
+    parser.add_argument('--store', default='benchmarks', help='Directory holding the recorded results')
+    subparsers = parser.add_subparsers(dest='command')
+
+    record = subparsers.add_parser('record', help='Samples the benchmarks under the running gym version')
+    record.add_argument('env', nargs='*', help='Environment ids (default: all registered)')
+    record.add_argument('--trials', type=int, default=5)
+    record.add_argument('--steps', type=int, default=1000)
+    record.add_argument('--resets', type=int, default=10)
+    record.add_argument('--max_seconds', type=float, default=2.)
+    record.add_argument('--no_library', action='store_true', help="Don't time merge_stats_files and write_archive")
+    record.add_argument('--version', default=version.VERSION, help='Record under this version instead')
+
+    compare_parser = subparsers.add_parser('compare', help='Compares two recorded versions')
+    compare_parser.add_argument('baseline', help='The gym version to compare against')
+    compare_parser.add_argument('candidate', nargs='?', default=version.VERSION, help='The gym version to check (default: the running one)')
+    compare_parser.add_argument('--confidence', type=float, default=0.95)
+    compare_parser.add_argument('--min_change', type=float, default=0.1, help='Smallest relative change to report')
+
+    args = parser.parse_args(argv)
+    store = ResultStore(args.store)
+
+    if args.command == 'record':
+        results = collect(args.env or None, trials=args.trials, library=not args.no_library,
+                          steps=args.steps, resets=args.resets, max_seconds=args.max_seconds)
+        print('Wrote {}'.format(store.save(results, args.version)))
+        return 0
+
+    comparisons = compare(store.load(args.baseline), store.load(args.candidate),
+                          confidence=args.confidence, min_change=args.min_change)
+    for comparison in comparisons:
+        print(_format_comparison(comparison))
+    regressions = [comparison for comparison in comparisons if comparison['status'] == 'regression']
+    print('{} regression(s) from {} to {} at {:.0%} confidence'.format(len(regressions), args.baseline, args.candidate, args.confidence))
+    return 1 if regressions else 0
@@ -0,0 +1,72 @@
+import shutil
+import tempfile
+
+import numpy as np
+
+from gym import envs
+from gym.benchmarking import regression
+from gym.benchmarking.regression import ResultStore, collect, compare
+
+def test_t_quantile():
+    # Reference values from a t table
+    for p, df, expected in [(0.975, 1, 12.706), (0.975, 10, 2.228), (0.95, 4, 2.132), (0.995, 30, 2.750)]:
+        assert abs(regression.t_quantile(p, df) - expected) < 1e-3
+    assert abs(regression.t_quantile(0.025, 10) + 2.228) < 1e-3
+
+def test_compare():
+    np.random.seed(0)
+    baseline = {'CartPole-v0': {'steps_per_second': list(1000 + np.random.randn(10)),
+                                'reset_seconds': list(1e-5 + 1e-7 * np.random.randn(10)),
+                                'monitored_steps_per_second': list(800 + np.random.randn(10))},
+                'Only-v0': {'steps_per_second': [1., 2.]}}
+    candidate = {'CartPole-v0': {'steps_per_second': list(500 + np.random.randn(10)),
+                                 'reset_seconds': list(0.5e-5 + 1e-7 * np.random.randn(10)),
+                                 'monitored_steps_per_second': [400.]}}
+    statuses = {comparison['metric']: comparison['status'] for comparison in compare(baseline, candidate)}
+    assert statuses == {'steps_per_second': 'regression', 'reset_seconds': 'improvement',
+                        'monitored_steps_per_second': 'insufficient data'}
+
+def test_noise_is_not_a_regression():
+    baseline = {'Env-v0': {'reset_seconds': [0.5, 1.5, 1., 0.8, 1.2]}}
+    candidate = {'Env-v0': {'reset_seconds': [0.6, 1.6, 1.1, 0.9, 1.3]}}
+    assert compare(baseline, candidate)[0]['status'] == 'unchanged'
+    # Nor is a consistent but small change
+    baseline = {'Env-v0': {'reset_seconds': [1., 1.001, 1.002]}}
+    candidate = {'Env-v0': {'reset_seconds': [1.02, 1.021, 1.022]}}
+    assert compare(baseline, candidate)[0]['status'] == 'unchanged'
+
+def test_collect():
+    results = collect(['FrozenLake-v0'], trials=2, steps=20, resets=2, library=False)
+    assert list(results.keys()) == ['FrozenLake-v0']
+    assert sorted(results['FrozenLake-v0'].keys()) == sorted(['steps_per_second', 'reset_seconds', 'monitored_steps_per_second'])
+    assert all(len(samples) == 2 for samples in results['FrozenLake-v0'].values())
+
+def test_failing_env_is_left_out():
+    # An unknown map fails with a KeyError, not a missing dependency
+    envs.register(id='BrokenFrozenLake-v0', entry_point='gym.envs.toy_text:FrozenLakeEnv',
+                  kwargs={'map_name': 'missing'})
+    try:
+        results = collect(['BrokenFrozenLake-v0', 'FrozenLake-v0'], trials=1, steps=20, resets=2, library=False)
+    finally:
+        del envs.registry.env_specs['BrokenFrozenLake-v0']
+    assert list(results.keys()) == ['FrozenLake-v0']
+
+def test_sample_library():
+    results = regression.sample_library(trials=2, stats_files=2, episodes=10, videos=2, video_bytes=1000)
+    assert len(results[regression.MERGE_STATS_FILES]['seconds']) == 2
+    assert len(results[regression.WRITE_ARCHIVE]['seconds']) == 2
+
+def test_store_and_main():
+    directory = tempfile.mkdtemp()
+    try:
+        store = ResultStore(directory)
+        store.save({'Env-v0': {'steps_per_second': [100., 101., 99.]}}, '0.0.1')
+        store.save({'Other-v0': {'steps_per_second': [1., 1.]}}, '0.0.1')
+        store.save({'Env-v0': {'steps_per_second': [50., 51., 49.]}}, '0.0.2')
+        assert store.versions() == ['0.0.1', '0.0.2']
+        assert sorted(store.load('0.0.1').keys()) == ['Env-v0', 'Other-v0']
+
+        assert regression.main(['--store', directory, 'compare', '0.0.1', '0.0.2']) == 1
+        assert regression.main(['--store', directory, 'compare', '0.0.2', '0.0.1']) == 0
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,33 @@
+import json
+
+from gym import envs
+from gym.benchmarking import benchmark_env, run_benchmarks
+from gym.envs.registration import EnvSpec
+
+def test_benchmark_env():
+    result = benchmark_env(envs.spec('FrozenLake-v0'), steps=50, resets=3, renders=2, memory_instances=2)
+    assert result['status'] == 'ok'
+    assert result['step']['steps'] == 50
+    assert result['step']['steps_per_second'] > 0
+    assert result['reset_seconds']['count'] == 3
+    assert list(result['render_seconds'].keys()) == ['ansi']
+    assert result['render_seconds']['ansi']['count'] == 2
+
+def test_max_seconds():
+    result = benchmark_env(envs.spec('CartPole-v0'), steps=100000, max_seconds=0, memory_instances=0)
+    assert result['step']['steps'] == 1
+    assert result['memory_bytes'] is None
+
+def test_missing_dependencies_are_skipped():
+    spec = EnvSpec('NotInstalled-v0', entry_point='gym_nonexistent_module:Env')
+    result = benchmark_env(spec)
+    assert result['status'] == 'skipped'
+
+def test_run_benchmarks():
+    results = run_benchmarks(['FrozenLake-v0', 'Roulette-v0'], steps=20, resets=1, renders=1, memory_instances=0)
+    results = json.loads(json.dumps(results))
+    assert sorted(results['results'].keys()) == ['FrozenLake-v0', 'Roulette-v0']
+    assert results['parameters']['steps'] == 20
+    # Defaults that weren't passed are recorded too
+    assert results['parameters']['max_seconds'] == 5.
+    assert results['parameters']['seed'] == 0
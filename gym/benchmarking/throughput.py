@@ -0,0 +1,183 @@
+"""
+Measures how fast the registered environments run: reset latency,
+step throughput under random actions, the cost of each render mode,
+and memory per instance.
+"""
+import gc
+import inspect
+import logging
+import os
+import platform
+import time
+import timeit
+
+import numpy as np
+
+from gym import error, version
+from gym.envs import registry
+
+logger = logging.getLogger(__name__)
+
+# 'human' rendering opens a window, so it isn't measured
+SKIPPED_RENDER_MODES = ['human']
+
+def _summarize(durations):
+    durations = np.asarray(durations, dtype=np.float64)
+    return {
+        'count': len(durations),
+        'mean': float(durations.mean()),
+        'median': float(np.median(durations)),
+        'min': float(durations.min()),
+    }
+
+def _resident_bytes():
+    """The process's resident set size, or None where /proc isn't available"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+def _measure_memory(spec, instances):
+    """Resident bytes per instance, averaged over making `instances`
+    envs at once. Process memory is only a rough gauge (allocators
+    hold on to freed memory), so treat small values as noise."""
+    gc.collect()
+    before = _resident_bytes()
+    if before is None:
+        return None
+    envs = []
+    for _ in range(instances):
+        env = spec.make()
+        env.reset()
+        envs.append(env)
+    after = _resident_bytes()
+    for env in envs:
+        env.render(close=True)
+    return max(0, after - before) // instances
+
+def _measure_steps(env, steps, max_seconds):
+    """Steps the env with random actions, resetting it whenever an
+    episode ends. Actions are sampled beforehand and resets aren't
+    counted, so only step() is timed."""
+    actions = [env.action_space.sample() for _ in range(steps)]
+    timer = timeit.default_timer
+    elapsed = 0.
+    taken = 0
+    deadline = timer() + max_seconds
+    env.reset()
+    for action in actions:
+        start = timer()
+        _, _, done, _ = env.step(action)
+        end = timer()
+        elapsed += end - start
+        taken += 1
+        if done:
+            env.reset()
+        if end > deadline:
+            break
+    return {
+        'steps': taken,
+        'seconds': elapsed,
+        'steps_per_second': taken / elapsed if elapsed > 0 else None,
+    }
+
+def _measure_resets(env, resets):
+    timer = timeit.default_timer
+    durations = []
+    for _ in range(resets):
+        start = timer()
+        env.reset()
+        durations.append(timer() - start)
+    return _summarize(durations)
+
+def _measure_render(env, mode, renders):
+    timer = timeit.default_timer
+    durations = []
+    env.reset()
+    for _ in range(renders):
+        start = timer()
+        env.render(mode=mode)
+        durations.append(timer() - start)
+        _, _, done, _ = env.step(env.action_space.sample())
+        if done:
+            env.reset()
+    return _summarize(durations)
+
+def benchmark_env(spec, steps=1000, resets=10, renders=10, max_seconds=5., memory_instances=5, seed=0):
+    """Benchmarks the environment of one EnvSpec.
+
+    Args:
+        spec (EnvSpec): The environment to benchmark
+        steps (int): How many random steps to time
+        resets (int): How many resets to time
+        renders (int): How many frames to time per render mode
+        max_seconds (float): Stop stepping after about this long, even if fewer than `steps` were taken
+        memory_instances (int): How many instances to make at once when measuring memory (0 to skip)
+        seed (int): Seed for np.random, which most envs and spaces draw from
+
+    Returns:
+        dict: with 'status' 'ok' and the measurements; 'skipped' if
+        the environment's optional dependencies are missing; or
+        'error', if it failed. The latter two come with a 'reason'.
+    """
+    np.random.seed(seed)
+    try:
+        env = spec.make()
+    except (error.DependencyNotInstalled, ImportError) as e:
+        return {'status': 'skipped', 'reason': str(e)}
+
+    try:
+        result = {'status': 'ok'}
+        result['memory_bytes'] = _measure_memory(spec, memory_instances) if memory_instances > 0 else None
+        result['reset_seconds'] = _measure_resets(env, resets)
+        result['step'] = _measure_steps(env, steps, max_seconds)
+        result['render_seconds'] = {}
+        for mode in env.metadata.get('render.modes', []):
+            if mode in SKIPPED_RENDER_MODES:
+                continue
+            try:
+                result['render_seconds'][mode] = _measure_render(env, mode, renders)
+            except (error.DependencyNotInstalled, ImportError) as e:
+                result['render_seconds'][mode] = {'status': 'skipped', 'reason': str(e)}
+        return result
+    except Exception as e:
+        logger.warn('Benchmarking %s failed: %s', spec.id, e)
+        return {'status': 'error', 'reason': '{}: {}'.format(type(e).__name__, e)}
+    finally:
+        try:
+            env.render(close=True)
+        except Exception as e:
+            logger.error('Could not close renderer for %s: %s', spec.id, e)
+
+def run_benchmarks(env_ids=None, **kwargs):
+    """Runs benchmark_env (with the given keyword arguments) on the
+    given environments, or on every registered one.
+
+    Returns:
+        dict: JSON-serializable, holding what was run where under
+        'gym_version', 'python_version', 'platform' and 'timestamp',
+        the benchmark_env arguments in effect (defaults included) under
+        'parameters', and the results by environment id under 'results'.
+    """
+    argspec = inspect.getargspec(benchmark_env)
+    parameters = dict(zip(argspec.args[-len(argspec.defaults):], argspec.defaults))
+    parameters.update(kwargs)
+
+    if env_ids is None:
+        specs = sorted(registry.all(), key=lambda spec: spec.id)
+    else:
+        specs = [registry.spec(env_id) for env_id in env_ids]
+
+    results = {}
+    for spec in specs:
+        logger.info('Benchmarking %s', spec.id)
+        results[spec.id] = benchmark_env(spec, **kwargs)
+    return {
+        'gym_version': version.VERSION,
+        'python_version': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'parameters': parameters,
+        'results': results,
+    }
@@ -53,6 +53,10 @@ class Env(object):
     # 'make'.
     spec = None
 
+    # Set while the env's monitor is running (see Monitor.start).
+    # Until then, step and reset skip the monitor entirely.
+    _monitor_running = False
+
     @property
     def monitor(self):
         if not hasattr(self, '_monitor'):
@@ -77,10 +81,9 @@ class Env(object):
         done (boolean): whether the episode has ended, in which case further step() calls will return undefined results
         info (dict): contains auxiliary diagnostic information (helpful for debugging, and sometimes learning)
         """
-        self.monitor._before_step(action)
-        observation, reward, done, info = self._step(action)
-        done = self.monitor._after_step(observation, reward, done, info)
-        return observation, reward, done, info
+        if self._monitor_running:
+            return self._monitor._step(action)
+        return self._step(action)
 
     def reset(self):
         """
@@ -90,10 +93,9 @@ class Env(object):
         -------
         observation (object): the initial observation of the space. (Initial reward is assumed to be 0.)
         """
-        self.monitor._before_reset()
-        observation = self._reset()
-        self.monitor._after_reset(observation)
-        return observation
+        if self._monitor_running:
+            return self._monitor._reset()
+        return self._reset()
 
     def render(self, mode='human', close=False):
         """Renders the environment.
@@ -12,11 +12,20 @@ except ImportError:
 import logging
 logger = logging.getLogger(__name__)
 
-def to_rgb(ale):
-    (screen_width,screen_height) = ale.getScreenDims()
-    arr = np.zeros((screen_height, screen_width, 4), dtype=np.uint8)
-    ale.getScreenRGB(arr) # says rgb but actually bgr
-    return arr[:,:,[2, 1, 0]].copy()
+def to_rgb(ale, out=None):
+    """Returns the screen as an RGB array.
+
+    If you pass a preallocated (height, width, 4) uint8 buffer as
+    `out`, the screen is read into it and the result is a view of it,
+    which the next call overwrites. Otherwise, the result is a fresh
+    array."""
+    if out is None:
+        (screen_width,screen_height) = ale.getScreenDims()
+        arr = np.zeros((screen_height, screen_width, 4), dtype=np.uint8)
+        ale.getScreenRGB(arr) # says rgb but actually bgr
+        return np.ascontiguousarray(arr[:,:,2::-1])
+    ale.getScreenRGB(out)
+    return out[:,:,2::-1]
 
 def to_ram(ale):
     ram_size = ale.getRAMSize()
@@ -85,10 +94,13 @@ class AtariEnv(gym.Env, utils.EzPickle):
             if self.viewer is not None:
                 self.viewer.close()
             return
-        img = self._get_image()
         if mode == 'rgb_array':
-            return img
-        elif mode is 'human':
+            # A channel-reversed view of a fresh BGRA buffer, which the
+            # video recorder can pass on without converting
+            (screen_width,screen_height) = self.ale.getScreenDims()
+            return to_rgb(self.ale, np.empty((screen_height, screen_width, 4), dtype=np.uint8))
+        img = self._get_image()
+        if mode is 'human':
             from gym.envs.classic_control import rendering
             if self.viewer is None:
                 self.viewer = rendering.SimpleImageViewer()
@@ -1,5 +1,7 @@
 """classic Acrobot task"""
 from gym import core, spaces
+from gym.vector import BatchedVectorEnv
+import math
 import numpy as np
 import time
 
@@ -89,31 +91,26 @@ class AcrobotEnv(core.Env):
         return self.state
 
     def _step(self, a):
-        s = self.state
         torque = self.AVAIL_TORQUE[a]
 
         # Add noise to the force action
         if self.torque_noise_max > 0:
             torque += np.random.uniform(-self.torque_noise_max, self.torque_noise_max)
 
-        # Now, augment the state with our force action so it can be passed to
-        # _dsdt
-        s_augmented = np.append(s, torque)
-
-        ns = rk4(self._dsdt, s_augmented, [0, self.dt])
-        # only care about final timestep of integration returned by integrator
-        ns = ns[-1]
-        ns = ns[:4]  # omit action
+        if getattr(self, '_integrator', None) is None or self._integrator.book_or_nips != self.book_or_nips:
+            self._integrator = AcrobotIntegrator(1, self.book_or_nips, self)
+        ns = self._integrator.step_one(self.state, torque, self.dt)
         # ODEINT IS TOO SLOW!
         # ns_continuous = integrate.odeint(self._dsdt, self.s_continuous, [0, self.dt])
         # self.s_continuous = ns_continuous[-1] # We only care about the state
         # at the ''final timestep'', self.dt
 
-        ns[0] = wrap(ns[0], -np.pi, np.pi)
-        ns[1] = wrap(ns[1], -np.pi, np.pi)
-        ns[2] = bound(ns[2], -self.MAX_VEL_1, self.MAX_VEL_1)
-        ns[3] = bound(ns[3], -self.MAX_VEL_2, self.MAX_VEL_2)
-        self.state = ns.copy()
+        self.state = np.array([
+            wrap(ns[0], -np.pi, np.pi),
+            wrap(ns[1], -np.pi, np.pi),
+            bound(ns[2], -self.MAX_VEL_1, self.MAX_VEL_1),
+            bound(ns[3], -self.MAX_VEL_2, self.MAX_VEL_2),
+        ])
         terminal = self._terminal()
         reward = -1. if not terminal else 0.
         return (np.array(self.state), reward, terminal, {})
@@ -190,11 +187,302 @@ class AcrobotEnv(core.Env):
             circ.set_color(.8, .8, 0)
             circ.add_attr(jtransform)
 
-        self.viewer.render()
-        if mode == 'rgb_array':
-            return self.viewer.get_array()
-        elif mode is 'human':
-            pass
+        return self.viewer.render(return_rgb_array = mode=='rgb_array')
+
+class AcrobotIntegrator(object):
+    """Fixed-step RK4 specialized to the acrobot dynamics.
+
+    Produces the same numbers as `rk4(env._dsdt, ...)` (the arithmetic
+    is performed in the same order), without allocating the augmented
+    state, the `yout` array and the intermediate arrays of the generic
+    integrator:
+
+    - `step` integrates a whole batch of acrobots at once, working in
+      preallocated buffers. States are laid out as (4, N) arrays, so
+      that each of theta1, theta2, dtheta1 and dtheta2 is a contiguous
+      row.
+    - `step_one` integrates a single acrobot with plain float
+      arithmetic, which is what AcrobotEnv._step uses; for one state,
+      the per-call overhead of NumPy would dominate.
+
+    Args:
+        n (int): The number of acrobots integrated per call
+        book_or_nips (str): Which dynamics equations to use, as in AcrobotEnv
+        env (Optional[AcrobotEnv]): Where to read the physical constants from (defaults to the AcrobotEnv class)
+    """
+
+    def __init__(self, n, book_or_nips="book", env=None):
+        if env is None:
+            env = AcrobotEnv
+        self.n = n
+        self.book_or_nips = book_or_nips
+        self.max_vel_1 = env.MAX_VEL_1
+        self.max_vel_2 = env.MAX_VEL_2
+
+        m1 = env.LINK_MASS_1
+        m2 = env.LINK_MASS_2
+        l1 = env.LINK_LENGTH_1
+        lc1 = env.LINK_COM_POS_1
+        lc2 = env.LINK_COM_POS_2
+        I1 = env.LINK_MOI
+        I2 = env.LINK_MOI
+        g = 9.8
+        # Constant subexpressions of AcrobotEnv._dsdt, grouped the way
+        # Python evaluates them there.
+        self._m2 = m2
+        self._I1 = I1
+        self._I2 = I2
+        self._d1_a = m1 * lc1 ** 2
+        self._d1_b = l1 ** 2 + lc2 ** 2
+        self._d1_c = 2 * l1 * lc2
+        self._d2_a = lc2 ** 2
+        self._d2_b = l1 * lc2
+        self._phi2_a = m2 * lc2 * g
+        self._phi1_a = - m2 * l1 * lc2
+        self._phi1_b = 2 * m2 * l1 * lc2
+        self._phi1_c = (m1 * lc1 + m2 * l1) * g
+        self._book = m2 * l1 * lc2
+        self._denom = m2 * lc2 ** 2 + I2
+
+        self._k1, self._k2, self._k3, self._k4, self._y = np.zeros((5, 4, n))
+        self._cos2, self._sin2, self._d1, self._d2, self._phi1, self._phi2, self._tmp = np.zeros((7, n))
+
+    def derivs(self, s, a, out):
+        """Writes the time derivative of the states `s` under torques `a` into `out`."""
+        theta1, theta2, dtheta1, dtheta2 = s
+        cos2, sin2, d1, d2 = self._cos2, self._sin2, self._d1, self._d2
+        phi1, phi2, tmp = self._phi1, self._phi2, self._tmp
+        ddtheta1, ddtheta2 = out[2], out[3]
+
+        np.cos(theta2, out=cos2)
+        np.sin(theta2, out=sin2)
+        # d1 = m1 * lc1 ** 2 + m2 * (l1 ** 2 + lc2 ** 2 + 2 * l1 * lc2 * cos(theta2)) + I1 + I2
+        np.multiply(self._d1_c, cos2, out=d1)
+        d1 += self._d1_b
+        d1 *= self._m2
+        d1 += self._d1_a
+        d1 += self._I1
+        d1 += self._I2
+        # d2 = m2 * (lc2 ** 2 + l1 * lc2 * cos(theta2)) + I2
+        np.multiply(self._d2_b, cos2, out=d2)
+        d2 += self._d2_a
+        d2 *= self._m2
+        d2 += self._I2
+        # phi2 = m2 * lc2 * g * cos(theta1 + theta2 - pi / 2)
+        np.add(theta1, theta2, out=phi2)
+        phi2 -= np.pi / 2.
+        np.cos(phi2, out=phi2)
+        phi2 *= self._phi2_a
+        # phi1 = - m2 * l1 * lc2 * dtheta2 ** 2 * sin(theta2)
+        #        - 2 * m2 * l1 * lc2 * dtheta2 * dtheta1 * sin(theta2)
+        #        + (m1 * lc1 + m2 * l1) * g * cos(theta1 - pi / 2) + phi2
+        # (_dsdt squares NumPy scalars, which goes through pow(), hence
+        # np.power rather than np.square here.)
+        np.power(dtheta2, 2., out=phi1)
+        phi1 *= self._phi1_a
+        phi1 *= sin2
+        np.multiply(self._phi1_b, dtheta2, out=tmp)
+        tmp *= dtheta1
+        tmp *= sin2
+        phi1 -= tmp
+        np.subtract(theta1, np.pi / 2, out=tmp)
+        np.cos(tmp, out=tmp)
+        tmp *= self._phi1_c
+        phi1 += tmp
+        phi1 += phi2
+        # ddtheta2 = (a + d2 / d1 * phi1 [- m2 * l1 * lc2 * dtheta1 ** 2 * sin(theta2)] - phi2)
+        #            / (m2 * lc2 ** 2 + I2 - d2 ** 2 / d1)
+        np.divide(d2, d1, out=ddtheta2)
+        ddtheta2 *= phi1
+        ddtheta2 += a
+        if self.book_or_nips != "nips":
+            np.power(dtheta1, 2., out=tmp)
+            tmp *= self._book
+            tmp *= sin2
+            ddtheta2 -= tmp
+        ddtheta2 -= phi2
+        np.power(d2, 2., out=tmp)
+        tmp /= d1
+        np.subtract(self._denom, tmp, out=tmp)
+        ddtheta2 /= tmp
+        # ddtheta1 = -(d2 * ddtheta2 + phi1) / d1
+        np.multiply(d2, ddtheta2, out=ddtheta1)
+        ddtheta1 += phi1
+        np.negative(ddtheta1, out=ddtheta1)
+        ddtheta1 /= d1
+        out[0] = dtheta1
+        out[1] = dtheta2
+        return out
+
+    def derivs_one(self, theta1, theta2, dtheta1, dtheta2, a):
+        """Returns the time derivative of a single state as a 4-tuple."""
+        m2 = self._m2
+        cos2 = math.cos(theta2)
+        sin2 = math.sin(theta2)
+        d1 = self._d1_a + m2 * (self._d1_b + self._d1_c * cos2) + self._I1 + self._I2
+        d2 = m2 * (self._d2_a + self._d2_b * cos2) + self._I2
+        phi2 = self._phi2_a * math.cos(theta1 + theta2 - np.pi / 2.)
+        phi1 = self._phi1_a * dtheta2 ** 2 * sin2 \
+               - self._phi1_b * dtheta2 * dtheta1 * sin2 \
+            + self._phi1_c * math.cos(theta1 - np.pi / 2) + phi2
+        if self.book_or_nips == "nips":
+            ddtheta2 = (a + d2 / d1 * phi1 - phi2) / \
+                (self._denom - d2 ** 2 / d1)
+        else:
+            ddtheta2 = (a + d2 / d1 * phi1 - self._book * dtheta1 ** 2 * sin2 - phi2) \
+                / (self._denom - d2 ** 2 / d1)
+        ddtheta1 = -(d2 * ddtheta2 + phi1) / d1
+        return (dtheta1, dtheta2, ddtheta1, ddtheta2)
+
+    def step_one(self, s, a, dt):
+        """Advances the single state `s` by `dt` under the torque `a`
+        with one RK4 step, returning the new state as a 4-tuple."""
+        derivs = self.derivs_one
+        dt2 = dt / 2.0
+        # Plain floats are much faster than NumPy scalars here
+        s = s0, s1, s2, s3 = [float(x) for x in s]
+        k1 = derivs(s0, s1, s2, s3, a)
+        k2 = derivs(s0 + dt2 * k1[0], s1 + dt2 * k1[1], s2 + dt2 * k1[2], s3 + dt2 * k1[3], a)
+        k3 = derivs(s0 + dt2 * k2[0], s1 + dt2 * k2[1], s2 + dt2 * k2[2], s3 + dt2 * k2[3], a)
+        k4 = derivs(s0 + dt * k3[0], s1 + dt * k3[1], s2 + dt * k3[2], s3 + dt * k3[3], a)
+        dt6 = dt / 6.0
+        return tuple(y0 + dt6 * (d1 + 2 * d2 + 2 * d3 + d4)
+                     for y0, d1, d2, d3, d4 in zip(s, k1, k2, k3, k4))
+
+    def step(self, s, a, dt, out):
+        """Advances the (4, N) states `s` by `dt` under the torques `a`
+        with one RK4 step, writing the result into `out` (which may be
+        `s` itself)."""
+        k1, k2, k3, k4, y = self._k1, self._k2, self._k3, self._k4, self._y
+        dt2 = dt / 2.0
+
+        self.derivs(s, a, k1)
+        np.multiply(dt2, k1, out=y)
+        y += s
+        self.derivs(y, a, k2)
+        np.multiply(dt2, k2, out=y)
+        y += s
+        self.derivs(y, a, k3)
+        np.multiply(dt, k3, out=y)
+        y += s
+        self.derivs(y, a, k4)
+        # out = s + dt / 6.0 * (k1 + 2 * k2 + 2 * k3 + k4)
+        np.multiply(2, k2, out=y)
+        y += k1
+        k3 *= 2
+        y += k3
+        y += k4
+        y *= dt / 6.0
+        np.add(s, y, out=out)
+        return out
+
+    def wrap_and_bound(self, s):
+        """Wraps the angles of the (4, N) states `s` into [-pi, pi] and
+        bounds the velocities, in place."""
+        diff = 2 * np.pi
+        for angle in s[:2]:
+            # Same repeated subtraction as wrap(), to stay bit-for-bit
+            # comparable with the scalar code.
+            while True:
+                over = angle > np.pi
+                if not over.any():
+                    break
+                angle[over] -= diff
+            while True:
+                under = angle < -np.pi
+                if not under.any():
+                    break
+                angle[under] += diff
+        np.clip(s[2], -self.max_vel_1, self.max_vel_1, out=s[2])
+        np.clip(s[3], -self.max_vel_2, self.max_vel_2, out=s[3])
+        return s
+
+def make_batch_renderer(width=500, height=500):
+    """A rendering.BatchRenderer drawing the scene of AcrobotEnv's
+    rgb_array frames for an (n, 4) array of states, scaled to width x
+    height."""
+    from gym.envs.classic_control import rendering
+
+    def transforms(states):
+        s0, s1 = states[:, 0], states[:, 1]
+        # Joint positions with x and y swapped, as in AcrobotEnv._render
+        x1, y1 = AcrobotEnv.LINK_LENGTH_1 * np.sin(s0), -AcrobotEnv.LINK_LENGTH_1 * np.cos(s0)
+        return {'link1': rendering.transform_matrices(translation=(0, 0), rotation=s0-np.pi/2),
+                'link2': rendering.transform_matrices(translation=(x1, y1), rotation=s0+s1-np.pi/2)}
+
+    renderer = rendering.BatchRenderer(width, height, transforms)
+    renderer.set_bounds(-2.2,2.2,-2.2,2.2)
+    renderer.add_geom(rendering.Line((-2.2, 1), (2.2, 1)))
+    for name in ['link1', 'link2']:
+        l,r,t,b = 0, 1, .1, -.1
+        link = rendering.make_polygon([(l,b), (l,t), (r,t), (r,b)])
+        link.set_color(0,.8, .8)
+        renderer.add_part(link, name)
+        circ = rendering.make_circle(.1)
+        circ.set_color(.8, .8, 0)
+        renderer.add_part(circ, name)
+    return renderer
+
+class AcrobotVectorEnv(BatchedVectorEnv):
+    """Swings `num_envs` acrobots at once with AcrobotIntegrator. Given
+    the same seed, row i follows exactly the trajectory of the i-th of
+    N scalar AcrobotEnvs that are stepped (and reset) one after the
+    other. The `book_or_nips` and `torque_noise_max` class attributes
+    have the same meaning as on AcrobotEnv.
+
+    Args:
+        num_envs (int): The number of acrobots
+        timestep_limit (Optional[int]): End episodes after this many steps, like the registered Acrobot-v0 (200)
+    """
+
+    dt = AcrobotEnv.dt
+    book_or_nips = AcrobotEnv.book_or_nips
+    torque_noise_max = AcrobotEnv.torque_noise_max
+
+    def __init__(self, num_envs, timestep_limit=None):
+        self.num_envs = num_envs
+        self.timestep_limit = timestep_limit
+        # Transposed relative to the observations; see AcrobotIntegrator
+        self.state = np.zeros((4, num_envs))
+        self._torque = np.zeros(num_envs)
+        self._integrator = None
+        self._renderer = None
+
+        high = np.array([np.pi, np.pi, AcrobotEnv.MAX_VEL_1, AcrobotEnv.MAX_VEL_2])
+        low = -high
+        self.observation_space = spaces.Box(low, high)
+        self.action_space = spaces.Discrete(3)
+
+    def _reset_rows(self, rows):
+        self.state[:, rows] = np.random.uniform(low=-0.1, high=0.1, size=(len(rows), 4)).T
+
+    def _step_batch(self, a):
+        torque = self._torque
+        np.take(AcrobotEnv.AVAIL_TORQUE, a, out=torque)
+
+        # Add noise to the force action
+        if self.torque_noise_max > 0:
+            torque += np.random.uniform(-self.torque_noise_max, self.torque_noise_max, size=self.num_envs)
+
+        if self._integrator is None or self._integrator.book_or_nips != self.book_or_nips:
+            self._integrator = AcrobotIntegrator(self.num_envs, self.book_or_nips)
+        self._integrator.step(self.state, torque, self.dt, out=self.state)
+        self._integrator.wrap_and_bound(self.state)
+
+        s = self.state
+        terminal = -np.cos(s[0]) - np.cos(s[1] + s[0]) > 1.
+        reward = np.where(terminal, 0., -1.)
+        return reward, terminal
+
+    def _get_obs(self):
+        return self.state.T.copy()
+
+    def _render(self, mode):
+        if mode != 'rgb_array':
+            return super(AcrobotVectorEnv, self)._render(mode)
+        if self._renderer is None:
+            self._renderer = make_batch_renderer()
+        return self._renderer.render(self.state.T)
 
 def wrap(x, m, M):
     """
@@ -6,6 +6,7 @@ Copied from https://webdocs.cs.ualberta.ca/~sutton/book/code/pole.c
 import math
 import gym
 from gym import spaces
+from gym.vector import BatchedVectorEnv
 import numpy as np
 
 class CartPoleEnv(gym.Env):
@@ -14,19 +15,21 @@ class CartPoleEnv(gym.Env):
         'video.frames_per_second' : 50
     }
 
+    # Physical constants (shared with CartPoleVectorEnv)
+    gravity = 9.8
+    masscart = 1.0
+    masspole = 0.1
+    total_mass = (masspole + masscart)
+    length = 0.5 # actually half the pole's length
+    polemass_length = (masspole * length)
+    force_mag = 10.0
+    tau = 0.02  # seconds between state updates
+
+    # Angle at which to fail the episode
+    theta_threshold_radians = 12 * 2 * math.pi / 360
+    x_threshold = 2.4
+
     def __init__(self):
-        self.gravity = 9.8
-        self.masscart = 1.0
-        self.masspole = 0.1
-        self.total_mass = (self.masspole + self.masscart)
-        self.length = 0.5 # actually half the pole's length
-        self.polemass_length = (self.masspole * self.length)
-        self.force_mag = 10.0
-        self.tau = 0.02  # seconds between state updates
-
-        # Angle at which to fail the episode
-        self.theta_threshold_radians = 12 * 2 * math.pi / 360
-        self.x_threshold = 2.4
         self.reset()
         self.viewer = None
 
@@ -109,10 +112,102 @@ class CartPoleEnv(gym.Env):
         self.carttrans.set_translation(cartx, carty)
         self.poletrans.set_rotation(-x[2])
 
-        self.viewer.render()
-        if mode == 'rgb_array':
-            return self.viewer.get_array()
-        elif mode is 'human':
-            pass
-        else:
-            return super(CartPoleEnv, self).render(mode=mode)
+        return self.viewer.render(return_rgb_array = mode=='rgb_array')
+
+def make_batch_renderer(width=600, height=400):
+    """A rendering.BatchRenderer drawing the scene of CartPoleEnv's
+    rgb_array frames for an (n, 4) array of states, scaled to width x
+    height."""
+    from gym.envs.classic_control import rendering
+    screen_width = 600
+    screen_height = 400
+
+    world_width = CartPoleEnv.x_threshold*2
+    scale = screen_width/world_width
+    carty = 100 # TOP OF CART
+    polewidth = 10.0
+    polelen = scale * 1.0
+    cartwidth = 50.0
+    cartheight = 30.0
+    axleoffset =cartheight/4.0
+
+    def transforms(states):
+        cart = rendering.transform_matrices(translation=(states[:, 0]*scale+screen_width/2.0, carty))
+        pole = np.matmul(cart, rendering.transform_matrices(translation=(0, axleoffset), rotation=-states[:, 2]))
+        return {'cart': cart, 'pole': pole}
+
+    renderer = rendering.BatchRenderer(width, height, transforms)
+    renderer.set_bounds(0, screen_width, 0, screen_height)
+    track = rendering.Line((0,carty), (screen_width,carty))
+    track.set_color(0,0,0)
+    renderer.add_geom(track)
+    l,r,t,b = -cartwidth/2, cartwidth/2, cartheight/2, -cartheight/2
+    renderer.add_part(rendering.FilledPolygon([(l,b), (l,t), (r,t), (r,b)]), 'cart')
+    l,r,t,b = -polewidth/2,polewidth/2,polelen-polewidth/2,-polewidth/2
+    pole = rendering.FilledPolygon([(l,b), (l,t), (r,t), (r,b)])
+    pole.set_color(.8,.6,.4)
+    renderer.add_part(pole, 'pole')
+    axle = rendering.make_circle(polewidth/2)
+    axle.set_color(.5,.5,.8)
+    renderer.add_part(axle, 'pole')
+    return renderer
+
+class CartPoleVectorEnv(BatchedVectorEnv):
+    """Advances `num_envs` carts at once, using one vectorized NumPy
+    expression per step over an (N, 4) state array.
+
+    The arithmetic is the same, in the same order, as in
+    CartPoleEnv._step, and terminated rows draw their new initial
+    states in row order. So, given the same seed, row i follows
+    exactly the trajectory of the i-th of N scalar CartPoleEnvs that
+    are stepped (and reset) one after the other.
+
+    Args:
+        num_envs (int): The number of carts
+        timestep_limit (Optional[int]): End episodes after this many steps, like the registered CartPole-v0 (200)
+    """
+
+    def __init__(self, num_envs, timestep_limit=None):
+        self.num_envs = num_envs
+        self.timestep_limit = timestep_limit
+        self.state = np.zeros((num_envs, 4))
+        self._renderer = None
+
+        high = np.array([CartPoleEnv.x_threshold, np.inf, CartPoleEnv.theta_threshold_radians, np.inf])
+        self.action_space = spaces.Discrete(2)
+        self.observation_space = spaces.Box(-high, high)
+
+    def _reset_rows(self, rows):
+        self.state[rows] = np.random.uniform(low=-0.05, high=0.05, size=(len(rows), 4))
+
+    def _step_batch(self, action):
+        assert ((action == 0) | (action == 1)).all(), "%r invalid"%(action,)
+        c = CartPoleEnv
+        x, x_dot, theta, theta_dot = self.state.T
+        force = np.where(action == 1, c.force_mag, -c.force_mag)
+        costheta = np.cos(theta)
+        sintheta = np.sin(theta)
+        temp = (force + c.polemass_length * theta_dot * theta_dot * sintheta) / c.total_mass
+        thetaacc = (c.gravity * sintheta - costheta* temp) / (c.length * (4.0/3.0 - c.masspole * costheta * costheta / c.total_mass))
+        xacc  = temp - c.polemass_length * thetaacc * costheta / c.total_mass
+        x  = x + c.tau * x_dot
+        x_dot = x_dot + c.tau * xacc
+        theta = theta + c.tau * theta_dot
+        theta_dot = theta_dot + c.tau * thetaacc
+        self.state = np.stack([x, x_dot, theta, theta_dot], axis=1)
+        done =  (x < -c.x_threshold) \
+                | (x > c.x_threshold) \
+                | (theta < -c.theta_threshold_radians) \
+                | (theta > c.theta_threshold_radians)
+        reward = np.ones(self.num_envs)
+        return reward, done
+
+    def _get_obs(self):
+        return self.state.copy()
+
+    def _render(self, mode):
+        if mode != 'rgb_array':
+            return super(CartPoleVectorEnv, self)._render(mode)
+        if self._renderer is None:
+            self._renderer = make_batch_renderer()
+        return self._renderer.render(self.state)
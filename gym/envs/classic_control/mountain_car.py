@@ -5,6 +5,7 @@ https://webdocs.cs.ualberta.ca/~sutton/MountainCar/MountainCar1.cp
 import math
 import gym
 from gym import spaces
+from gym.vector import BatchedVectorEnv
 import numpy as np
 
 class MountainCarEnv(gym.Env):
@@ -13,16 +14,16 @@ class MountainCarEnv(gym.Env):
         'video.frames_per_second': 30
     }
 
+    min_position = -1.2
+    max_position = 0.6
+    max_speed = 0.07
+    goal_position = 0.5
+
     def __init__(self):
         self.reset()
         self.viewer = None
         self.reset()
 
-        self.min_position = -1.2
-        self.max_position = 0.6
-        self.max_speed = 0.07
-        self.goal_position = 0.5
-
         self.low = np.array([self.min_position, -self.max_speed])
         self.high = np.array([self.max_position, self.max_speed])
 
@@ -110,10 +111,49 @@ class MountainCarEnv(gym.Env):
         self.cartrans.set_translation((pos-self.min_position)*scale, self._height(pos)*scale)
         self.cartrans.set_rotation(math.cos(3 * pos))
 
-        self.viewer.render()
-        if mode == 'rgb_array':
-            return self.viewer.get_array()
-        elif mode is 'human':
-            pass
-        else:
-            return super(MountainCarEnv, self).render(mode=mode)
+        return self.viewer.render(return_rgb_array = mode=='rgb_array')
+
+class MountainCarVectorEnv(BatchedVectorEnv):
+    """Advances `num_envs` cars at once over an (N, 2) state array, with
+    vectorized clipping and termination. Given the same seed, row i
+    follows exactly the trajectory of the i-th of N scalar
+    MountainCarEnvs that are stepped (and reset) one after the other.
+
+    Args:
+        num_envs (int): The number of cars
+        timestep_limit (Optional[int]): End episodes after this many steps, like the registered MountainCar-v0 (200)
+    """
+
+    def __init__(self, num_envs, timestep_limit=None):
+        self.num_envs = num_envs
+        self.timestep_limit = timestep_limit
+        self.state = np.zeros((num_envs, 2))
+
+        c = MountainCarEnv
+        self.low = np.array([c.min_position, -c.max_speed])
+        self.high = np.array([c.max_position, c.max_speed])
+
+        self.action_space = spaces.Discrete(3)
+        self.observation_space = spaces.Box(self.low, self.high)
+
+    def _reset_rows(self, rows):
+        self.state[rows, 0] = np.random.uniform(low=-0.6, high=-0.4, size=len(rows))
+        self.state[rows, 1] = 0
+
+    def _step_batch(self, action):
+        c = MountainCarEnv
+        position, velocity = self.state.T
+        velocity = velocity + ((action-1)*0.001 + np.cos(3*position)*(-0.0025))
+        velocity = np.clip(velocity, -c.max_speed, c.max_speed)
+        position = position + velocity
+        position = np.clip(position, c.min_position, c.max_position)
+        velocity[(position==c.min_position) & (velocity<0)] = 0
+
+        done = position >= c.goal_position
+        reward = np.full(self.num_envs, -1.0)
+
+        self.state = np.stack([position, velocity], axis=1)
+        return reward, done
+
+    def _get_obs(self):
+        return self.state.copy()
@@ -1,5 +1,6 @@
 import gym
 from gym import spaces
+from gym.vector import BatchedVectorEnv
 import numpy as np
 from os import path
 
@@ -9,10 +10,11 @@ class PendulumEnv(gym.Env):
         'video.frames_per_second' : 30
     }
 
+    max_speed=8
+    max_torque=2.
+    dt=.05
+
     def __init__(self):
-        self.max_speed=8
-        self.max_torque=2.
-        self.dt=.05
         self.viewer = None
 
         high = np.array([1., 1., self.max_speed])
@@ -77,13 +79,62 @@ class PendulumEnv(gym.Env):
             self.imgtrans.scale = (-self.last_u/2, np.abs(self.last_u)/2)
 
 
-        self.viewer.render()
-        if mode == 'rgb_array':
-            return self.viewer.get_array()
-        elif mode is 'human':
-            pass
-        else:
-            return super(PendulumEnv, self).render(mode=mode)
+        return self.viewer.render(return_rgb_array = mode=='rgb_array')
+
+class PendulumVectorEnv(BatchedVectorEnv):
+    """Swings `num_envs` pendulums at once over an (N, 2) state array of
+    (theta, thetadot), with vectorized torque clipping and
+    angle_normalize-based costs. Given the same seed, row i follows
+    exactly the trajectory of the i-th of N scalar PendulumEnvs that
+    are stepped (and reset) one after the other.
+
+    Pendulum episodes never end on their own, so you will usually want
+    to pass a timestep_limit.
+
+    Args:
+        num_envs (int): The number of pendulums
+        timestep_limit (Optional[int]): End episodes after this many steps, like the registered Pendulum-v0 (200)
+    """
+
+    def __init__(self, num_envs, timestep_limit=None):
+        self.num_envs = num_envs
+        self.timestep_limit = timestep_limit
+        self.state = np.zeros((num_envs, 2))
+
+        c = PendulumEnv
+        high = np.array([1., 1., c.max_speed])
+        self.action_space = spaces.Box(low=-c.max_torque, high=c.max_torque, shape=(1,))
+        self.observation_space = spaces.Box(low=-high, high=high)
+
+    def _reset_rows(self, rows):
+        high = np.array([np.pi, 1])
+        self.state[rows] = np.random.uniform(low=-high, high=high, size=(len(rows), 2))
+
+    def _step_batch(self, u):
+        c = PendulumEnv
+        th, thdot = self.state.T # th := theta
+
+        g = 10.
+        m = 1.
+        l = 1.
+        dt = c.dt
+
+        u = np.clip(u.reshape(self.num_envs, -1), -c.max_torque, c.max_torque)[:, 0]
+        # The scalar env squares NumPy scalars, which goes through pow()
+        # rather than the x*x shortcut arrays take for **2; np.power
+        # keeps the two bit-for-bit comparable.
+        costs = np.power(angle_normalize(th), 2) + .1*np.power(thdot, 2) + .001*np.power(u, 2)
+
+        newthdot = thdot + (-3*g/(2*l) * np.sin(th + np.pi) + 3./(m*l**2)*u) * dt
+        newth = th + newthdot*dt
+        newthdot = np.clip(newthdot, -c.max_speed, c.max_speed)
+
+        self.state = np.stack([newth, newthdot], axis=1)
+        return -costs, np.zeros(self.num_envs, dtype=np.bool_)
+
+    def _get_obs(self):
+        theta, thetadot = self.state.T
+        return np.stack([np.cos(theta), np.sin(theta), thetadot], axis=1)
 
 def angle_normalize(x):
     return (((x+np.pi) % (2*np.pi)) - np.pi)
@@ -0,0 +1,146 @@
+"""
+Pure-NumPy rasterization of the primitives used by rendering.Viewer,
+for rendering without a display or OpenGL.
+
+Images are (height, width, channels) uint8 arrays laid out like an
+OpenGL framebuffer: row 0 is the bottom of the picture, and pixel
+(row, col) covers [col, col+1) x [row, row+1) in window coordinates.
+A pixel is painted when its center is covered. Colors are (r, g, b,
+a) tuples of floats in [0, 1], alpha-blended like GL_SRC_ALPHA,
+GL_ONE_MINUS_SRC_ALPHA; only the first three channels of the image
+are touched.
+"""
+from __future__ import division
+import numpy as np
+
+def transform_points(matrix, points):
+    """Applies a 3x3 homogeneous 2D transform to an (n, 2) array of points"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return points.dot(matrix[:2, :2].T) + matrix[:2, 2]
+
+def _bounds(image, points, margin=0.):
+    """The (row, column) slices of `image` touched by the bounding box of points"""
+    height, width = image.shape[:2]
+    lo = np.floor(points.min(axis=0) - margin).astype(int)
+    hi = np.ceil(points.max(axis=0) + margin).astype(int)
+    cols = slice(max(lo[0], 0), min(hi[0], width))
+    rows = slice(max(lo[1], 0), min(hi[1], height))
+    if cols.start >= cols.stop or rows.start >= rows.stop:
+        return None
+    return rows, cols
+
+def _centers(rows, cols):
+    return np.arange(rows.start, rows.stop) + 0.5, np.arange(cols.start, cols.stop) + 0.5
+
+def _paint(image, rows, cols, mask, color):
+    region = image[rows, cols, :3]
+    rgb = np.asarray(color[:3], dtype=np.float64) * 255
+    alpha = color[3] if len(color) > 3 else 1.
+    if alpha >= 1:
+        region[mask] = np.round(rgb)
+    elif alpha > 0:
+        region[mask] = np.round(region[mask] * (1 - alpha) + rgb * alpha)
+
+def fill_polygon(image, points, color):
+    """Fills the polygon with the given (n, 2) vertices, using the
+    even-odd rule."""
+    points = np.asarray(points, dtype=np.float64)
+    if len(points) < 3:
+        return
+    bounds = _bounds(image, points)
+    if bounds is None:
+        return
+    rows, cols = bounds
+    ys, xs = _centers(rows, cols)
+    inside = np.zeros((len(ys), len(xs)), dtype=np.bool_)
+    for (xa, ya), (xb, yb) in zip(points, np.roll(points, -1, axis=0)):
+        crosses = (ya > ys) != (yb > ys)
+        if not crosses.any():
+            continue
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x_cross = xa + (ys - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses[:, None] & (xs[None, :] < x_cross[:, None])
+    _paint(image, rows, cols, inside, color)
+
+def draw_segment(image, start, end, linewidth, color):
+    """Draws a line segment `linewidth` pixels wide"""
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    radius = max(linewidth, 1.) / 2
+    bounds = _bounds(image, np.array([start, end]), margin=radius)
+    if bounds is None:
+        return
+    rows, cols = bounds
+    ys, xs = _centers(rows, cols)
+    dx, dy = end - start
+    length2 = dx * dx + dy * dy
+    px = xs[None, :] - start[0]
+    py = ys[:, None] - start[1]
+    if length2 > 0:
+        t = np.clip((px * dx + py * dy) / length2, 0, 1)
+    else:
+        t = 0.
+    distance2 = (px - t * dx) ** 2 + (py - t * dy) ** 2
+    _paint(image, rows, cols, distance2 <= radius * radius, color)
+
+def draw_polyline(image, points, closed, linewidth, color):
+    """Draws the segments between consecutive (n, 2) points, and from
+    the last back to the first if `closed`."""
+    points = np.asarray(points, dtype=np.float64)
+    for start, end in zip(points[:-1], points[1:]):
+        draw_segment(image, start, end, linewidth, color)
+    if closed and len(points) > 2:
+        draw_segment(image, points[-1], points[0], linewidth, color)
+
+def draw_point(image, point, color):
+    x, y = np.floor(point).astype(int)
+    if 0 <= y < image.shape[0] and 0 <= x < image.shape[1]:
+        _paint(image, slice(y, y+1), slice(x, x+1), np.ones((1, 1), dtype=np.bool_), color)
+
+def batch_transform_points(matrices, points):
+    """Applies each of an (n, 3, 3) stack of transforms to the same
+    (k, 2) points, giving an (n, k, 2) array"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.einsum('nij,kj->nki', matrices[:, :2, :2], points) + matrices[:, None, :2, 2]
+
+def fill_convex_polygons(images, points, color):
+    """Fills one convex polygon in each of the (n, height, width,
+    channels) images, given their vertices as an (n, k, 2) array.
+
+    Rather than scanning each polygon's bounding box separately, this
+    tests the pixel centers of an equally sized window in every image
+    (as big as the largest bounding box) against all k edges at once,
+    and scatters the covered pixels back with a single indexed
+    assignment. Up to ties on the edges, the result is that of calling
+    fill_polygon on every image.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    n, height, width = images.shape[:3]
+    if n == 0 or points.shape[1] < 3:
+        return
+    lo = np.floor(points.min(axis=1)).astype(int)
+    size = (np.ceil(points.max(axis=1)).astype(int) - lo).max(axis=0)
+    cols = lo[:, 0, None] + np.arange(size[0])
+    rows = lo[:, 1, None] + np.arange(size[1])
+    xs = (cols + 0.5)[:, None, :]
+    ys = (rows + 0.5)[:, :, None]
+
+    # The sign of the area tells whether the vertices run
+    # counterclockwise, with the inside to the left of each edge
+    ends = np.roll(points, -1, axis=1)
+    orientation = np.sign(np.sum(points[:, :, 0] * ends[:, :, 1] - ends[:, :, 0] * points[:, :, 1], axis=1))[:, None, None]
+    inside = ((rows >= 0) & (rows < height))[:, :, None] & ((cols >= 0) & (cols < width))[:, None, :]
+    for k in range(points.shape[1]):
+        xa, ya = points[:, k, 0, None, None], points[:, k, 1, None, None]
+        xb, yb = ends[:, k, 0, None, None], ends[:, k, 1, None, None]
+        inside &= orientation * ((xb - xa) * (ys - ya) - (yb - ya) * (xs - xa)) >= 0
+    inside &= orientation != 0
+
+    index, i, j = np.nonzero(inside)
+    rows, cols = rows[index, i], cols[index, j]
+    rgb = np.asarray(color[:3], dtype=np.float64) * 255
+    alpha = color[3] if len(color) > 3 else 1.
+    if alpha >= 1:
+        images[index, rows, cols, :3] = np.round(rgb)
+    elif alpha > 0:
+        images[index, rows, cols, :3] = np.round(images[index, rows, cols, :3] * (1 - alpha) + rgb * alpha)
@@ -10,39 +10,90 @@ if "Apple" in sys.version:
 
 from gym import error
 
+# pyglet and OpenGL are only needed by the 'pyglet' backend; the
+# 'software' backend renders without them (or a display).
 try:
     import pyglet
 except ImportError as e:
-    raise error.DependencyNotInstalled("""{}
+    pyglet = None
+    _pyglet_error = error.DependencyNotInstalled("""{}
+
+(HINT: you can install pyglet directly via 'pip install pyglet'. But if you really just want to install all Gym dependencies and not have to think about it, 'pip install -e .[all]' or 'pip install gym[all]' will do it. Alternatively, render without pyglet or a display through Viewer(..., backend='software'), or by setting GYM_RENDER_BACKEND=software.)""".format(e))
+else:
+    try:
+        from pyglet.gl import *
+    except ImportError as e:
+        pyglet = None
+        _pyglet_error = error.DependencyNotInstalled("""{} (while running: from pyglet.gl import *).
+
+(HINT: make sure you have OpenGL install. On Ubuntu, you can run 'apt-get install python-opengl'. If you're running on a server, you may need a virtual frame buffer; something like this should work: 'xvfb-run -s "-screen 0 1400x900x24" <your script here>'. Alternatively, render without OpenGL through Viewer(..., backend='software'), or by setting GYM_RENDER_BACKEND=software.)""".format(e))
+
+import collections
+from ctypes import POINTER
+import logging
+import math
+import numpy as np
 
-(HINT: you can install pyglet directly via 'pip install pyglet'. But if you really just want to install all Gym dependencies and not have to think about it, 'pip install -e .[all]' or 'pip install gym[all]' will do it.)""")
+from gym.envs.classic_control import rasterizer
 
-try:
-    from pyglet.gl import *
-except ImportError as e:
-    raise error.DependencyNotInstalled("""{} (while running: from pyglet.gl import *).
+logger = logging.getLogger(__name__)
 
-(HINT: make sure you have OpenGL install. On Ubuntu, you can run 'apt-get install python-opengl'. If you're running on a server, you may need a virtual frame buffer; something like this should work: 'xvfb-run -s "-screen 0 1400x900x24" <your script here>')""".format(e))
+RAD2DEG = 57.29577951308232
 
-import math
-import numpy as np
+BACKENDS = ['pyglet', 'software']
 
-RAD2DEG = 57.29577951308232
+def default_backend():
+    """The GYM_RENDER_BACKEND environment variable if set, otherwise
+    'pyglet' if it can be imported and 'software' if not. Only
+    rgb_array rendering works with the latter."""
+    backend = os.environ.get('GYM_RENDER_BACKEND')
+    if backend:
+        return backend
+    return 'pyglet' if pyglet is not None else 'software'
+
+def _require_pyglet():
+    if pyglet is None:
+        raise _pyglet_error
 
 class Viewer(object):
-    def __init__(self, width, height):
+    """Draws a scene of Geoms, either into a pyglet window with
+    OpenGL, or with backend='software' into an array using the
+    NumPy rasterizer (no window is shown then, but get_array works
+    the same, so rgb_array rendering and video recording need no
+    display).
+
+    Args:
+        width (int): Width of the picture, in pixels
+        height (int): Height of the picture, in pixels
+        backend (Optional[str]): One of BACKENDS; defaults to default_backend()
+    """
+
+    def __init__(self, width, height, backend=None):
+        if backend is None:
+            backend = default_backend()
+        if backend not in BACKENDS:
+            raise error.Error('Unsupported rendering backend {!r}; expected one of {}'.format(backend, BACKENDS))
         self.width = width
         self.height = height
-        self.window = pyglet.window.Window(width=width, height=height)
+        self.backend = backend
+        self.window = None
         self.geoms = []
         self.onetime_geoms = []
         self.transform = Transform()
+        self._frame = None # the software backend's canvas
 
-        glEnable(GL_BLEND)
-        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        if backend == 'pyglet':
+            _require_pyglet()
+            self.window = pyglet.window.Window(width=width, height=height)
+            glEnable(GL_BLEND)
+            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        else:
+            self._frame = np.full((height, width, 4), 255, dtype=np.uint8)
 
     def close(self):
-        self.window.close()
+        if self.window is not None:
+            _release_vertex_lists()
+            self.window.close()
 
     def set_bounds(self, left, right, bottom, top):
         assert right > left and top > bottom
@@ -58,7 +109,21 @@ class Viewer(object):
     def add_onetime(self, geom):
         self.onetime_geoms.append(geom)
 
-    def render(self):
+    def render(self, return_rgb_array=False):
+        """Draws the scene: into the window, or with the software
+        backend into an array. With return_rgb_array, the frame is
+        returned as by get_array.
+
+        The software backend has nothing to show frames in, so it only
+        renders with return_rgb_array; otherwise it raises, as the
+        pyglet backend does when pyglet is missing.
+        """
+        if self.backend == 'software':
+            if not return_rgb_array:
+                _require_pyglet()
+                raise error.Error("Viewer(backend='software') cannot display frames; render with mode='rgb_array', or use the 'pyglet' backend")
+            self._rasterize()
+            return self.get_array()
         glClearColor(1,1,1,1)
         self.window.clear()
         self.window.switch_to()
@@ -71,6 +136,17 @@ class Viewer(object):
         self.transform.disable()
         self.window.flip()
         self.onetime_geoms = []
+        if return_rgb_array:
+            return self.get_array()
+
+    def _rasterize(self):
+        self._frame[:, :, :3] = 255
+        state = self.transform.apply(_RasterState())
+        for geom in self.geoms:
+            geom.rasterize(self._frame, state)
+        for geom in self.onetime_geoms:
+            geom.rasterize(self._frame, state)
+        self.onetime_geoms = []
 
     # Convenience
     def draw_circle(self, radius=10, res=30, filled=True, **attrs):
@@ -98,12 +174,21 @@ class Viewer(object):
         return geom
 
     def get_array(self):
+        """Returns the last rendered frame as a new (height, width, 3)
+        RGB array.
+
+        The array is a row-flipped view of a fresh RGBA buffer, which
+        is how OpenGL hands pixels out; the video recorder recognizes
+        that layout, so it can pass frames on without converting them
+        (see gym.monitoring.video_recorder.frame_layout)."""
+        if self.backend == 'software':
+            return self._frame.copy()[::-1,:,0:3]
+        frame = np.empty((self.height, self.width, 4), dtype=np.uint8)
         self.window.flip()
-        image_data = pyglet.image.get_buffer_manager().get_color_buffer().get_image_data()
+        # OpenGL hands rows out bottom to top, so flip them with a view
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, frame.ctypes.data_as(POINTER(GLubyte)))
         self.window.flip()
-        arr = np.fromstring(image_data.data, dtype=np.uint8, sep='')
-        arr = arr.reshape(self.height, self.width, 4)
-        return arr[::-1,:,0:3]
+        return frame[::-1,:,0:3]
 
 def _add_attrs(geom, attrs):
     if "color" in attrs:
@@ -111,6 +196,77 @@ def _add_attrs(geom, attrs):
     if "linewidth" in attrs:
         geom.set_linewidth(attrs["linewidth"])
 
+class _RasterState(object):
+    """The software backend's equivalent of the GL state that Attrs
+    set: the current transform, color and line width."""
+    def __init__(self, matrix=None, color=(0, 0, 0, 1.0), linewidth=1):
+        self.matrix = np.eye(3) if matrix is None else matrix
+        self.color = color
+        self.linewidth = linewidth
+    def replace(self, **kwargs):
+        state = _RasterState(self.matrix, self.color, self.linewidth)
+        state.__dict__.update(kwargs)
+        return state
+
+class _Shape(object):
+    """A list of vertices, shared by every Geom drawing the same ones
+    (see _get_shape): as a read-only (n, 2) array for the software
+    backend, and as a pyglet vertex list, built on first draw, for the
+    pyglet one. Geoms only hold on to the shape, so after the first
+    frame drawing one takes a single call, with only the Transforms
+    left to recompute."""
+    def __init__(self, key):
+        self.key = key
+        self.vertices = np.array(key, dtype=np.float64).reshape(-1, 2)
+        self.vertices.setflags(write=False)
+        self.vertex_list = None
+    def draw(self, mode):
+        if self.vertex_list is None:
+            if _shapes.get(self.key) is not self:
+                # Evicted from the cache, which released our vertex
+                # list: draw with the cached shape instead, so that
+                # every vertex list stays in the cache's bounds
+                _get_shape(self.key).draw(mode)
+                return
+            self.vertex_list = pyglet.graphics.vertex_list(len(self.vertices), ('v2f/static', tuple(self.vertices.ravel())))
+        self.vertex_list.draw(mode)
+    def release(self):
+        if self.vertex_list is not None:
+            self.vertex_list.delete()
+            self.vertex_list = None
+
+_shapes = collections.OrderedDict()
+SHAPE_CACHE_SIZE = 256
+
+def _get_shape(v):
+    """Returns the _Shape for the vertices v, building it only if it
+    isn't among the SHAPE_CACHE_SIZE most recently used ones. This is
+    what lets the one-time geoms that e.g. Acrobot creates on every
+    frame reuse the previous frame's vertex lists."""
+    key = tuple((float(x), float(y)) for x, y in v)
+    shape = _shapes.pop(key, None)
+    if shape is None:
+        shape = _Shape(key)
+        while len(_shapes) >= SHAPE_CACHE_SIZE:
+            _, evicted = _shapes.popitem(last=False)
+            evicted.release()
+    _shapes[key] = shape
+    return shape
+
+def _release_vertex_lists():
+    """Frees the GL buffers of the cached shapes (they get rebuilt if
+    drawn again), while a window's context is still current."""
+    for shape in _shapes.values():
+        shape.release()
+
+def _vertices_property():
+    def get(self):
+        return self._v
+    def set(self, v):
+        self._v = v
+        self._shape = _get_shape(v)
+    return property(get, set, doc="The geom's vertices; assign a new list rather than modifying this one, which is cached")
+
 class Geom(object):
     def __init__(self):
         self._color=Color((0, 0, 0, 1.0))
@@ -123,6 +279,12 @@ class Geom(object):
             attr.disable()
     def render1(self):
         raise NotImplementedError
+    def rasterize(self, image, state):
+        for attr in reversed(self.attrs):
+            state = attr.apply(state)
+        self.rasterize1(image, state)
+    def rasterize1(self, image, state):
+        raise NotImplementedError
     def add_attr(self, attr):
         self.attrs.append(attr)
     def set_color(self, r, g, b):
@@ -133,6 +295,9 @@ class Attr(object):
         raise NotImplementedError
     def disable(self):
         pass
+    def apply(self, state):
+        """The software backend's enable(): returns the updated _RasterState"""
+        return state
 
 class Transform(Attr):
     def __init__(self, translation=(0.0, 0.0), rotation=0.0, scale=(1,1)):
@@ -146,6 +311,15 @@ class Transform(Attr):
         glScalef(self.scale[0], self.scale[1], 1)
     def disable(self):
         glPopMatrix()
+    def apply(self, state):
+        return state.replace(matrix=state.matrix.dot(self.matrix()))
+    def matrix(self):
+        """The 3x3 homogeneous matrix of translate, then rotate, then scale, as in enable()"""
+        c, s = math.cos(self.rotation), math.sin(self.rotation)
+        sx, sy = self.scale
+        return np.array([[c*sx, -s*sy, self.translation[0]],
+                         [s*sx, c*sy, self.translation[1]],
+                         [0., 0., 1.]])
     def set_translation(self, newx, newy):
         self.translation = (float(newx), float(newy))
     def set_rotation(self, new):
@@ -158,6 +332,8 @@ class Color(Attr):
         self.vec4 = vec4
     def enable(self):
         glColor4f(*self.vec4)
+    def apply(self, state):
+        return state.replace(color=self.vec4)
 
 class LineStyle(Attr):
     def __init__(self, style):
@@ -173,6 +349,8 @@ class LineWidth(Attr):
         self.stroke = stroke
     def enable(self):
         glLineWidth(self.stroke)
+    def apply(self, state):
+        return state.replace(linewidth=self.stroke)
 
 class Point(Geom):
     def __init__(self):
@@ -181,24 +359,42 @@ class Point(Geom):
         glBegin(GL_POINTS) # draw point
         glVertex3f(0.0, 0.0, 0.0)
         glEnd()
+    def rasterize1(self, image, state):
+        rasterizer.draw_point(image, rasterizer.transform_points(state.matrix, (0, 0))[0], state.color)
 
 class FilledPolygon(Geom):
     def __init__(self, v):
         Geom.__init__(self)
         self.v = v
+    v = _vertices_property()
     def render1(self):
-        if   len(self.v) == 4 : glBegin(GL_QUADS)
-        elif len(self.v)  > 4 : glBegin(GL_POLYGON)
-        else: glBegin(GL_TRIANGLES)
-        for p in self.v:
-            glVertex3f(p[0], p[1],0)  # draw each vertex
-        glEnd()
+        if   len(self.v) == 4 : mode = GL_QUADS
+        elif len(self.v)  > 4 : mode = GL_POLYGON
+        else: mode = GL_TRIANGLES
+        self._shape.draw(mode)
+    def rasterize1(self, image, state):
+        rasterizer.fill_polygon(image, rasterizer.transform_points(state.matrix, self._shape.vertices), state.color)
+
+_circles = collections.OrderedDict()
+
+def _circle_points(radius, res):
+    """The vertices of a regular res-gon of the given radius,
+    memoized like _get_shape."""
+    key = (radius, res)
+    points = _circles.pop(key, None)
+    if points is None:
+        points = []
+        for i in xrange(res):
+            ang = 2*math.pi*i / res
+            points.append((math.cos(ang)*radius, math.sin(ang)*radius))
+        points = tuple(points)
+        while len(_circles) >= SHAPE_CACHE_SIZE:
+            _circles.popitem(last=False)
+    _circles[key] = points
+    return points
 
 def make_circle(radius=10, res=30, filled=True):
-    points = []
-    for i in xrange(res):
-        ang = 2*math.pi*i / res
-        points.append((math.cos(ang)*radius, math.sin(ang)*radius))
+    points = _circle_points(radius, res)
     if filled:
         return FilledPolygon(points)
     else:
@@ -229,6 +425,9 @@ class Compound(Geom):
     def render1(self):
         for g in self.gs:
             g.render()
+    def rasterize1(self, image, state):
+        for g in self.gs:
+            g.rasterize(image, state)
 
 class PolyLine(Geom):
     def __init__(self, v, close):
@@ -237,38 +436,166 @@ class PolyLine(Geom):
         self.close = close
         self.linewidth = LineWidth(1)
         self.add_attr(self.linewidth)
+    v = _vertices_property()
     def render1(self):
-        glBegin(GL_LINE_LOOP if self.close else GL_LINE_STRIP)
-        for p in self.v:
-            glVertex3f(p[0], p[1],0)  # draw each vertex
-        glEnd()
+        self._shape.draw(GL_LINE_LOOP if self.close else GL_LINE_STRIP)
+    def rasterize1(self, image, state):
+        rasterizer.draw_polyline(image, rasterizer.transform_points(state.matrix, self._shape.vertices), self.close, state.linewidth, state.color)
     def set_linewidth(self, x):
         self.linewidth.stroke = x
 
 class Line(Geom):
     def __init__(self, start=(0.0, 0.0), end=(0.0, 0.0)):
         Geom.__init__(self)
-        self.start = start
-        self.end = end
+        self.v = (start, end)
         self.linewidth = LineWidth(1)
         self.add_attr(self.linewidth)
 
+    v = _vertices_property()
+    @property
+    def start(self):
+        return self.v[0]
+    @start.setter
+    def start(self, p):
+        self.v = (p, self.end)
+    @property
+    def end(self):
+        return self.v[1]
+    @end.setter
+    def end(self, p):
+        self.v = (self.start, p)
+
     def render1(self):
-        glBegin(GL_LINES)
-        glVertex2f(*self.start)
-        glVertex2f(*self.end)
-        glEnd()
+        self._shape.draw(GL_LINES)
+    def rasterize1(self, image, state):
+        start, end = rasterizer.transform_points(state.matrix, self._shape.vertices)
+        rasterizer.draw_segment(image, start, end, state.linewidth, state.color)
 
 class Image(Geom):
+    _warned = False
     def __init__(self, fname, width, height):
         Geom.__init__(self)
         self.width = width
         self.height = height
-        img = pyglet.image.load(fname)
-        self.img = img
+        self.fname = fname
+        self.img = None # loaded on first render, so the software backend doesn't need pyglet
         self.flip = False
     def render1(self):
+        if self.img is None:
+            self.img = pyglet.image.load(self.fname)
         self.img.blit(-self.width/2, -self.height/2, width=self.width, height=self.height)
+    def rasterize1(self, image, state):
+        # Decoding image files would need pyglet (or PIL), so the
+        # software backend leaves images out
+        if not Image._warned:
+            logger.warn('The software rendering backend does not draw images; skipping %s', self.fname)
+            Image._warned = True
+
+def transform_matrices(translation=(0.0, 0.0), rotation=0.0, scale=(1, 1)):
+    """Transform.matrix() for a batch: the arguments may be arrays (or
+    pairs of arrays) of a common length n, giving an (n, 3, 3) stack."""
+    tx, ty = translation
+    sx, sy = scale
+    tx, ty, rotation, sx, sy = np.broadcast_arrays(*[np.atleast_1d(np.asarray(a, dtype=np.float64)) for a in (tx, ty, rotation, sx, sy)])
+    c, s = np.cos(rotation), np.sin(rotation)
+    matrices = np.zeros(tx.shape + (3, 3))
+    matrices[:, 0, 0] = c*sx
+    matrices[:, 0, 1] = -s*sy
+    matrices[:, 0, 2] = tx
+    matrices[:, 1, 0] = s*sx
+    matrices[:, 1, 1] = c*sy
+    matrices[:, 1, 2] = ty
+    matrices[:, 2, 2] = 1.
+    return matrices
+
+class BatchRenderer(object):
+    """Renders one scene for a whole batch of states at once, offscreen,
+    without a window or OpenGL. This is how the vectorized
+    classic_control envs produce pixel observations.
+
+    The scene is described once, typically per environment class:
+
+        add_geom(geom): a static geom, drawn like in a software Viewer into a background that is computed once
+        add_part(geom, name): a moving FilledPolygon, which must be convex
+
+    and `transforms(states)` maps an (n, ...) array of states to a
+    dict from part names to (n, 3, 3) stacks of transforms (see
+    transform_matrices), which place the parts in each frame. Transforms
+    added to the part geoms themselves stay fixed, and apply before the
+    per-frame ones; the viewport is set with set_bounds, as on Viewer.
+    Parts are drawn after the static geoms, in the order they were
+    added.
+
+    Args:
+        width (int): Width of the frames, in pixels
+        height (int): Height of the frames, in pixels
+        transforms (callable): Places the parts, as described above
+        chunk_size (int): Render at most this many frames per pass, to bound temporary memory
+    """
+
+    def __init__(self, width, height, transforms, chunk_size=256):
+        self.width = width
+        self.height = height
+        self.transforms = transforms
+        self.chunk_size = chunk_size
+        self.transform = Transform()
+        self.geoms = []
+        self.parts = []
+        self._background = None
+
+    def set_bounds(self, left, right, bottom, top):
+        assert right > left and top > bottom
+        scalex = self.width/(right-left)
+        scaley = self.height/(top-bottom)
+        self.transform = Transform(
+            translation=(-left*scalex, -bottom*scalex),
+            scale=(scalex, scaley))
+        self._background = None
+
+    def add_geom(self, geom):
+        self.geoms.append(geom)
+        self._background = None
+
+    def add_part(self, geom, name):
+        if not isinstance(geom, FilledPolygon):
+            raise error.Error('Moving parts of a BatchRenderer must be FilledPolygons, not {}'.format(geom))
+        fixed = np.eye(3)
+        for attr in reversed(geom.attrs):
+            if isinstance(attr, Transform):
+                fixed = fixed.dot(attr.matrix())
+        self.parts.append((geom._shape.vertices, geom._color.vec4, fixed, name))
+
+    def _window_matrix(self):
+        # The window transform, followed by a flip so that the frames
+        # come out top row first without copying
+        flip = np.array([[1., 0., 0.], [0., -1., self.height], [0., 0., 1.]])
+        return flip.dot(self.transform.matrix())
+
+    def _render_background(self):
+        image = np.full((self.height, self.width, 3), 255, dtype=np.uint8)
+        state = self.transform.apply(_RasterState())
+        for geom in self.geoms:
+            geom.rasterize(image, state)
+        return image[::-1].copy()
+
+    def render(self, states, out=None):
+        """Returns the frames for an (n, ...) array of states, as an (n,
+        height, width, 3) uint8 array (or in `out`), each top row first
+        like Viewer.get_array."""
+        if self._background is None:
+            self._background = self._render_background()
+        n = len(states)
+        if out is None:
+            out = np.empty((n, self.height, self.width, 3), dtype=np.uint8)
+        window = self._window_matrix()
+        for start in range(0, n, self.chunk_size):
+            frames = out[start:start+self.chunk_size]
+            frames[...] = self._background
+            matrices = self.transforms(states[start:start+self.chunk_size])
+            for vertices, color, fixed, name in self.parts:
+                points = rasterizer.batch_transform_points(np.matmul(window, matrices[name]).dot(fixed), vertices)
+                rasterizer.fill_convex_polygons(frames, points, color)
+        return out
 
 # ================================================================
 
@@ -278,6 +605,7 @@ class SimpleImageViewer(object):
         self.isopen = False
     def imshow(self, arr):
         if self.window is None:
+            _require_pyglet()
             height, width, channels = arr.shape
             self.window = pyglet.window.Window(width=width, height=height)
             self.width = width
@@ -0,0 +1,116 @@
+import numpy as np
+
+from gym.envs.classic_control import acrobot, cartpole, mountain_car, pendulum
+
+def _rollout_scalar(envs, actions):
+    """Step scalar envs one after the other, resetting finished ones in
+    order, the way a batched env does."""
+    trajectory = []
+    for t in xrange(actions.shape[0]):
+        obs, rewards, dones = [], [], []
+        for env, action in zip(envs, actions[t]):
+            ob, reward, done, _ = env._step(action)
+            if done:
+                ob = env._reset()
+            obs.append(ob)
+            rewards.append(reward)
+            dones.append(done)
+        trajectory.append((np.array(obs), np.array(rewards), np.array(dones)))
+    return trajectory
+
+def _rollout_batched(venv, actions):
+    trajectory = []
+    for t in xrange(actions.shape[0]):
+        obs, rewards, dones, _ = venv.step(actions[t])
+        trajectory.append((obs, rewards, dones))
+    return trajectory
+
+def _assert_equivalent(expected, actual, exact):
+    if exact:
+        same = lambda a, b: (a == b).all()
+    else:
+        same = lambda a, b: np.allclose(a, b, rtol=1e-12, atol=1e-12)
+    for (obs, rewards, dones), (batch_obs, batch_rewards, batch_dones) in zip(expected, actual):
+        assert same(obs, batch_obs), "{!r} != {!r}".format(obs, batch_obs)
+        assert same(rewards, batch_rewards), "{!r} != {!r}".format(rewards, batch_rewards)
+        assert (dones == batch_dones).all()
+
+def _check_matches_scalar(env_class, venv_class, actions, exact=False):
+    steps, n = actions.shape[:2]
+    envs = [env_class() for _ in xrange(n)]
+    venv = venv_class(n)
+
+    np.random.seed(0)
+    obs = np.array([env._reset() for env in envs])
+    expected = _rollout_scalar(envs, actions)
+
+    np.random.seed(0)
+    assert (venv.reset() == obs).all()
+    actual = _rollout_batched(venv, actions)
+
+    _assert_equivalent(expected, actual, exact)
+    return expected
+
+def test_cartpole_matches_scalar():
+    actions = np.random.randint(2, size=(300, 5))
+    expected = _check_matches_scalar(cartpole.CartPoleEnv, cartpole.CartPoleVectorEnv, actions, exact=True)
+    # Make sure we actually exercised the partial resets
+    assert any(dones.any() and not dones.all() for _, _, dones in expected)
+
+def test_mountain_car_matches_scalar():
+    # Pushing left for a while also runs into the left wall
+    actions = np.tile([0, 2, 1, 2], (200, 1))
+    actions[:100] = 0
+    _check_matches_scalar(mountain_car.MountainCarEnv, mountain_car.MountainCarVectorEnv, actions, exact=True)
+
+def test_mountain_car_termination():
+    venv = mountain_car.MountainCarVectorEnv(3)
+    venv.reset()
+    venv.state[:] = [[0.49, 0.02], [0.0, 0.0], [0.45, 0.07]]
+    obs, rewards, dones, infos = venv.step([2, 1, 2])
+    assert (dones == [True, False, True]).all()
+    assert (rewards == -1.0).all()
+    assert infos[0]['terminal_observation'][0] >= 0.5
+    # Finished rows were reset
+    assert (obs[dones, 0] < -0.4).all() and (obs[dones, 1] == 0).all()
+
+def test_pendulum_matches_scalar():
+    # Includes torques outside of the action space, to cover clipping
+    actions = np.random.uniform(-3, 3, size=(200, 4, 1))
+    _check_matches_scalar(pendulum.PendulumEnv, pendulum.PendulumVectorEnv, actions, exact=True)
+
+def test_cartpole_timestep_limit():
+    venv = cartpole.CartPoleVectorEnv(3, timestep_limit=1)
+    venv.reset()
+    obs, rewards, dones, infos = venv.step([0, 1, 0])
+    assert dones.all()
+    assert (rewards == 1.0).all()
+    assert all(info['terminal_observation'].shape == (4,) for info in infos)
+
+def test_acrobot_matches_scalar():
+    actions = np.random.randint(3, size=(300, 4))
+    _check_matches_scalar(acrobot.AcrobotEnv, acrobot.AcrobotVectorEnv, actions)
+
+class NoisyNipsAcrobotEnv(acrobot.AcrobotEnv):
+    book_or_nips = "nips"
+    torque_noise_max = 0.5
+
+class NoisyNipsAcrobotVectorEnv(acrobot.AcrobotVectorEnv):
+    book_or_nips = "nips"
+    torque_noise_max = 0.5
+
+def test_acrobot_options_match_scalar():
+    actions = np.random.randint(3, size=(300, 4))
+    _check_matches_scalar(NoisyNipsAcrobotEnv, NoisyNipsAcrobotVectorEnv, actions)
+
+def test_acrobot_integrator_matches_rk4():
+    env = acrobot.AcrobotEnv()
+    integrator = acrobot.AcrobotIntegrator(5)
+    states = np.random.uniform(-3, 3, size=(4, 5))
+    torques = np.array([-1., 0., 1., .3, -.7])
+    expected = np.array([
+        acrobot.rk4(env._dsdt, np.append(states[:, i], torques[i]), [0, env.dt])[-1][:4]
+        for i in xrange(5)]).T
+    assert np.allclose(integrator.step(states.copy(), torques, env.dt, out=np.zeros((4, 5))), expected, rtol=1e-12, atol=1e-12)
+    for i in xrange(5):
+        assert np.allclose(integrator.step_one(states[:, i], torques[i], env.dt), expected[:, i], rtol=1e-12, atol=1e-12)
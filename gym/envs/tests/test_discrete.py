@@ -0,0 +1,164 @@
+import copy
+import pickle
+
+import numpy as np
+
+from gym import error
+
+from gym.envs.toy_text import discrete, frozen_lake, taxi
+
+def _reference_step(env, a):
+    """DiscreteEnv._step as it was before the transition tables."""
+    transitions = env.P[env.s][a]
+    i = discrete.categorical_sample([t[0] for t in transitions])
+    p, s, r, d = transitions[i]
+    env.s = s
+    return (s, r, d, {"prob" : p})
+
+def _check_matches_reference(env, steps=500):
+    actions = np.random.randint(env.nA, size=steps)
+    np.random.seed(0)
+    env._reset()
+    expected = []
+    for a in actions:
+        expected.append(_reference_step(env, a))
+        if expected[-1][2]:
+            env._reset()
+    np.random.seed(0)
+    env._reset()
+    for a, (s, r, d, info) in zip(actions, expected):
+        ob, reward, done, new_info = env._step(a)
+        assert (ob, reward, done, new_info) == (s, r, d, info), "{} != {}".format((ob, reward, done, new_info), (s, r, d, info))
+        assert type(reward) is type(r) and type(done) is type(d), (reward, r, done, d)
+        if done:
+            env._reset()
+
+def test_frozen_lake_matches_reference():
+    _check_matches_reference(frozen_lake.FrozenLakeEnv(map_name='8x8'))
+
+def test_taxi_matches_reference():
+    _check_matches_reference(taxi.TaxiEnv())
+
+def test_model_roundtrip():
+    env = frozen_lake.FrozenLakeEnv()
+    assert env.model.to_dict() == env.P
+    assert env.model.probs.shape == (env.nS, env.nA, env.model.K)
+
+def test_assigning_P_recompiles_the_model():
+    env = frozen_lake.FrozenLakeEnv()
+    shared = env.model
+    P = copy.deepcopy(env.P)
+    # Every action from the start now leads straight to the goal
+    for a in range(env.nA):
+        P[0][a] = [(1.0, env.nS - 1, 1.0, True)]
+    env.P = P
+    assert env.P == P
+    assert env.model is not shared
+    assert frozen_lake.FrozenLakeEnv().model is shared
+    env._reset()
+    env.s = 0
+    assert env._step(0)[:3] == (env.nS - 1, 1.0, True)
+
+def test_P_is_read_only():
+    env = taxi.TaxiEnv()
+    for write in [lambda: env.P.__setitem__(0, {}),
+                  lambda: env.P[0].__setitem__(0, []),
+                  lambda: env.P[0][0].append((1.0, 0, 0, False)),
+                  lambda: env.P[0][0].__setitem__(0, (1.0, 0, 0, False))]:
+        try:
+            write()
+        except error.Error:
+            pass
+        else:
+            assert False, 'Expected writing to env.P to raise'
+    # Copies can be edited
+    assert type(copy.deepcopy(env.P)[0][0]) is list
+    assert type(pickle.loads(pickle.dumps(env.P))[0]) is dict
+
+def test_short_distribution_falls_back_to_first():
+    # categorical_sample picks index 0 when the draw lands past the
+    # total probability; the tables must do the same.
+    P = {0: {0: [(0.25, 1, 1.0, False), (0.25, 0, 0.0, True)]},
+         1: {0: [(1.0, 1, 0.0, True)]}}
+    model = discrete.TransitionModel.from_dict(P, 2, 1)
+    for u in [0.1, 0.3, 0.6, 0.99]:
+        assert discrete._searchsorted_sample(model.cumprobs[0, 0], model.counts[0, 0], u) == (np.cumsum([0.25, 0.25]) > u).argmax()
+
+def test_vector_env_follows_model():
+    env = taxi.TaxiEnv()
+    venv = discrete.DiscreteVectorEnv(env, 64)
+    states = venv.reset()
+    assert (env.isd[states] > 0).all()
+    for _ in xrange(300):
+        actions = np.random.randint(env.nA, size=64)
+        new_states, rewards, dones, infos = venv.step(actions)
+        for s, a, ns, r, d, info in zip(states, actions, new_states, rewards, dones, infos):
+            if d:
+                ns = info['terminal_observation']
+            assert any(p > 0 and (ns, r, d) == (t_ns, t_r, t_d) for p, t_ns, t_r, t_d in env.P[s][a]), (s, a, ns, r, d)
+        states = new_states
+
+def test_vector_env_deterministic_lake():
+    env = frozen_lake.FrozenLakeEnv(is_slippery=False)
+    venv = discrete.DiscreteVectorEnv(env, 3)
+    assert (venv.reset() == 0).all()
+    # Down, down, right, right, down, right reaches the goal
+    for action in [1, 1, 2, 2, 1]:
+        states, rewards, dones, _ = venv.step([action] * 3)
+        assert not dones.any()
+    states, rewards, dones, infos = venv.step([2] * 3)
+    assert dones.all() and (rewards == 1).all()
+    assert (states == 0).all()
+    assert all(info['terminal_observation'] == 15 for info in infos)
+
+def test_vector_env_timestep_limit():
+    env = frozen_lake.FrozenLakeEnv(is_slippery=False)
+    venv = discrete.DiscreteVectorEnv(env, 2, timestep_limit=3)
+    venv.reset()
+    for _ in xrange(2):
+        assert not venv.step([3, 3])[2].any()
+    assert venv.step([3, 3])[2].all()
+
+def _reference_lake_P(desc, is_slippery):
+    """FrozenLakeEnv's transitions as they were built before the
+    vectorized, cached models."""
+    desc = np.asarray(desc, dtype='c')
+    nrow, ncol = desc.shape
+    P = {s : {a : [] for a in xrange(4)} for s in xrange(nrow * ncol)}
+    def inc(row, col, a):
+        if a==0:
+            col = max(col-1,0)
+        elif a==1:
+            row = min(row+1,nrow-1)
+        elif a==2:
+            col = min(col+1,ncol-1)
+        elif a==3:
+            row = max(row-1,0)
+        return (row, col)
+    for row in xrange(nrow):
+        for col in xrange(ncol):
+            for a in xrange(4):
+                for b in ([(a-1)%4, a, (a+1)%4] if is_slippery else [a]):
+                    newrow, newcol = inc(row, col, b)
+                    letter = desc[newrow, newcol]
+                    P[row*ncol + col][a].append((1.0/3.0, newrow*ncol + newcol, float(letter == 'G'), letter in 'GH'))
+    return P
+
+def test_frozen_lake_model_matches_reference():
+    desc = ["SFFHF", "FHFFF", "FFFHG"]
+    for map_name, desc in [('4x4', None), ('8x8', None), (None, desc)]:
+        for is_slippery in [True, False]:
+            env = frozen_lake.FrozenLakeEnv(desc=desc, map_name=map_name, is_slippery=is_slippery)
+            assert env.P == _reference_lake_P(env.desc, is_slippery)
+
+def test_frozen_lake_model_cache():
+    first = frozen_lake.FrozenLakeEnv(map_name='8x8')
+    second = frozen_lake.FrozenLakeEnv(map_name='8x8')
+    assert first.model is second.model
+    assert not first.model.probs.flags.writeable
+    assert frozen_lake.FrozenLakeEnv(map_name='8x8', is_slippery=False).model is not first.model
+
+    for i in xrange(frozen_lake.MODEL_CACHE_SIZE):
+        frozen_lake.FrozenLakeEnv(desc=["S" + "F" * i + "G"])
+    assert len(frozen_lake._models) == frozen_lake.MODEL_CACHE_SIZE
+    assert frozen_lake.FrozenLakeEnv(map_name='8x8').model is not first.model
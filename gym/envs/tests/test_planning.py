@@ -0,0 +1,39 @@
+import numpy as np
+
+from gym.envs.toy_text import discrete, frozen_lake, planning, taxi
+
+def _loop_value_iteration(env, gamma, iterations):
+    """The slow reference: Bellman backups written against env.P."""
+    V = np.zeros(env.nS)
+    for _ in xrange(iterations):
+        V = np.array([max(sum(p * (r + gamma * (not d) * V[ns]) for p, ns, r, d in env.P[s][a])
+                          for a in xrange(env.nA))
+                      for s in xrange(env.nS)])
+    return V
+
+def test_matches_loop_reference():
+    env = frozen_lake.FrozenLakeEnv()
+    V, Q, policy, info = planning.value_iteration(env, gamma=0.9, tol=0, max_iterations=50)
+    assert info['iterations'] == 50
+    assert np.allclose(V, _loop_value_iteration(env, 0.9, 50))
+
+def test_two_state_chain():
+    # From state 0, action 1 pays 1 and ends; action 0 pays 0 and
+    # moves to state 1, where action 0 pays 10 and ends.
+    P = {0: {0: [(1.0, 1, 0.0, False)], 1: [(1.0, 0, 1.0, True)]},
+         1: {0: [(1.0, 1, 10.0, True)], 1: [(1.0, 1, 0.0, False)]}}
+    model = discrete.TransitionModel.from_dict(P, 2, 2)
+    for planner in [planning.value_iteration, planning.policy_iteration]:
+        V, Q, policy, info = planner(model, gamma=0.5)
+        assert info['converged']
+        assert np.allclose(V, [5, 10])
+        assert np.allclose(Q, [[5, 1], [10, 5]])
+        assert list(policy) == [0, 0]
+
+def test_value_and_policy_iteration_agree():
+    for env in [frozen_lake.FrozenLakeEnv(map_name='8x8'), taxi.TaxiEnv()]:
+        V, Q, policy, info = planning.value_iteration(env, gamma=0.95, tol=1e-10)
+        pi_V, pi_Q, pi_policy, pi_info = planning.policy_iteration(env, gamma=0.95)
+        assert info['converged'] and pi_info['converged']
+        assert np.allclose(V, pi_V, atol=1e-6)
+        assert np.allclose(planning.evaluate_policy(env, policy, gamma=0.95), pi_V, atol=1e-6)
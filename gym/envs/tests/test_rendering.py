@@ -0,0 +1,241 @@
+import ctypes
+
+import numpy as np
+
+from gym import envs, error
+from gym.envs.classic_control import rasterizer, rendering
+
+def _blank(width=20, height=10):
+    return np.full((height, width, 3), 255, dtype=np.uint8)
+
+def test_fill_polygon_covers_pixel_centers():
+    image = _blank()
+    rasterizer.fill_polygon(image, [(2, 1), (6, 1), (6, 4), (2, 4)], (1, 0, 0, 1))
+    painted = (image != 255).any(axis=2)
+    expected = np.zeros_like(painted)
+    expected[1:4, 2:6] = True
+    assert (painted == expected).all()
+    assert (image[1, 2] == [255, 0, 0]).all()
+
+def test_fill_polygon_clips_to_image():
+    image = _blank()
+    rasterizer.fill_polygon(image, [(-50, -50), (50, -50), (50, 50), (-50, 50)], (0, 0, 0, 1))
+    assert (image == 0).all()
+    rasterizer.fill_polygon(image, [(100, 100), (110, 100), (110, 110)], (1, 1, 1, 1))
+    assert (image == 0).all()
+
+def test_alpha_blending():
+    image = _blank()
+    rasterizer.fill_polygon(image, [(0, 0), (20, 0), (20, 10), (0, 10)], (0, 0, 0, 0.5))
+    assert (image == 128).all()
+
+def test_draw_segment_width():
+    image = _blank()
+    rasterizer.draw_segment(image, (0, 5), (20, 5), 1, (0, 0, 0, 1))
+    rows = np.nonzero((image == 0).all(axis=2).any(axis=1))[0]
+    assert list(rows) == [4, 5]
+    image = _blank()
+    rasterizer.draw_segment(image, (0, 5), (20, 5), 4, (0, 0, 0, 1))
+    rows = np.nonzero((image == 0).all(axis=2).any(axis=1))[0]
+    assert list(rows) == [3, 4, 5, 6]
+
+def test_transform_matches_gl_order():
+    # GL applies translate, then rotate, then scale to the vertices,
+    # i.e. the vertex is scaled first
+    t = rendering.Transform(translation=(10, 0), rotation=np.pi/2, scale=(2, 1))
+    points = rasterizer.transform_points(t.matrix(), [(1, 0)])
+    assert np.allclose(points, [(10, 2)])
+
+def test_software_viewer():
+    viewer = rendering.Viewer(40, 30, backend='software')
+    viewer.set_bounds(0, 4, 0, 3)
+    square = rendering.FilledPolygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+    square.set_color(0, 0, 1)
+    transform = rendering.Transform(translation=(2, 1))
+    square.add_attr(transform)
+    viewer.add_geom(square)
+    frame = viewer.render(return_rgb_array=True)
+    assert frame.shape == (30, 40, 3)
+    # get_array is top row first; the square covers y in [1, 2)
+    painted = (frame != 255).any(axis=2)
+    expected = np.zeros_like(painted)
+    expected[10:20, 20:30] = True
+    assert (painted == expected).all()
+    assert (frame[15, 25] == [0, 0, 255]).all()
+
+    # Onetime geoms only show up in one frame
+    viewer.draw_line((0, 0), (4, 3))
+    assert (viewer.render(return_rgb_array=True) == 0).all(axis=2).any()
+    assert not (viewer.render(return_rgb_array=True) == 0).all(axis=2).any()
+    viewer.close()
+
+def test_get_array_returns_new_frames():
+    from gym.monitoring import video_recorder
+    viewer = rendering.Viewer(40, 30, backend='software')
+    viewer.set_bounds(0, 4, 0, 3)
+    first = viewer.render(return_rgb_array=True)
+    viewer.draw_polygon([(0, 0), (4, 0), (4, 3)])
+    second = viewer.render(return_rgb_array=True)
+    assert (viewer.get_array() == second).all()
+    # Keeping frames around must not see them change
+    assert (first == 255).all() and not (second == 255).all()
+    assert video_recorder.frame_layout(second)[:2] == ('rgba', True)
+    viewer.close()
+
+def test_software_viewer_cannot_display():
+    old_backend = rendering.default_backend
+    rendering.default_backend = lambda: 'software'
+    try:
+        env = envs.make('CartPole-v0')
+        env.reset()
+        try:
+            env.render(mode='human')
+        except error.Error:
+            pass
+        else:
+            assert False
+        # rgb_array still works from the same viewer
+        assert env.render(mode='rgb_array').shape == (400, 600, 3)
+        env.render(close=True)
+    finally:
+        rendering.default_backend = old_backend
+
+def test_classic_control_rgb_array():
+    old_backend = rendering.default_backend
+    rendering.default_backend = lambda: 'software'
+    try:
+        for env_id in ['CartPole-v0', 'MountainCar-v0', 'Acrobot-v0', 'Pendulum-v0']:
+            env = envs.make(env_id)
+            env.reset()
+            frame = env.render(mode='rgb_array')
+            assert frame.dtype == np.uint8 and frame.ndim == 3 and frame.shape[2] == 3
+            # Something besides the background got drawn
+            assert (frame != 255).any()
+            env.render(close=True)
+    finally:
+        rendering.default_backend = old_backend
+
+def test_geoms_share_cached_shapes():
+    # Acrobot-style one-time geoms get rebuilt every frame, but reuse
+    # the same vertices
+    a = rendering.make_circle(.1)
+    b = rendering.make_circle(.1)
+    assert a.v is b.v
+    assert a._shape is b._shape
+    assert rendering.make_polygon([(0, 0), (1, 0), (1, 1)])._shape is rendering.FilledPolygon([(0., 0.), (1., 0.), (1., 1.)])._shape
+    assert not a._shape.vertices.flags.writeable
+
+    line = rendering.Line((0, 0), (1, 1))
+    line.end = (2, 2)
+    assert line.start == (0, 0) and line.end == (2, 2)
+    assert (line._shape.vertices == [(0, 0), (2, 2)]).all()
+
+class _FakeVertexList(object):
+    live = 0
+    def __init__(self, *args):
+        _FakeVertexList.live += 1
+    def draw(self, mode):
+        pass
+    def delete(self):
+        _FakeVertexList.live -= 1
+
+class _FakePyglet(object):
+    class graphics(object):
+        vertex_list = _FakeVertexList
+
+def test_shape_cache_releases_evicted_shapes():
+    old_pyglet, old_size = rendering.pyglet, rendering.SHAPE_CACHE_SIZE
+    rendering.pyglet, rendering.SHAPE_CACHE_SIZE = _FakePyglet, 4
+    rendering._shapes.clear()
+    try:
+        # Like a pendulum, whose vertices change every frame
+        # (Drawing shapes directly, since there is no GL to set colors)
+        kept = rendering.make_polygon([(0, 0), (1, 0), (1, 1)])
+        kept._shape.draw(None)
+        for i in range(20):
+            rendering.make_polygon([(0, 0), (i, 1), (1, i)])._shape.draw(None)
+            assert len(rendering._shapes) <= 4
+            assert _FakeVertexList.live <= 4
+        assert kept._shape.vertex_list is None
+
+        # Drawing an evicted shape goes through the cache, so it
+        # doesn't hold on to an untracked vertex list
+        kept._shape.draw(None)
+        assert kept._shape.vertex_list is None
+        assert rendering._shapes[kept._shape.key].vertex_list is not None
+        assert _FakeVertexList.live <= 4
+
+        rendering._release_vertex_lists()
+        assert _FakeVertexList.live == 0
+    finally:
+        rendering.pyglet, rendering.SHAPE_CACHE_SIZE = old_pyglet, old_size
+        rendering._shapes.clear()
+
+class _FakeWindow(object):
+    def flip(self):
+        pass
+
+def _fake_read_pixels(x, y, width, height, format, type, pixels):
+    # Rows come bottom to top, each pixel holding its row number
+    frame = np.ctypeslib.as_array(pixels, shape=(height, width, 4))
+    frame[:] = np.arange(height, dtype=np.uint8)[:, None, None]
+
+def test_pyglet_get_array():
+    fakes = {'glReadPixels': _fake_read_pixels, 'GL_RGBA': 0, 'GL_UNSIGNED_BYTE': 0, 'GLubyte': ctypes.c_ubyte}
+    saved = {name: getattr(rendering, name) for name in fakes if hasattr(rendering, name)}
+    for name, fake in fakes.items():
+        setattr(rendering, name, fake)
+    try:
+        # A pyglet viewer, minus the window
+        viewer = rendering.Viewer(4, 3, backend='software')
+        viewer.backend, viewer.window = 'pyglet', _FakeWindow()
+        frame = viewer.get_array()
+        assert frame.shape == (3, 4, 3)
+        assert (frame[:, 0, 0] == [2, 1, 0]).all()
+        assert viewer.get_array() is not frame and viewer.get_array().base is not frame.base
+    finally:
+        for name in fakes:
+            if name in saved:
+                setattr(rendering, name, saved[name])
+            else:
+                delattr(rendering, name)
+
+def _check_batch_matches_viewer(env_id, make_batch_renderer, states):
+    frames = make_batch_renderer().render(states)
+    env = envs.make(env_id)
+    env.reset()
+    old_backend = rendering.default_backend
+    rendering.default_backend = lambda: 'software'
+    try:
+        for state, frame in zip(states, frames):
+            env.state = state
+            assert (env.render(mode='rgb_array') == frame).all()
+    finally:
+        env.render(close=True)
+        rendering.default_backend = old_backend
+
+def test_cartpole_batch_renderer_matches_viewer():
+    from gym.envs.classic_control import cartpole
+    states = np.random.uniform([-2.4, 0, -.21, 0], [2.4, 0, .21, 0], size=(10, 4))
+    _check_batch_matches_viewer('CartPole-v0', cartpole.make_batch_renderer, states)
+
+def test_acrobot_batch_renderer_matches_viewer():
+    from gym.envs.classic_control import acrobot
+    states = np.random.uniform([-np.pi, -np.pi, 0, 0], [np.pi, np.pi, 0, 0], size=(10, 4))
+    _check_batch_matches_viewer('Acrobot-v0', acrobot.make_batch_renderer, states)
+
+def test_batch_renderer_chunks_and_scales():
+    from gym.envs.classic_control import cartpole
+    states = np.random.uniform(-.2, .2, size=(7, 4))
+    renderer = cartpole.make_batch_renderer(150, 100)
+    frames = renderer.render(states)
+    assert frames.shape == (7, 100, 150, 3)
+    renderer.chunk_size = 3
+    assert (renderer.render(states) == frames).all()
+
+def test_vector_env_render():
+    from gym.envs.classic_control import AcrobotVectorEnv
+    venv = AcrobotVectorEnv(5)
+    venv.reset()
+    frames = venv.render()
+    assert frames.shape == (5, 500, 500, 3) and frames.dtype == np.uint8
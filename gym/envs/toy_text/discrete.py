@@ -1,5 +1,7 @@
 from gym import Env
+from gym import error
 from gym import spaces
+from gym.vector import BatchedVectorEnv
 import numpy as np
 
 def categorical_sample(prob_n):
@@ -11,30 +13,225 @@ def categorical_sample(prob_n):
     csprob_n = np.cumsum(prob_n)
     return (csprob_n > np.random.rand()).argmax()
 
+def _searchsorted_sample(csprob_n, count, u):
+    """Same outcome as categorical_sample for cumulative probabilities
+    csprob_n (of which the first `count` are real) and the uniform draw
+    u: the first index whose cumulative probability exceeds u, or 0 if
+    there is none."""
+    i = csprob_n.searchsorted(u, side='right')
+    return i if i < count else 0
+
+def _batch_searchsorted_sample(csprob_nk, count_n, u_n):
+    """_searchsorted_sample applied to each row of csprob_nk. Rows are
+    sorted, so counting the entries <= u is searchsorted(side='right')."""
+    i = (csprob_nk <= u_n[:, None]).sum(axis=1)
+    i[i >= count_n] = 0
+    return i
+
+def _read_only(*args, **kwargs):
+    raise error.Error("DiscreteEnv.P is read-only, since the env steps through the model compiled from it; "
+                      "to change the dynamics, assign a new P (e.g. P = copy.deepcopy(env.P), edit it, then env.P = P)")
+
+class _FrozenList(list):
+    """A list that raises on writes; copies and pickles are plain lists"""
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+    def __reduce__(self):
+        return (list, (list(self),))
+
+class _FrozenDict(dict):
+    """A dict that raises on writes; copies and pickles are plain dicts"""
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+def _freeze(P):
+    """A read-only copy of P[s][a] == [(probability, nextstate, reward, done), ...]"""
+    frozen = {s : _FrozenDict((a, _FrozenList(transitions)) for a, transitions in P_s.items())
+              for s, P_s in P.items()}
+    return _FrozenDict(frozen)
+
+class TransitionModel(object):
+    """Dense array form of a DiscreteEnv transition model.
+
+    The transitions out of each (state, action) pair are padded to a
+    common length K, giving arrays indexed by [s, a, k]:
+
+        probs: transition probabilities (0 for padding)
+        cumprobs: cumulative probabilities (inf for padding), for sampling with searchsorted
+        next_states: successor states (0 for padding)
+        rewards: rewards (0 for padding), of the type P's rewards had
+        dones: whether the transition ends the episode (False for padding)
+
+    plus `counts[s, a]`, the number of real transitions.
+
+    Args:
+        probs, next_states, rewards, dones (np.ndarray): As above, of shape (nS, nA, K)
+        counts (np.ndarray): As above, of shape (nS, nA)
+    """
+
+    def __init__(self, probs, next_states, rewards, dones, counts):
+        self.nS, self.nA, self.K = probs.shape
+        self.probs = probs
+        self.next_states = next_states
+        self.rewards = rewards
+        self.dones = dones
+        self.counts = counts
+
+        padding = np.arange(self.K) >= counts[:, :, None]
+        self.cumprobs = np.cumsum(probs, axis=2)
+        self.cumprobs[padding] = np.inf
+
+    @classmethod
+    def from_dict(cls, P, nS, nA):
+        """Builds the dense arrays from P[s][a] == [(probability, nextstate, reward, done), ...]."""
+        counts = np.zeros((nS, nA), dtype=np.int64)
+        for s in range(nS):
+            for a in range(nA):
+                counts[s, a] = len(P[s][a])
+        K = max(1, counts.max())
+        # Keep e.g. Taxi's integer rewards integers
+        all_rewards = [r for s in range(nS) for a in range(nA) for _, _, r, _ in P[s][a]]
+        reward_dtype = np.asarray(all_rewards).dtype if all_rewards else np.float64
+
+        probs = np.zeros((nS, nA, K))
+        next_states = np.zeros((nS, nA, K), dtype=np.int64)
+        rewards = np.zeros((nS, nA, K), dtype=reward_dtype)
+        dones = np.zeros((nS, nA, K), dtype=np.bool_)
+        for s in range(nS):
+            for a in range(nA):
+                for k, (p, ns, r, d) in enumerate(P[s][a]):
+                    probs[s, a, k] = p
+                    next_states[s, a, k] = ns
+                    rewards[s, a, k] = r
+                    dones[s, a, k] = d
+        return cls(probs, next_states, rewards, dones, counts)
+
+    def to_dict(self):
+        """Rebuilds P[s][a] == [(probability, nextstate, reward, done), ...]."""
+        return {s : {a : [(float(self.probs[s, a, k]), int(self.next_states[s, a, k]),
+                          self.rewards.item(s, a, k), bool(self.dones[s, a, k]))
+                          for k in range(self.counts[s, a])]
+                     for a in range(self.nA)}
+                for s in range(self.nS)}
+
+    def sample(self, s, a):
+        """Samples the index k of the transition taken from (s, a),
+        consuming one np.random.rand() draw, exactly like
+        categorical_sample."""
+        return _searchsorted_sample(self.cumprobs[s, a], self.counts[s, a], np.random.rand())
+
+    def sample_batch(self, states, actions):
+        """Vectorized `sample`: samples one transition index per row of
+        the int arrays `states` and `actions`, using a single
+        np.random.rand(N) draw."""
+        return _batch_searchsorted_sample(self.cumprobs[states, actions], self.counts[states, actions], np.random.rand(len(states)))
 
 class DiscreteEnv(Env):
-    def __init__(self, nS, nA, P, isd):
+    def __init__(self, nS, nA, P, isd, model=None):
         """
         Compute a transition probabilities, of the form
         P[s][a] == [(probability, nextstate, reward, done)]
 
         also compute initial state distribution
+
+        P is compiled once into a TransitionModel (available as
+        `model`), which is what _step samples from. Alternatively,
+        pass an already compiled `model` and P=None; P is then only
+        built from the model if something asks for it.
+
+        Since _step samples from the model, `env.P` is a read-only
+        copy of P: writing to it (e.g. `env.P[s][a] = [...]`) raises
+        rather than silently leaving the dynamics as they were. To
+        change them, assign a new P, which recompiles it into a new
+        model of this env's own; models shared with other envs, like
+        FrozenLake's cached ones, are left untouched. Deep copies of
+        `env.P` are plain, writable dicts and lists:
+
+            P = copy.deepcopy(env.P)
+            P[s][a] = [(1.0, nextstate, reward, done)]
+            env.P = P
         """
         self.action_space = spaces.Discrete(nA)
         self.observation_space = spaces.Discrete(nS)
+        self.nS = nS
         self.nA = nA
-        self.P = P
+        self._P = None if P is None else _freeze(P)
         self.isd = isd
+        if model is None:
+            model = TransitionModel.from_dict(P, nS, nA)
+        self.model = model
+        self._isd_cumsum = np.cumsum(isd)
         self.lastaction=None # for rendering
 
+    @property
+    def P(self):
+        if self._P is None:
+            self._P = _freeze(self.model.to_dict())
+        return self._P
+
+    @P.setter
+    def P(self, P):
+        self.model = TransitionModel.from_dict(P, self.nS, self.nA)
+        self._P = _freeze(P)
+
     def _reset(self):
-        self.s = categorical_sample(self.isd)
+        self.s = int(_searchsorted_sample(self._isd_cumsum, len(self._isd_cumsum), np.random.rand()))
         return self.s
 
     def _step(self, a):
-        transitions = self.P[self.s][a]
-        i = categorical_sample([t[0] for t in transitions])
-        p, s, r, d= transitions[i]
+        m = self.model
+        i = m.sample(self.s, a)
+        # .item() hands back Python scalars without building numpy ones
+        p, s, r, d = m.probs.item(self.s, a, i), m.next_states.item(self.s, a, i), m.rewards.item(self.s, a, i), m.dones.item(self.s, a, i)
         self.s = s
         self.lastaction=a
         return (s, r, d, {"prob" : p})
+
+class DiscreteVectorEnv(BatchedVectorEnv):
+    """Steps `num_envs` independent copies of a DiscreteEnv at once.
+
+    The copies share `env`'s TransitionModel; their current states
+    are held in one int array, and each step samples every row's
+    transition with a single random draw and gathers the next states,
+    rewards and dones out of the model's tables. Finished rows are
+    reset from `env.isd`.
+
+    Args:
+        env (DiscreteEnv): The environment to copy, e.g. a FrozenLakeEnv or TaxiEnv
+        num_envs (int): How many copies to step
+        timestep_limit (Optional[int]): End episodes after this many steps (defaults to that of env.spec, if any)
+
+    Example:
+
+        venv = DiscreteVectorEnv(FrozenLakeEnv(map_name='8x8'), 4096)
+        states = venv.reset()
+        states, rewards, dones, infos = venv.step(np.random.randint(4, size=4096))
+    """
+
+    def __init__(self, env, num_envs, timestep_limit=None):
+        self.num_envs = num_envs
+        if timestep_limit is None and env.spec is not None:
+            timestep_limit = env.spec.timestep_limit
+        self.timestep_limit = timestep_limit
+        self.model = env.model
+        self._isd_cumsum = env._isd_cumsum
+        self.action_space = env.action_space
+        self.observation_space = env.observation_space
+        self.s = np.zeros(num_envs, dtype=np.int64)
+
+    def _reset_rows(self, rows):
+        u = np.random.rand(len(rows))
+        self.s[rows] = _batch_searchsorted_sample(self._isd_cumsum[None, :], len(self._isd_cumsum), u)
+
+    def _step_batch(self, actions):
+        m = self.model
+        i = m.sample_batch(self.s, actions)
+        # VectorEnvs return float rewards, whatever the model holds
+        rewards = m.rewards[self.s, actions, i].astype(np.float64, copy=False)
+        dones = m.dones[self.s, actions, i]
+        self.s = m.next_states[self.s, actions, i]
+        return rewards, dones
+
+    def _get_obs(self):
+        return self.s.copy()
@@ -1,3 +1,4 @@
+import collections
 import numpy as np
 import StringIO, sys
 
@@ -28,6 +29,55 @@ MAPS = {
     ],
 }
 
+# Compiled transition models of recently used maps, most recent last
+_models = collections.OrderedDict()
+MODEL_CACHE_SIZE = 32
+
+def _get_model(desc, is_slippery):
+    """Returns the (shared, read-only) TransitionModel for a map,
+    building it only if it isn't among the MODEL_CACHE_SIZE most
+    recently used ones."""
+    key = (desc.shape, desc.tostring(), is_slippery)
+    model = _models.pop(key, None)
+    if model is None:
+        model = _build_model(desc, is_slippery)
+        while len(_models) >= MODEL_CACHE_SIZE:
+            _models.popitem(last=False)
+    _models[key] = model
+    return model
+
+def _build_model(desc, is_slippery):
+    nrow, ncol = desc.shape
+    row, col = np.indices(desc.shape).reshape(2, -1)
+
+    # The cell reached by moving LEFT, DOWN, RIGHT, UP from each state
+    moved = np.stack([
+        row*ncol + np.maximum(col-1, 0),
+        np.minimum(row+1, nrow-1)*ncol + col,
+        row*ncol + np.minimum(col+1, ncol-1),
+        np.maximum(row-1, 0)*ncol + col,
+    ], axis=1)
+
+    # On slippery ice, action a goes in direction (a-1)%4, a or (a+1)%4
+    if is_slippery:
+        directions = (np.arange(4)[:, None] + np.arange(-1, 2)) % 4
+    else:
+        directions = np.arange(4)[:, None]
+    next_states = moved[:, directions]
+
+    letters = desc.ravel()[next_states]
+    rewards = (letters == 'G').astype('float64')
+    dones = (letters == 'G') | (letters == 'H')
+    # Non-slippery moves also carry probability 1/3, as they always
+    # have; sampling falls back to the only transition regardless.
+    probs = np.full(next_states.shape, 1.0/3.0)
+    counts = np.full(next_states.shape[:2], next_states.shape[2], dtype=np.int64)
+
+    model = discrete.TransitionModel(probs, next_states, rewards, dones, counts)
+    for array in [model.probs, model.cumprobs, model.next_states, model.rewards, model.dones, model.counts]:
+        array.flags.writeable = False
+    return model
+
 class FrozenLakeEnv(discrete.DiscreteEnv):
     """
     Winter is here. You and your friends were tossing around a frisbee at the park
@@ -70,43 +120,8 @@ class FrozenLakeEnv(discrete.DiscreteEnv):
         isd = (desc == 'S').ravel().astype('float64')
         isd /= isd.sum()
 
-        P = {s : {a : [] for a in xrange(nA)} for s in xrange(nS)}
-
-        def to_s(row, col):
-            return row*ncol + col
-        def inc(row, col, a):
-            if a==0:
-                col = max(col-1,0)
-            elif a==1:
-                row = min(row+1,nrow-1)
-            elif a==2:
-                col = min(col+1,ncol-1)
-            elif a==3:
-                row = max(row-1,0)
-            return (row, col)
-
-        for row in xrange(nrow):
-            for col in xrange(ncol):
-                s = to_s(row, col)
-                for a in xrange(4):
-                    li = P[s][a]
-                    if is_slippery:
-                        for b in [(a-1)%4, a, (a+1)%4]:
-                            newrow, newcol = inc(row, col, b)
-                            newstate = to_s(newrow, newcol)
-                            letter = desc[newrow, newcol]
-                            done = letter in 'GH'
-                            rew = float(letter == 'G')
-                            li.append((1.0/3.0, newstate, rew, done))
-                    else:
-                        newrow, newcol = inc(row, col, a)
-                        newstate = to_s(newrow, newcol)
-                        letter = desc[newrow, newcol]
-                        done = letter in 'GH'
-                        rew = float(letter == 'G')
-                        li.append((1.0/3.0, newstate, rew, done))
-
-        super(FrozenLakeEnv, self).__init__(nrow * ncol, 4, P, isd)
+        model = _get_model(desc, is_slippery)
+        super(FrozenLakeEnv, self).__init__(nS, nA, None, isd, model=model)
 
     def _render(self, mode='human', close=False):
         if close:
@@ -0,0 +1,143 @@
+"""
+Exact planners for DiscreteEnv transition models.
+
+Both planners treat a transition flagged `done` as ending the episode,
+so it contributes its reward but no value from the next state:
+
+    Q[s, a] = sum_k probs[s, a, k] * (rewards[s, a, k] + gamma * (1 - dones[s, a, k]) * V[next_states[s, a, k]])
+
+Example:
+
+    env = FrozenLakeEnv(map_name='8x8')
+    V, Q, policy, info = value_iteration(env, gamma=0.99)
+"""
+import numpy as np
+
+from gym import error
+
+def _get_model(env):
+    # Accept either a DiscreteEnv or its TransitionModel
+    return getattr(env, 'model', env)
+
+class _Backup(object):
+    """Precomputes the parts of the Bellman backup that do not depend
+    on V."""
+
+    def __init__(self, model):
+        self.model = model
+        self.expected_reward = (model.probs * model.rewards).sum(axis=2)
+        self.continue_probs = model.probs * ~model.dones
+
+    def q_values(self, V, gamma):
+        return self.expected_reward + gamma * (self.continue_probs * V[self.model.next_states]).sum(axis=2)
+
+def _check_gamma(gamma, upper):
+    if not 0 <= gamma <= upper:
+        raise error.Error('Discount factor must be in [0, {}], but got gamma={}'.format(upper, gamma))
+
+def value_iteration(env, gamma=0.99, tol=1e-8, max_iterations=10000):
+    """Computes optimal values by repeated Bellman optimality backups,
+    applied to all states at once.
+
+    Args:
+        env (DiscreteEnv or TransitionModel): The model to plan in
+        gamma (float): The discount factor
+        tol (float): Stop once no state value changes by more than this in an iteration
+        max_iterations (int): Give up after this many iterations
+
+    Returns:
+        (V, Q, policy, info)
+
+        V (np.ndarray): state values, of shape (nS,)
+        Q (np.ndarray): action values, of shape (nS, nA)
+        policy (np.ndarray): a greedy action for each state, of shape (nS,)
+        info (dict): 'iterations' run, whether the values 'converged', and the final max value change 'delta'
+    """
+    _check_gamma(gamma, 1)
+    backup = _Backup(_get_model(env))
+    V = np.zeros(backup.model.nS)
+    delta = np.inf
+    iterations = 0
+    while iterations < max_iterations and delta > tol:
+        Q = backup.q_values(V, gamma)
+        new_V = Q.max(axis=1)
+        delta = np.abs(new_V - V).max()
+        V = new_V
+        iterations += 1
+    Q = backup.q_values(V, gamma)
+    info = {'iterations': iterations, 'converged': bool(delta <= tol), 'delta': float(delta)}
+    return V, Q, Q.argmax(axis=1), info
+
+def evaluate_policy(env, policy, gamma=0.99):
+    """Computes the values of a deterministic policy exactly, by solving
+    the (nS, nS) linear system V = R_pi + gamma * P_pi V.
+
+    Args:
+        env (DiscreteEnv or TransitionModel): The model to evaluate in
+        policy (np.ndarray): An action for each state
+        gamma (float): The discount factor; must be below 1 so that the system is solvable
+
+    Returns:
+        V (np.ndarray): state values, of shape (nS,)
+    """
+    _check_gamma(gamma, 1)
+    if gamma == 1:
+        raise error.Error('Exact policy evaluation needs gamma < 1')
+    backup = _Backup(_get_model(env))
+    return _evaluate(backup, np.asarray(policy), gamma)
+
+def _evaluate(backup, policy, gamma):
+    model = backup.model
+    states = np.arange(model.nS)
+    P_pi = np.zeros((model.nS, model.nS))
+    rows = np.repeat(states, model.K)
+    np.add.at(P_pi, (rows, model.next_states[states, policy].ravel()), backup.continue_probs[states, policy].ravel())
+    A = np.eye(model.nS) - gamma * P_pi
+    return np.linalg.solve(A, backup.expected_reward[states, policy])
+
+def policy_iteration(env, gamma=0.99, tol=1e-8, max_iterations=1000):
+    """Computes an optimal policy by alternating exact policy evaluation
+    with greedy improvement, starting from always taking action 0.
+
+    An action is only switched when another is better by more than
+    `tol`, so ties cannot make the policy cycle.
+
+    Args:
+        env (DiscreteEnv or TransitionModel): The model to plan in
+        gamma (float): The discount factor; must be below 1
+        tol (float): How much better an action must be to switch to it
+        max_iterations (int): Give up after this many improvement steps
+
+    Returns:
+        (V, Q, policy, info)
+
+        V (np.ndarray): values of the returned policy, of shape (nS,)
+        Q (np.ndarray): action values with respect to V, of shape (nS, nA)
+        policy (np.ndarray): the final policy, of shape (nS,)
+        info (dict): 'iterations' run, whether the policy 'converged' (stopped changing), and the max value change 'delta' of the last iteration
+    """
+    _check_gamma(gamma, 1)
+    if gamma == 1:
+        raise error.Error('Policy iteration needs gamma < 1')
+    backup = _Backup(_get_model(env))
+    states = np.arange(backup.model.nS)
+    policy = np.zeros(backup.model.nS, dtype=np.int64)
+    V = np.zeros(backup.model.nS)
+    Q = backup.q_values(V, gamma)
+    delta = np.inf
+    converged = False
+    iterations = 0
+    while iterations < max_iterations:
+        new_V = _evaluate(backup, policy, gamma)
+        delta = np.abs(new_V - V).max()
+        V = new_V
+        Q = backup.q_values(V, gamma)
+        iterations += 1
+        best = Q.argmax(axis=1)
+        improve = Q[states, best] > Q[states, policy] + tol
+        if not improve.any():
+            converged = True
+            break
+        policy = np.where(improve, best, policy)
+    info = {'iterations': iterations, 'converged': converged, 'delta': float(delta)}
+    return V, Q, policy, info
@@ -1,20 +1,28 @@
 import atexit
+import heapq
+import itertools
 import logging
 import json
 import numpy as np
 import os
+import shutil
 import six
 import sys
 import threading
 import weakref
 
 from gym import error, version
-from gym.monitoring import stats_recorder, video_recorder
+from gym.monitoring import stats_recorder, timing, video_recorder
+from gym.utils import atomic_write
 
 logger = logging.getLogger(__name__)
 
 FILE_PREFIX = 'openaigym'
 MANIFEST_PREFIX = FILE_PREFIX + '.manifest'
+# Every monitor registers its manifest in this directory on close,
+# as an entry of the same name, so that the results can be found
+# without listing the directory of results itself
+INDEX_DIR = FILE_PREFIX + '.index'
 
 i = -1
 lock = threading.Lock()
@@ -24,7 +32,47 @@ def next_monitor_id():
         i += 1
         return i
 
+def register_manifest(training_dir, manifest_path):
+    """Registers the manifest in the directory's index. Register a
+    manifest only once it has been completely written.
+
+    Each manifest gets an entry of its own, which appears through a
+    rename, so concurrent workers never write to the same file, and
+    readers never see a partial entry, even on NFS."""
+    index_dir = os.path.join(training_dir, INDEX_DIR)
+    try:
+        os.mkdir(index_dir)
+    except OSError:
+        # Another worker may have just made it
+        if not os.path.isdir(index_dir):
+            raise
+    with atomic_write(os.path.join(index_dir, os.path.basename(manifest_path))):
+        pass
+
+def read_index(training_dir):
+    """The paths of the manifests registered in the directory's index,
+    sorted; or None if it has no index"""
+    index_dir = os.path.join(training_dir, INDEX_DIR)
+    if not os.path.isdir(index_dir):
+        return None
+    manifests = []
+    # Entries still being written start with a dot
+    for name in sorted(os.listdir(index_dir)):
+        if name.startswith('.'):
+            continue
+        path = os.path.join(training_dir, name)
+        if not os.path.exists(path):
+            logger.warn('Ignoring %s, registered in %s but missing', name, index_dir)
+            continue
+        manifests.append(path)
+    return manifests
+
 def detect_training_manifests(training_dir):
+    """The manifests in the directory, from its index if it has one.
+    Directories written before the index existed are scanned instead."""
+    manifests = read_index(training_dir)
+    if manifests is not None:
+        return manifests
     return [os.path.join(training_dir, f) for f in os.listdir(training_dir) if f.startswith(MANIFEST_PREFIX + '.')]
 
 def detect_monitor_files(training_dir):
@@ -37,7 +85,11 @@ def clear_monitor_files(training_dir):
 
     logger.info('Clearing %d monitor files from previous run (because force=True was provided)', len(files))
     for file in files:
-        os.unlink(file)
+        if os.path.isdir(file):
+            # The index
+            shutil.rmtree(file)
+        else:
+            os.unlink(file)
 
 def capped_cubic_video_schedule(episode_id):
     if episode_id < 1000:
@@ -77,6 +129,10 @@ class Monitor(object):
     Monitor supports multiple threads and multiple processes writing
     to the same directory of training data. The data will later be
     joined by scoreboard.upload_training_data and on the server.
+    Each monitor's files are written under a temporary name and
+    renamed into place when complete, and its manifest is then
+    registered in the directory's 'openaigym.index' directory, which
+    load_results reads instead of listing the directory.
 
     Args:
         env (gym.Env): The environment instance to monitor.
@@ -92,6 +148,8 @@ class Monitor(object):
 
         self.stats_recorder = None
         self.video_recorder = None
+        self.encoder_pool = None
+        self.profile = None
         self.enabled = False
         self.episode_id = 0
 
@@ -99,14 +157,22 @@ class Monitor(object):
 
         ensure_close_at_exit(self)
 
-    def start(self, directory, video_callable=None, force=False):
+    def start(self, directory, video_callable=None, force=False, stats_format='json', async_video=False, video_backpressure='block', warm_video_encoders=False, ansi_keyframe_interval=None, profile=False):
         """Start monitoring.
 
         Args:
             directory (str): A per-training run directory where to record stats.
             video_callable: function that takes in the index of the episode and outputs a boolean, indicating whether we should record a video on this episode. The default is to take perfect cubes.
             force (bool): Clear out existing training data from this directory (by deleting every file prefixed with "openaigym.").
+            stats_format (str): How to store episode stats: 'json' writes them all on close, 'binary' does the same in a compact columnar format, and 'jsonl' streams them to disk in batches as episodes finish, for long runs. See StatsRecorder.
+            async_video (bool): Encode video frames on a background thread, so that recording doesn't slow down stepping.
+            video_backpressure (str): With async_video, what to do when the encoder falls behind: 'block', 'drop_oldest' or 'drop_newest'. See AsyncEncoder.
+            warm_video_encoders (bool): Keep a video encoder process started ahead of time, so recording an episode doesn't wait for one to spawn. See ImageEncoderPool.
+            ansi_keyframe_interval (Optional[int]): For text environments, record only the changes between frames, with a whole frame every this many frames. See TextEncoder.
+            profile (bool): Record histograms of how long the env's steps and resets, the monitor's bookkeeping, rendering and video encoding take, in the monitor's `profile`. They are saved with the other results, and summed up in load_results. See gym.monitoring.timing.
         """
+        # Check the arguments before touching the directory or the env
+        stats_recorder.check_stats_format(stats_format)
         if self.env.spec is None:
             logger.warn("Trying to monitor an environment which has no 'spec' set. This usually means you did not create it via 'gym.make', and is recommended only for advanced users.")
 
@@ -129,15 +195,29 @@ class Monitor(object):
 
 
         self.enabled = True
+        # Only profiling monitors time anything
+        self.profile = timing.Profile() if profile else None
+        if profile:
+            # Kept at hand for _step and _reset
+            self._clock = timing.clock
+            self._add_step_time = self.profile.step.add
+            self._add_stats_time = self.profile.stats.add
+            self._profile_flush_at = timing.clock() + timing.FLUSH_INTERVAL
         self.directory = os.path.abspath(directory)
         # We use the 'openai-gym' prefix to determine if a file is
         # ours
         self.file_prefix = FILE_PREFIX
         self.file_infix = str(self.monitor_id)
-        self.stats_recorder = stats_recorder.StatsRecorder(directory, '{}.episode_batch.{}'.format(self.file_prefix, self.file_infix))
+        self.stats_recorder = stats_recorder.StatsRecorder(directory, '{}.episode_batch.{}'.format(self.file_prefix, self.file_infix), stats_format=stats_format)
+        self.async_video = async_video
+        self.video_backpressure = video_backpressure
+        self.encoder_pool = video_recorder.ImageEncoderPool() if warm_video_encoders else None
+        self.ansi_keyframe_interval = ansi_keyframe_interval
         self.configure(video_callable=video_callable)
         if not os.path.exists(directory):
             os.mkdir(directory)
+        # Route the env's step and reset through _step and _reset
+        self.env._monitor_running = True
 
     def close(self):
         """Flush all monitor data to disk and close any open rending windows."""
@@ -149,6 +229,9 @@ class Monitor(object):
             stats_file = self.stats_recorder.close()
         if self.video_recorder is not None:
             self._close_video_recorder()
+        if self.encoder_pool is not None:
+            self.encoder_pool.close()
+            self.encoder_pool = None
         # Note we'll close the env's rendering window even if we did
         # not open it. There isn't a particular great way to know if
         # we did, since some environments will have a window pop up
@@ -164,22 +247,30 @@ class Monitor(object):
             # because we couldn't close the renderer.
             logger.error('Could not close renderer for %s: %s', key, e)
 
+        manifest = {
+            'stats': os.path.basename(stats_file),
+            'videos': [(os.path.basename(v), os.path.basename(m))
+                       for v, m in self.videos],
+            'env_info': self._env_info(),
+        }
+        if self.profile is not None:
+            profile_path = os.path.join(self.directory, '{}.profile.{}.{}.profile.json'.format(self.file_prefix, self.file_infix, os.getpid()))
+            timing.save_profile(profile_path, self.profile)
+            manifest['profile'] = os.path.basename(profile_path)
+
         # Give it a very distiguished name, since we need to pick it
         # up from the filesystem later.
         path = os.path.join(self.directory, '{}.manifest.{}.{}.manifest.json'.format(self.file_prefix, self.file_infix, os.getpid()))
         logger.debug('Writing training manifest file to %s', path)
-        with open(path, 'w') as f:
+        with atomic_write(path) as f:
             # We need to write relative paths here since people may
             # move the training_dir around. It would be cleaner to
             # already have the basenames rather than basename'ing
             # manually, but this works for now.
-            json.dump({
-                'stats': os.path.basename(stats_file),
-                'videos': [(os.path.basename(v), os.path.basename(m))
-                           for v, m in self.videos],
-                'env_info': self._env_info(),
-            }, f)
+            json.dump(manifest, f)
+        register_manifest(self.directory, path)
         self.enabled = False
+        self.env._monitor_running = False
         # Stop tracking this for autoclose
         del monitors[self.monitor_id]
 
@@ -193,6 +284,57 @@ class Monitor(object):
         if video_callable is not None:
             self.video_callable = video_callable
 
+    # While the monitor is running, the env's step and reset call
+    # these instead of its own _step and _reset. With profile=True,
+    # they time each phase on the way (the video recorder times its
+    # own); the profiled step is written out inline, since every call
+    # and attribute lookup shows up in its overhead.
+    def _step(self, action):
+        if self.profile is None:
+            self._before_step(action)
+            observation, reward, done, info = self.env._step(action)
+            done = self._after_step(observation, reward, done, info)
+            return observation, reward, done, info
+
+        clock = self._clock
+        t0 = clock()
+        self.stats_recorder.before_step(action)
+        t1 = clock()
+        observation, reward, done, info = self.env._step(action)
+        t2 = clock()
+        done = self._record_step(observation, reward, done, info)
+        t3 = clock()
+        self._add_step_time(t2 - t1)
+        self._add_stats_time(t1 - t0 + t3 - t2)
+        if t3 >= self._profile_flush_at:
+            self._flush_profile(t3)
+        self.video_recorder.capture_frame()
+        return observation, reward, done, info
+
+    def _reset(self):
+        if self.profile is None:
+            self._before_reset()
+            observation = self.env._reset()
+            self._after_reset(observation)
+            return observation
+
+        clock = self._clock
+        t0 = clock()
+        self.stats_recorder.before_reset()
+        t1 = clock()
+        observation = self.env._reset()
+        t2 = clock()
+        self.stats_recorder.after_reset(observation)
+        t3 = clock()
+        self.profile.reset.add(t2 - t1)
+        self._add_stats_time(t1 - t0 + t3 - t2)
+        self._start_video_recorder()
+        return observation
+
+    def _flush_profile(self, now):
+        self.profile.flush()
+        self._profile_flush_at = now + timing.FLUSH_INTERVAL
+
     def _before_step(self, action):
         if not self.enabled: return
         self.stats_recorder.before_step(action)
@@ -200,6 +342,13 @@ class Monitor(object):
     def _after_step(self, observation, reward, done, info):
         if not self.enabled: return done
 
+        done = self._record_step(observation, reward, done, info)
+        # Record video
+        self.video_recorder.capture_frame()
+
+        return done
+
+    def _record_step(self, observation, reward, done, info):
         # Add 1 since about to take another step
         if self.env.spec and self.stats_recorder.steps+1 >= self.env.spec.timestep_limit:
             logger.info('Ending episode %i because it reached the timestep limit of %i.', self.episode_id, self.env.spec.timestep_limit)
@@ -207,12 +356,8 @@ class Monitor(object):
 
         # Record stats
         self.stats_recorder.after_step(observation, reward, done, info)
-        # Record video
-        self.video_recorder.capture_frame()
-
         return done
 
-
     def _before_reset(self):
         if not self.enabled: return
         self.stats_recorder.before_reset()
@@ -223,6 +368,9 @@ class Monitor(object):
         # Reset the stat count
         self.stats_recorder.after_reset(observation)
 
+        self._start_video_recorder()
+
+    def _start_video_recorder(self):
         # Close any existing video recorder
         if self.video_recorder:
             self._close_video_recorder()
@@ -233,6 +381,11 @@ class Monitor(object):
             base_path=os.path.join(self.directory, '{}.video.{}.{}.video{:06}'.format(self.file_prefix, self.file_infix, os.getpid(), self.episode_id)),
             metadata={'episode_id': self.episode_id},
             enabled=self._video_enabled(),
+            async_encoding=self.async_video,
+            backpressure=self.video_backpressure,
+            encoder_pool=self.encoder_pool,
+            ansi_keyframe_interval=self.ansi_keyframe_interval,
+            profile=self.profile,
         )
         self.video_recorder.capture_frame()
 
@@ -274,6 +427,7 @@ def load_results(training_dir):
     stats_files = []
     videos = []
     env_infos = []
+    profile_files = []
 
     for manifest in manifests:
         with open(manifest) as f:
@@ -283,6 +437,8 @@ def load_results(training_dir):
             videos += [(os.path.join(training_dir, v), os.path.join(training_dir, m))
                        for v, m in contents['videos']]
             env_infos.append(contents['env_info'])
+            if 'profile' in contents:
+                profile_files.append(os.path.join(training_dir, contents['profile']))
 
     env_info = collapse_env_infos(env_infos, training_dir)
     timestamps, episode_lengths, episode_rewards, initial_reset_timestamp = merge_stats_files(stats_files)
@@ -295,29 +451,123 @@ def load_results(training_dir):
         'episode_rewards': episode_rewards,
         'initial_reset_timestamp': initial_reset_timestamp,
         'videos': videos,
+        # Summed over the monitors that had profile=True, if any
+        'profile': timing.merge_profile_files(profile_files) if profile_files else None,
     }
 
-def merge_stats_files(stats_files):
-    timestamps = []
-    episode_lengths = []
-    episode_rewards = []
+# How many episodes the merges below handle per batch, summed over
+# all files
+MERGE_BATCH_SIZE = 1 << 20
+
+def _is_sorted(column):
+    """Checks the order block by block, so that memory-mapped columns
+    aren't compared all at once"""
+    for start in six.moves.range(0, len(column), MERGE_BATCH_SIZE):
+        # Overlap by one, to compare across block boundaries
+        block = column[start:start + MERGE_BATCH_SIZE + 1]
+        if (block[1:] < block[:-1]).any():
+            return False
+    return True
+
+def _load_sorted_columns(path):
+    """Loads a stats file's columns as arrays, ordered by timestamp.
+    StatsRecorder always writes them in order, so this is normally a
+    no-op; otherwise the file is stably sorted on its own."""
+    content = stats_recorder.load_stats(path)
+    columns = [np.asarray(content[key]) for key in ['timestamps', 'episode_lengths', 'episode_rewards']]
+    if not _is_sorted(columns[0]):
+        logger.warn('Episodes in %s are not in timestamp order; sorting them', path)
+        idxs = np.argsort(columns[0], kind='mergesort')
+        columns = [column[idxs] for column in columns]
+    return columns, content['initial_reset_timestamp']
+
+def iter_merged_stats(stats_files):
+    """Yields (timestamp, episode_length, episode_reward) for every
+    episode recorded in stats_files, in timestamp order.
+
+    This is a streaming k-way merge over the (already sorted) files,
+    which yields episodes in blocks per file. Binary files are
+    memory-mapped, so they are only read as the merge gets to them;
+    the JSON formats can't be parsed piecemeal, so each is loaded
+    into arrays in full. Episodes with equal timestamps come in the
+    order of stats_files.
+    """
+    def records(i, path):
+        (timestamps, episode_lengths, episode_rewards), _ = _load_sorted_columns(path)
+        block = max(1, MERGE_BATCH_SIZE // max(1, len(stats_files)))
+        for start in six.moves.range(0, len(timestamps), block):
+            end = start + block
+            for record in zip(timestamps[start:end].tolist(), itertools.repeat(i), episode_lengths[start:end].tolist(), episode_rewards[start:end].tolist()):
+                yield record
+
+    # The file index breaks ties, so the lengths and rewards are never compared
+    for timestamp, _, length, reward in heapq.merge(*[records(i, path) for i, path in enumerate(stats_files)]):
+        yield timestamp, length, reward
+
+def merge_stats_arrays(stats_files):
+    """Like merge_stats_files, but returns the merged columns as NumPy
+    arrays: float64 timestamps, int64 lengths, and rewards of the
+    files' common dtype (int64 if every reward recorded was an int,
+    float64 otherwise).
+
+    The files are merged in batches into preallocated output arrays:
+    each batch takes, from every file, the episodes up to the
+    earliest timestamp any file can contribute within its share of
+    MERGE_BATCH_SIZE, and only those are sorted. So sorting exploits
+    the order within each file, and the scratch space for sorting is
+    bounded by the batch size. The inputs themselves still have to be
+    at hand: binary files are memory-mapped, but JSON files are loaded
+    whole (see iter_merged_stats).
+    """
+    files = []
     initial_reset_timestamps = []
-
     for path in stats_files:
-        with open(path) as f:
-            content = json.load(f)
-            timestamps += content['timestamps']
-            episode_lengths += content['episode_lengths']
-            episode_rewards += content['episode_rewards']
-            initial_reset_timestamps.append(content['initial_reset_timestamp'])
-
-    idxs = np.argsort(timestamps)
-    timestamps = np.array(timestamps)[idxs].tolist()
-    episode_lengths = np.array(episode_lengths)[idxs].tolist()
-    episode_rewards = np.array(episode_rewards)[idxs].tolist()
+        columns, initial_reset_timestamp = _load_sorted_columns(path)
+        files.append(columns)
+        initial_reset_timestamps.append(initial_reset_timestamp)
+
+    total = sum(len(columns[0]) for columns in files)
+    timestamps = np.empty(total, dtype=np.float64)
+    episode_lengths = np.empty(total, dtype=np.int64)
+    # Empty files load as float64, so they don't get a say
+    reward_dtypes = [columns[2].dtype for columns in files if len(columns[2])]
+    episode_rewards = np.empty(total, dtype=np.result_type(*reward_dtypes) if reward_dtypes else np.float64)
+    outputs = [timestamps, episode_lengths, episode_rewards]
+
+    block = max(1, MERGE_BATCH_SIZE // max(1, len(files)))
+    cursors = [0] * len(files)
+    written = 0
+    while written < total:
+        # Every file can contribute everything up to this timestamp
+        # without exceeding its block
+        cutoff = min(columns[0][min(cursor + block, len(columns[0])) - 1]
+                     for columns, cursor in zip(files, cursors) if cursor < len(columns[0]))
+        parts = []
+        for i, (columns, cursor) in enumerate(zip(files, cursors)):
+            end = cursor + columns[0][cursor:].searchsorted(cutoff, side='right')
+            if end > cursor:
+                parts.append([column[cursor:end] for column in columns])
+            cursors[i] = end
+
+        count = sum(len(part[0]) for part in parts)
+        batch = slice(written, written + count)
+        if len(parts) == 1:
+            for output, column in zip(outputs, parts[0]):
+                output[batch] = column
+        else:
+            batch_columns = [np.concatenate(column) for column in zip(*parts)]
+            idxs = np.argsort(batch_columns[0], kind='mergesort')
+            for output, column in zip(outputs, batch_columns):
+                output[batch] = column[idxs]
+        written += count
+
     initial_reset_timestamp = min(initial_reset_timestamps)
     return timestamps, episode_lengths, episode_rewards, initial_reset_timestamp
 
+def merge_stats_files(stats_files):
+    timestamps, episode_lengths, episode_rewards, initial_reset_timestamp = merge_stats_arrays(stats_files)
+    return timestamps.tolist(), episode_lengths.tolist(), episode_rewards.tolist(), initial_reset_timestamp
+
 def collapse_env_infos(env_infos, training_dir):
     assert len(env_infos) > 0
 
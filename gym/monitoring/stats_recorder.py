@@ -1,14 +1,66 @@
 import json
+import logging
+import numpy as np
 import os
+import struct
 import time
 
 from gym import error
+from gym.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# 'json': one JSON object, written in close()
+# 'jsonl': JSON lines, appended to disk in batches as episodes finish
+# 'binary': fixed-width columns, written in close() (see write_binary_stats)
+STATS_FORMATS = ['json', 'jsonl', 'binary']
+
+# Binary stats files start with this header: magic, format version,
+# (padding), episode count, initial reset timestamp (NaN for none).
+# Then come the columns, each `count` long: float64 timestamps, int64
+# episode lengths and float64 episode rewards, all little-endian.
+BINARY_MAGIC = b'GYMSTATS'
+BINARY_VERSION = 1
+_binary_header = struct.Struct('<8sIIqd')
+_binary_columns = [('timestamps', '<f8'), ('episode_lengths', '<i8'), ('episode_rewards', '<f8')]
+
+def check_stats_format(stats_format):
+    if stats_format not in STATS_FORMATS:
+        raise error.Error('Unsupported stats_format {!r}; expected one of {}'.format(stats_format, STATS_FORMATS))
 
 class StatsRecorder(object):
-    def __init__(self, directory, file_prefix):
+    """Records the length, total reward and end time of every episode.
+
+    With stats_format='json' (the default), everything is kept in
+    memory and written to a '.stats.json' file on close(). Likewise
+    for stats_format='binary', which writes a much smaller and faster
+    to load '.stats.bin' file.
+
+    With stats_format='jsonl', finished episodes are appended to a
+    '.stats.jsonl' file instead: a header line holding the initial
+    reset timestamp, followed by one [timestamp, length, reward] line
+    per episode. Episodes are written once `batch_size` of them are
+    pending or `flush_interval` seconds have passed since the last
+    write, so memory stays bounded and a killed process loses at most
+    one batch.
+
+    Args:
+        directory (str): Where to write the stats file
+        file_prefix (str): Prefix of the stats file's name
+        stats_format (str): One of STATS_FORMATS
+        batch_size (int): ('jsonl' only) Write after this many episodes
+        flush_interval (float): ('jsonl' only) Write after this many seconds
+    """
+
+    def __init__(self, directory, file_prefix, stats_format='json', batch_size=1000, flush_interval=10):
+        check_stats_format(stats_format)
         self.initial_reset_timestamp = None
         self.directory = directory
         self.file_prefix = file_prefix
+        self.stats_format = stats_format
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # In 'jsonl' mode, these only hold the episodes not yet written
         self.episode_lengths = []
         self.episode_rewards = []
         self.timestamps = []
@@ -17,6 +69,10 @@ class StatsRecorder(object):
 
         self.done = None
 
+        self.path = None
+        self._file = None
+        self._last_write = time.time()
+
     def before_step(self, action):
         if self.done:
             raise error.ResetNeeded("Trying to step environment which is currently done. While the monitor is active, you cannot step beyond the end of an episode. Call 'env.reset()' to start the next episode.")
@@ -42,15 +98,39 @@ class StatsRecorder(object):
             self.episode_lengths.append(self.steps)
             self.episode_rewards.append(self.rewards)
             self.timestamps.append(time.time())
+            if self.stats_format == 'jsonl' and \
+               (len(self.timestamps) >= self.batch_size or self.timestamps[-1] - self._last_write >= self.flush_interval):
+                self._write_batch()
         self.steps = 0
         self.rewards = 0
 
+    def _write_batch(self):
+        if self._file is None:
+            self.path = os.path.join(self.directory, '{}.{}.stats.jsonl'.format(self.file_prefix, os.getpid()))
+            self._file = open(self.path, 'w')
+            self._file.write(json.dumps({'initial_reset_timestamp': self.initial_reset_timestamp}) + '\n')
+        self._file.write(''.join(json.dumps(record) + '\n' for record in zip(self.timestamps, self.episode_lengths, self.episode_rewards)))
+        self._file.flush()
+        del self.timestamps[:], self.episode_lengths[:], self.episode_rewards[:]
+        self._last_write = time.time()
+
     def close(self):
         self.flush()
 
+        if self.stats_format == 'jsonl':
+            self._write_batch()
+            self._file.close()
+            self._file = None
+            return self.path
+
+        if self.stats_format == 'binary':
+            path = os.path.join(self.directory, '{}.{}.stats.bin'.format(self.file_prefix, os.getpid()))
+            write_binary_stats(path, self.initial_reset_timestamp, self.timestamps, self.episode_lengths, self.episode_rewards)
+            return path
+
         filename = '{}.{}.stats.json'.format(self.file_prefix, os.getpid())
         path = os.path.join(self.directory, filename)
-        with open(path, 'w') as f:
+        with atomic_write(path) as f:
             json.dump({
                 'initial_reset_timestamp': self.initial_reset_timestamp,
                 'timestamps': self.timestamps,
@@ -58,3 +138,72 @@ class StatsRecorder(object):
                 'episode_rewards': self.episode_rewards,
             }, f)
         return path
+
+def write_binary_stats(path, initial_reset_timestamp, timestamps, episode_lengths, episode_rewards):
+    count = len(timestamps)
+    if initial_reset_timestamp is None:
+        initial_reset_timestamp = np.nan
+    with atomic_write(path, 'wb') as f:
+        f.write(_binary_header.pack(BINARY_MAGIC, BINARY_VERSION, 0, count, initial_reset_timestamp))
+        for values, (_, dtype) in zip([timestamps, episode_lengths, episode_rewards], _binary_columns):
+            column = np.asarray(values, dtype=dtype)
+            if column.shape != (count,):
+                raise error.Error('Stats columns must all have length {}, but got shape {}'.format(count, column.shape))
+            column.tofile(f)
+
+def load_stats(path):
+    """Reads a stats file written by StatsRecorder, in any of its
+    formats, into a dict with the keys initial_reset_timestamp,
+    timestamps, episode_lengths and episode_rewards.
+
+    The format is detected from the file's contents (binary) or name
+    (JSON lines), falling back to plain JSON. The columns of binary
+    files are returned as read-only memory-mapped arrays; the others
+    as lists."""
+    with open(path, 'rb') as f:
+        magic = f.read(len(BINARY_MAGIC))
+    if magic == BINARY_MAGIC:
+        return _load_binary(path)
+    elif path.endswith('.jsonl'):
+        return _load_jsonl(path)
+    with open(path) as f:
+        return json.load(f)
+
+def _load_binary(path):
+    with open(path, 'rb') as f:
+        magic, version, _, count, initial_reset_timestamp = _binary_header.unpack(f.read(_binary_header.size))
+    if version != BINARY_VERSION:
+        raise error.Error('Stats file {} has binary format version {}, but this version of gym only reads version {}'.format(path, version, BINARY_VERSION))
+
+    content = {'initial_reset_timestamp': None if np.isnan(initial_reset_timestamp) else initial_reset_timestamp}
+    offset = _binary_header.size
+    for key, dtype in _binary_columns:
+        if count == 0:
+            # mmap refuses empty mappings
+            content[key] = np.zeros(0, dtype=dtype)
+        else:
+            content[key] = np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=(count,))
+        offset += count * np.dtype(dtype).itemsize
+    return content
+
+def _load_jsonl(path):
+    timestamps = []
+    episode_lengths = []
+    episode_rewards = []
+    with open(path) as f:
+        header = json.loads(f.readline())
+        for line in f:
+            if not line.endswith('\n'):
+                # The writer was killed partway through this record
+                logger.warn('Ignoring truncated final record in %s: %r', path, line)
+                break
+            timestamp, length, reward = json.loads(line)
+            timestamps.append(timestamp)
+            episode_lengths.append(length)
+            episode_rewards.append(reward)
+    return {
+        'initial_reset_timestamp': header['initial_reset_timestamp'],
+        'timestamps': timestamps,
+        'episode_lengths': episode_lengths,
+        'episode_rewards': episode_rewards,
+    }
@@ -4,8 +4,11 @@ import os
 import shutil
 import tempfile
 
+import numpy as np
+
 import gym
-from gym.monitoring import monitor
+from gym.monitoring import monitor, stats_recorder, timing
+from gym.utils import atomic_write
 
 class FakeEnv(gym.Env):
     def _render(self, close=True):
@@ -34,3 +37,248 @@ def test_close_monitor():
 
         manifests = monitor.detect_training_manifests(temp)
         assert len(manifests) == 1
+
+def test_shared_directory_index():
+    with tempdir() as temp:
+        # Like several workers sharing one directory
+        envs = [gym.make('FrozenLake-v0') for _ in range(2)]
+        for env in envs:
+            env.monitor.start(temp, video_callable=lambda i: False)
+            _run_episodes(env, 2)
+        for env in envs:
+            env.monitor.close()
+
+        index_dir = os.path.join(temp, monitor.INDEX_DIR)
+        assert len(os.listdir(index_dir)) == 2
+        assert len(monitor.load_results(temp)['episode_lengths']) == 4
+
+        # Unregistered manifests, entries still being written, and
+        # entries whose manifest is gone are ignored while there's an
+        # index...
+        stray = os.path.join(temp, monitor.MANIFEST_PREFIX + '.stray.manifest.json')
+        open(stray, 'w').close()
+        open(os.path.join(index_dir, '.' + monitor.MANIFEST_PREFIX + '.partial.tmp'), 'w').close()
+        open(os.path.join(index_dir, monitor.MANIFEST_PREFIX + '.missing.manifest.json'), 'w').close()
+        assert len(monitor.detect_training_manifests(temp)) == 2
+        assert len(monitor.load_results(temp)['episode_lengths']) == 4
+
+        # ...and directories without one are scanned
+        shutil.rmtree(index_dir)
+        assert len(monitor.detect_training_manifests(temp)) == 3
+
+        # Clearing the directory removes the index too
+        monitor.register_manifest(temp, stray)
+        monitor.clear_monitor_files(temp)
+        assert os.listdir(temp) == []
+
+def test_atomic_write():
+    with tempdir() as temp:
+        path = os.path.join(temp, 'file')
+        with atomic_write(path) as f:
+            f.write('first')
+        try:
+            with atomic_write(path) as f:
+                f.write('second')
+                raise RuntimeError('interrupted')
+        except RuntimeError:
+            pass
+        with open(path) as f:
+            assert f.read() == 'first'
+        assert os.listdir(temp) == ['file']
+
+def test_invalid_stats_format():
+    with tempdir() as temp:
+        env = gym.make('FrozenLake-v0')
+        try:
+            env.monitor.start(temp, stats_format='xml')
+        except gym.error.Error:
+            pass
+        else:
+            assert False
+        assert not env.monitor.enabled
+        assert not env._monitor_running
+        env.monitor.close()
+        env.reset()
+        env.step(0)
+        assert not os.listdir(temp)
+
+def test_step_bypasses_monitor_unless_started():
+    with tempdir() as temp:
+        env = gym.make('FrozenLake-v0')
+        assert 'step' not in env.__dict__ and 'reset' not in env.__dict__
+        env.reset()
+        env.step(0)
+        # The monitor isn't even built until someone asks for it
+        assert not hasattr(env, '_monitor')
+
+        env.monitor.start(temp, video_callable=lambda i: False)
+        # The env dispatches on a flag, rather than having its step
+        # and reset swapped for bound methods
+        assert 'step' not in env.__dict__ and 'reset' not in env.__dict__
+        _run_episodes(env, 3)
+        assert len(env.monitor.stats_recorder.episode_lengths) == 2
+        env.monitor.close()
+        env.monitor.close()
+        assert not env._monitor_running
+
+        results = monitor.load_results(temp)
+        assert len(results['episode_lengths']) == 3
+
+def test_profile():
+    with tempdir() as temp:
+        env = gym.make('FrozenLake-v0')
+        env.monitor.start(temp, video_callable=lambda i: i == 0, profile=True)
+        _run_episodes(env, 3)
+        recorder = env.monitor.stats_recorder
+        steps = sum(recorder.episode_lengths) + recorder.steps
+        first_episode_length = recorder.episode_lengths[0]
+        env.monitor.close()
+
+        profile = monitor.load_results(temp)['profile']
+        assert profile.step.count == steps
+        assert profile.reset.count == 3
+        assert profile.stats.count == steps + 3
+        # Only the first episode was recorded: its frames (one per step,
+        # plus the initial one), plus closing its video
+        assert profile.render.count == first_episode_length + 1
+        assert profile.encode.count == first_episode_length + 2
+        assert profile.step.total > 0
+
+        env = gym.make('FrozenLake-v0')
+        env.monitor.start(temp, force=True)
+        env.monitor.close()
+        assert monitor.load_results(temp)['profile'] is None
+
+def test_timing_histogram():
+    histogram = timing.Histogram()
+    for duration in [0, 1e-6, 1.5e-6, 3e-3, 1e9]:
+        histogram.add(duration)
+    assert histogram.count == 5
+    assert histogram.counts[0] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.quantile(0.6) == 2 ** -19 # 1.5us < 2**-19s
+    other = timing.Histogram(histogram.counts, histogram.total)
+    other.merge(histogram)
+    assert other.count == 10 and other.total == 2 * histogram.total
+
+def _run_episodes(env, episodes):
+    for _ in xrange(episodes):
+        env.reset()
+        done = False
+        while not done:
+            _, _, done, _ = env.step(env.action_space.sample())
+
+def test_streaming_stats():
+    with tempdir() as temp:
+        env = gym.make('FrozenLake-v0')
+        env.monitor.start(temp, video_callable=lambda i: False, stats_format='jsonl')
+        env.monitor.stats_recorder.batch_size = 2
+        _run_episodes(env, 5)
+        # Four episodes have ended, and been written in two batches
+        recorder = env.monitor.stats_recorder
+        assert len(recorder.episode_lengths) == 0
+        assert len(stats_recorder.load_stats(recorder.path)['timestamps']) == 4
+        env.monitor.close()
+
+        results = monitor.load_results(temp)
+        assert len(results['episode_lengths']) == 5
+        assert results['timestamps'] == sorted(results['timestamps'])
+        assert results['initial_reset_timestamp'] <= results['timestamps'][0]
+
+def test_streaming_stats_truncated():
+    with tempdir() as temp:
+        recorder = stats_recorder.StatsRecorder(temp, 'openaigym.test', stats_format='jsonl', batch_size=1)
+        for _ in xrange(3):
+            recorder.before_reset()
+            recorder.after_reset(None)
+            recorder.after_step(None, 1.0, True, {})
+        # Simulate a writer killed halfway through a record
+        recorder._file.write('[1234.5, 3')
+        recorder._file.flush()
+
+        content = stats_recorder.load_stats(recorder.path)
+        assert content['episode_lengths'] == [1, 1]
+        assert content['episode_rewards'] == [1.0, 1.0]
+
+def test_binary_stats():
+    with tempdir() as temp:
+        env = gym.make('FrozenLake-v0')
+        env.monitor.start(temp, video_callable=lambda i: False, stats_format='binary')
+        _run_episodes(env, 5)
+        recorder = env.monitor.stats_recorder
+        expected = recorder.episode_lengths + [recorder.steps]
+        env.monitor.close()
+
+        stats_files = glob.glob(os.path.join(temp, '*.stats.bin'))
+        assert len(stats_files) == 1
+        content = stats_recorder.load_stats(stats_files[0])
+        assert list(content['episode_lengths']) == expected
+
+        results = monitor.load_results(temp)
+        assert results['episode_lengths'] == expected
+        assert results['timestamps'] == sorted(results['timestamps'])
+
+def test_binary_stats_detected_by_content():
+    with tempdir() as temp:
+        path = os.path.join(temp, 'stats.json')
+        stats_recorder.write_binary_stats(path, None, [], [], [])
+        content = stats_recorder.load_stats(path)
+        assert content['initial_reset_timestamp'] is None
+        assert len(content['timestamps']) == 0
+
+def _write_random_stats(temp, count, sort=True):
+    paths = []
+    for i in xrange(count):
+        n = np.random.randint(0, 50)
+        timestamps = np.round(np.random.rand(n) * 100, 1) # with some ties
+        if sort:
+            timestamps.sort()
+        lengths = np.random.randint(1, 100, size=n)
+        rewards = np.random.randn(n)
+        path = os.path.join(temp, 'openaigym.{}.stats.bin'.format(i))
+        stats_recorder.write_binary_stats(path, float(i), timestamps, lengths, rewards)
+        paths.append(path)
+    return paths
+
+def _reference_merge(paths):
+    contents = [stats_recorder.load_stats(path) for path in paths]
+    columns = [np.concatenate([c[key] for c in contents]) for key in ['timestamps', 'episode_lengths', 'episode_rewards']]
+    idxs = np.argsort(columns[0], kind='mergesort')
+    return [column[idxs].tolist() for column in columns]
+
+def test_merge_stats_files():
+    old_batch_size = monitor.MERGE_BATCH_SIZE
+    monitor.MERGE_BATCH_SIZE = 64 # so that merges take several batches
+    try:
+        with tempdir() as temp:
+            for sort in [True, False]:
+                paths = _write_random_stats(temp, 12, sort=sort)
+                expected = _reference_merge(paths)
+                timestamps, lengths, rewards, initial_reset_timestamp = monitor.merge_stats_files(paths)
+                assert [timestamps, lengths, rewards] == expected
+                assert initial_reset_timestamp == 0.0
+                assert [list(column) for column in zip(*monitor.iter_merged_stats(paths))] == expected
+    finally:
+        monitor.MERGE_BATCH_SIZE = old_batch_size
+
+def test_merge_keeps_integer_rewards():
+    with tempdir() as temp:
+        paths = []
+        for i, (timestamps, rewards) in enumerate([([1., 3.], [0, 1]), ([2.], [5]), ([], [])]):
+            recorder = stats_recorder.StatsRecorder(temp, 'openaigym.test{}'.format(i))
+            recorder.initial_reset_timestamp = 0.
+            recorder.timestamps, recorder.episode_lengths, recorder.episode_rewards = timestamps, [1] * len(rewards), rewards
+            paths.append(recorder.close())
+        timestamps, lengths, rewards, _ = monitor.merge_stats_files(paths)
+        assert rewards == [0, 5, 1]
+        assert all(isinstance(reward, int) for reward in rewards)
+
+def test_order_check_spans_blocks():
+    old_batch_size = monitor.MERGE_BATCH_SIZE
+    monitor.MERGE_BATCH_SIZE = 4
+    try:
+        assert monitor._is_sorted(np.arange(10.))
+        # Out of order only across the boundary between two blocks
+        assert not monitor._is_sorted(np.array([0., 1., 2., 3., 2.5, 4., 5.]))
+    finally:
+        monitor.MERGE_BATCH_SIZE = old_batch_size
@@ -1,13 +1,20 @@
 import json
+import StringIO
 import os
+import random
+import re
 import shutil
 import tempfile
+import threading
+import time
 
 import numpy as np
 from nose2 import tools
 
 import gym
 from gym.monitoring import VideoRecorder
+from gym.monitoring import video_recorder
+from gym.monitoring.video_recorder import AsyncEncoder, TextEncoder
 
 class BrokenRecordableEnv(object):
     metadata = {'render.modes': [None, 'rgb_array']}
@@ -65,3 +72,221 @@ def test_text_envs():
         video.close()
     finally:
         os.remove(video.path)
+
+class HeldEncoder(object):
+    """Records frames, but only once `release` is set"""
+    version_info = {'backend': 'HeldEncoder'}
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.written = []
+        self.closed = False
+
+    def prepare_frame(self, frame, copy=False):
+        return frame.tobytes()
+
+    def write_frame(self, data):
+        self.release.wait()
+        self.written.append(data)
+
+    def close(self):
+        self.closed = True
+
+def _frames(count):
+    return [np.full((2, 2, 3), i, dtype=np.uint8) for i in xrange(count)]
+
+def test_async_encoder_block():
+    encoder = HeldEncoder()
+    encoder.release.set()
+    async_encoder = AsyncEncoder(encoder, max_queued_frames=2)
+    frames = _frames(10)
+    for frame in frames:
+        async_encoder.capture_frame(frame)
+    async_encoder.close()
+    assert encoder.closed
+    assert encoder.written == [frame.tobytes() for frame in frames]
+    assert async_encoder.dropped_frames == 0
+
+@tools.params('drop_oldest', 'drop_newest')
+def test_async_encoder_drop(backpressure):
+    encoder = HeldEncoder()
+    async_encoder = AsyncEncoder(encoder, max_queued_frames=3, backpressure=backpressure)
+    frames = _frames(10)
+    async_encoder.capture_frame(frames[0])
+    # Wait for the writer to pick the first frame up and get stuck on it
+    while not async_encoder._queue.empty():
+        time.sleep(0.001)
+    for frame in frames[1:]:
+        async_encoder.capture_frame(frame)
+    encoder.release.set()
+    async_encoder.close()
+
+    assert async_encoder.dropped_frames == 6
+    kept = frames[7:] if backpressure == 'drop_oldest' else frames[1:4]
+    assert encoder.written == [frame.tobytes() for frame in [frames[0]] + kept]
+
+class FakeProcess(object):
+    returncode = None
+    def poll(self):
+        return self.returncode
+
+class FakeImageEncoder(object):
+    def __init__(self, output_path, frame_shape, frames_per_sec, input_layout=None):
+        self.output_path = output_path
+        self.final_path = None
+        self.proc = FakeProcess()
+        self.discarded = False
+
+    def retarget(self, output_path):
+        self.final_path = output_path
+
+    def discard(self):
+        self.discarded = True
+
+def test_encoder_pool():
+    real_encoder = video_recorder.ImageEncoder
+    video_recorder.ImageEncoder = FakeImageEncoder
+    try:
+        pool = video_recorder.ImageEncoderPool()
+        first = pool.acquire('/tmp/video0.mp4', (4, 4, 3), 30)
+        assert first.output_path == '/tmp/video0.mp4'
+
+        # The next episode gets the spare started during the first one
+        second = pool.acquire('/tmp/video1.mp4', (4, 4, 3), 30)
+        assert os.path.basename(second.output_path).startswith('.openaigym.spare.')
+        assert second.final_path == '/tmp/video1.mp4'
+
+        # A dead spare is replaced
+        spare = pool._spares.values()[0].get()
+        spare.proc.returncode = 1
+        third = pool.acquire('/tmp/video2.mp4', (4, 4, 3), 30)
+        assert spare.discarded
+        assert third.output_path == '/tmp/video2.mp4'
+
+        spare = pool._spares.values()[0].get()
+        pool.close()
+        assert spare.discarded
+    finally:
+        video_recorder.ImageEncoder = real_encoder
+
+def test_backend_probe_cached():
+    backend = video_recorder.find_backend()
+    assert video_recorder.find_backend() == backend
+    assert len(video_recorder._backend) == 1
+
+def _decode(data, shape, pix_fmt, vflip):
+    """What an encoder fed with pix_fmt (and vflip) would see"""
+    h, w, _ = shape
+    if pix_fmt == 'rgb24':
+        image = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 3)
+    else:
+        image = np.frombuffer(data, dtype=np.uint8).reshape(h, w, 4)
+        image = image[:, :, 2::-1] if pix_fmt == 'bgra' else image[:, :, :3]
+    return image[::-1] if vflip else image
+
+def test_frame_layout():
+    buffer = np.random.randint(0, 256, size=(5, 7, 4)).astype(np.uint8)
+    frames = [
+        (buffer[::-1, :, :3], ('rgba', True)),     # Viewer.get_array
+        (buffer[:, :, 2::-1], ('bgra', False)),    # atari's to_rgb
+        (buffer[::-1, :, 2::-1], ('bgra', True)),
+        (buffer[:, :, :3].copy(), ('rgb24', False)),
+        (buffer[1:, :, :3], None),                 # a crop: needs a copy
+        (buffer[:, :, 1:], None),
+    ]
+    for frame, expected in frames:
+        layout = video_recorder.frame_layout(frame)
+        assert (layout[:2] if layout else None) == expected, (frame.strides, layout)
+        if layout is not None:
+            # Zero-copy: the data is the buffer's own memory
+            assert np.may_share_memory(np.frombuffer(video_recorder.frame_data(frame, *expected), dtype=np.uint8), layout[2])
+        # Whatever the encoder was started with, it gets the right picture
+        for pix_fmt, vflip in [('rgb24', False), ('rgba', True), ('bgra', False), ('bgra', True)]:
+            data = video_recorder.frame_data(frame, pix_fmt, vflip, copy=True)
+            assert (_decode(data, frame.shape, pix_fmt, vflip) == frame).all(), (pix_fmt, vflip)
+
+def test_text_encoder_streams():
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        encoder = TextEncoder(path, 4)
+        frames = ['ab\ncdef\n', StringIO.StringIO('x\n'), 'abcdefgh\n']
+        for frame in frames:
+            encoder.capture_frame(frame)
+        # Only the running frame size is kept around
+        assert (encoder.width, encoder.height, encoder.frame_count) == (8, 2, 3)
+        encoder.close()
+
+        with open(path) as f:
+            data = json.load(f)
+        assert data['version'] == 1
+        assert data['width'] == 8 + 2
+        assert data['height'] == 2 + 1
+        assert data['duration'] == 3 * encoder.frame_duration
+        assert [event[1] for event in data['stdout']] == ['\x1b[2J\x1b[1;1Hab\r\ncdef\r\n', '\x1b[2J\x1b[1;1Hx\r\n', '\x1b[2J\x1b[1;1Habcdefgh\r\n']
+    finally:
+        os.remove(path)
+
+def _play_ansi(events):
+    """A minimal terminal: yields the screen, as a dict from (row,
+    column) to (style, character), after each event"""
+    screen = {}
+    row = col = 0
+    style = ''
+    for _, output in events:
+        for match in re.finditer(u'\x1b\\[([0-9;]*)([A-Za-z])|\r\n|(.)', output, re.DOTALL):
+            params, command, char = match.groups()
+            if char is not None:
+                screen[row, col] = (style, char)
+                col += 1
+            elif command is None:
+                row, col = row + 1, 0
+            elif command == 'H':
+                row, col = [int(p) - 1 for p in params.split(';')]
+            elif command == 'J':
+                screen.clear()
+            elif command == 'K':
+                screen = {cell: v for cell, v in screen.items() if cell[0] != row or cell[1] < col}
+            elif command == 'm':
+                style = '' if params in ('', '0') else style + match.group()
+        yield dict(screen)
+
+def _record_text(frames, keyframe_interval):
+    fd, path = tempfile.mkstemp(suffix='.json')
+    os.close(fd)
+    try:
+        encoder = TextEncoder(path, 4, keyframe_interval=keyframe_interval)
+        for frame in frames:
+            encoder.capture_frame(StringIO.StringIO(frame))
+        encoder.close()
+        with open(path) as f:
+            return json.load(f), os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+def test_text_encoder_delta():
+    frames = []
+    for env_id in ['FrozenLake8x8-v0', 'Copy-v0']:
+        # Algorithmic envs draw from the random module, including when
+        # constructed (which also resets their class-level curriculum)
+        random.seed(0)
+        np.random.seed(0)
+        env = gym.make(env_id)
+        env.reset()
+        for _ in xrange(30):
+            frames.append(env.render(mode='ansi').getvalue())
+            _, _, done, _ = env.step(env.action_space.sample())
+            if done:
+                env.reset()
+    # A frame with a style left on, and one with an escape that can't be diffed
+    frames.append(u'\x1b[41mab\ncd\n')
+    frames.append(u'ab\x1b[2Kc\n')
+    frames.append(u'ab\n')
+
+    full, full_size = _record_text(frames, None)
+    delta, delta_size = _record_text(frames, 10)
+    for key in ['width', 'height', 'duration']:
+        assert full[key] == delta[key]
+    for expected, actual in zip(_play_ansi(full['stdout']), _play_ansi(delta['stdout'])):
+        assert expected == actual
+    assert delta_size < full_size / 2
@@ -0,0 +1,145 @@
+"""
+Low-overhead timing histograms, which Monitor.start(profile=True)
+uses to record where a monitored env spends its time.
+"""
+import json
+import math
+import numpy as np
+import time
+
+from gym import error
+from gym.utils import atomic_write
+
+# Histograms bucket durations by powers of two: bucket i counts the
+# durations d with 2**(i-1) <= d * 2**BUCKET_OFFSET < 2**i, bucket 0
+# those under 2**-BUCKET_OFFSET seconds (about 1ns) and the last one
+# everything from about a day on.
+BUCKETS = 48
+BUCKET_OFFSET = 30
+
+# step: the env's _step; reset: the env's _reset; stats: the monitor's
+# own bookkeeping; render: rendering frames for video; encode: handing
+# frames to the video encoder (just queueing them, with async_video),
+# and finishing videos off
+PHASES = ['step', 'reset', 'stats', 'render', 'encode']
+
+clock = time.time
+
+# A profiling monitor buckets the durations its histograms buffered
+# about this often, in seconds (see Monitor._step). Checking the clock
+# reading it already has is cheaper than checking the buffer's size,
+# and keeps the buffers small all the same.
+FLUSH_INTERVAL = 0.1
+
+class Histogram(object):
+    """Counts durations, in seconds, in power-of-two buckets, along
+    with their total.
+
+    To keep recording cheap, add(duration) just appends to the
+    `pending` list; the durations are bucketed in batches by flush(),
+    which reading the counts or total does first.
+
+    Args:
+        counts (Optional[list]): Initial counts for each of the BUCKETS buckets
+        total (float): Initial sum of the durations
+    """
+
+    def __init__(self, counts=None, total=0.):
+        self._counts = np.zeros(BUCKETS, dtype=np.int64) if counts is None else np.array(counts, dtype=np.int64)
+        self._total = total
+        self.pending = []
+        self.add = self.pending.append
+
+    def flush(self):
+        if not self.pending:
+            return
+        durations = np.array(self.pending)
+        del self.pending[:]
+        self._total += float(durations.sum())
+        # frexp gives the exponents e with 2**(e-1) <= duration < 2**e
+        buckets = np.frexp(durations)[1] + BUCKET_OFFSET
+        buckets[durations <= 0] = 0
+        self._counts += np.bincount(np.clip(buckets, 0, BUCKETS - 1), minlength=BUCKETS)
+
+    @property
+    def counts(self):
+        self.flush()
+        return self._counts.tolist()
+
+    @property
+    def total(self):
+        self.flush()
+        return self._total
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @property
+    def mean(self):
+        count = self.count
+        return self.total / count if count else None
+
+    def quantile(self, q):
+        """An upper bound on the q-th quantile of the durations: the end
+        of the bucket it falls in"""
+        count = self.count
+        if count == 0:
+            return None
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= q * count:
+                break
+        return math.ldexp(1., i - BUCKET_OFFSET)
+
+    def merge(self, other):
+        self.flush()
+        self._counts += other.counts
+        self._total += other.total
+
+class Profile(object):
+    """A Histogram for each of PHASES, available as attributes"""
+
+    def __init__(self):
+        for phase in PHASES:
+            setattr(self, phase, Histogram())
+
+    def to_json(self):
+        return {
+            'bucket_offset': BUCKET_OFFSET,
+            'phases': {phase: {'counts': getattr(self, phase).counts, 'total': getattr(self, phase).total} for phase in PHASES},
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        profile = cls()
+        # Buckets are only comparable between files with the same layout
+        if data['bucket_offset'] != BUCKET_OFFSET:
+            raise error.Error('Profile has bucket_offset {}, but this version of gym uses {}'.format(data['bucket_offset'], BUCKET_OFFSET))
+        for phase, histogram in data['phases'].items():
+            setattr(profile, phase, Histogram(histogram['counts'], histogram['total']))
+        return profile
+
+    def merge(self, other):
+        for phase in PHASES:
+            getattr(self, phase).merge(getattr(other, phase))
+
+    def flush(self):
+        for phase in PHASES:
+            getattr(self, phase).flush()
+
+def save_profile(path, profile):
+    with atomic_write(path) as f:
+        json.dump(profile.to_json(), f)
+
+def load_profile(path):
+    with open(path) as f:
+        return Profile.from_json(json.load(f))
+
+def merge_profile_files(paths):
+    """Sums up the Profiles in the given files"""
+    profile = Profile()
+    for path in paths:
+        profile.merge(load_profile(path))
+    return profile
@@ -1,14 +1,18 @@
 import logging
 import json
 import os
+import re
 import subprocess
 import tempfile
+import threading
 import os.path
 import distutils.spawn
 import numpy as np
+import six
 import StringIO
 
 from gym import error
+from gym.monitoring import timing
 
 logger = logging.getLogger(__name__)
 
@@ -30,9 +34,15 @@ class VideoRecorder(object):
         base_path (Optional[str]): Alternatively, path to the video file without extension, which will be added.
         metadata (Optional[dict]): Contents to save to the metadata file.
         enabled (bool): Whether to actually record video, or just no-op (for convenience)
+        async_encoding (bool): Hand image frames to the encoder from a background thread (see AsyncEncoder), so that capture_frame does not wait on it
+        max_queued_frames (int): With async_encoding, how many frames may wait for the encoder
+        backpressure (str): With async_encoding, what to do when the queue is full: one of AsyncEncoder.BACKPRESSURE_MODES
+        encoder_pool (Optional[ImageEncoderPool]): Take an already running image encoder from this pool
+        ansi_keyframe_interval (Optional[int]): For text envs, delta-encode frames, with a whole frame only this often (see TextEncoder)
+        profile (Optional[gym.monitoring.timing.Profile]): Record how long rendering and encoding take here
     """
 
-    def __init__(self, env, path=None, metadata=None, enabled=True, base_path=None):
+    def __init__(self, env, path=None, metadata=None, enabled=True, base_path=None, async_encoding=False, max_queued_frames=64, backpressure='block', encoder_pool=None, ansi_keyframe_interval=None, profile=None):
         modes = env.metadata.get('render.modes', [])
         self.ansi_mode = False
         if 'rgb_array' not in modes:
@@ -76,6 +86,14 @@ class VideoRecorder(object):
         self.frames_per_sec = env.metadata.get('video.frames_per_second', 30)
         self.encoder = None # lazily start the process
         self.broken = False
+        self.async_encoding = async_encoding
+        self.encoder_pool = encoder_pool
+        self.max_queued_frames = max_queued_frames
+        self.backpressure = backpressure
+        self.ansi_keyframe_interval = ansi_keyframe_interval
+        self.profile = profile
+        if backpressure not in AsyncEncoder.BACKPRESSURE_MODES:
+            raise error.Error('Unsupported backpressure mode {!r}; expected one of {}'.format(backpressure, AsyncEncoder.BACKPRESSURE_MODES))
 
         # Dump metadata
         self.metadata = metadata or {}
@@ -96,7 +114,12 @@ class VideoRecorder(object):
         logger.debug('Capturing video frame: path=%s', self.path)
 
         render_mode = 'ansi' if self.ansi_mode else 'rgb_array'
-        frame = self.env.render(mode=render_mode)
+        if self.profile is not None:
+            start = timing.clock()
+            frame = self.env.render(mode=render_mode)
+            self.profile.render.add(timing.clock() - start)
+        else:
+            frame = self.env.render(mode=render_mode)
 
         if frame is None:
             # Indicates a bug in the environment: don't want to raise
@@ -105,10 +128,13 @@ class VideoRecorder(object):
             self.broken = True
         else:
             self.last_frame = frame
+            start = timing.clock() if self.profile is not None else None
             if self.ansi_mode:
                 self._encode_ansi_frame(frame)
             else:
                 self._encode_image_frame(frame)
+            if start is not None:
+                self.profile.encode.add(timing.clock() - start)
 
     def close(self):
         """Make sure to manually close, or else you'll leak the encoder process"""
@@ -117,7 +143,14 @@ class VideoRecorder(object):
 
         if self.encoder:
             logger.debug('Closing video encoder: path=%s', self.path)
+            start = timing.clock()
             self.encoder.close()
+            if self.profile is not None:
+                self.profile.encode.add(timing.clock() - start)
+            if isinstance(self.encoder, AsyncEncoder):
+                self.metadata['dropped_frames'] = self.encoder.dropped_frames
+                if self.encoder.failure is not None:
+                    self.broken = True
             self.encoder = None
         else:
             # No frames captured. Set metadata, and remove the empty output file.
@@ -147,15 +180,24 @@ class VideoRecorder(object):
 
     def _encode_ansi_frame(self, frame):
         if not self.encoder:
-            self.encoder = TextEncoder(self.path, self.frames_per_sec)
+            self.encoder = TextEncoder(self.path, self.frames_per_sec, self.ansi_keyframe_interval)
             self.metadata['encoder_version'] = self.encoder.version_info
         self.encoder.capture_frame(frame)
         self.empty = False
 
     def _encode_image_frame(self, frame):
         if not self.encoder:
-            self.encoder = ImageEncoder(self.path, frame.shape, self.frames_per_sec)
+            # Set the encoder up for this kind of frame, so that frames
+            # can go to it without being copied
+            layout = frame_layout(frame)
+            input_layout = layout[:2] if layout is not None else None
+            if self.encoder_pool is not None:
+                self.encoder = self.encoder_pool.acquire(self.path, frame.shape, self.frames_per_sec, input_layout)
+            else:
+                self.encoder = ImageEncoder(self.path, frame.shape, self.frames_per_sec, input_layout)
             self.metadata['encoder_version'] = self.encoder.version_info
+            if self.async_encoding:
+                self.encoder = AsyncEncoder(self.encoder, self.max_queued_frames, self.backpressure)
 
         try:
             self.encoder.capture_frame(frame)
@@ -166,14 +208,105 @@ class VideoRecorder(object):
             self.empty = False
 
 
+# SGR ("select graphic rendition") sequences, which is how envs color
+# their ANSI frames (see gym.utils.colorize)
+_sgr_pattern = re.compile('\x1b\\[[0-9;]*m')
+_sgr_resets = ('\x1b[0m', '\x1b[m')
+
+def _parse_ansi_line(line, style=''):
+    """Splits a line into a list of (style, character) cells, where style
+    is the concatenation of the SGR sequences in effect, starting from
+    `style`. Also returns the style in effect after the line. Returns
+    (None, None) if the line holds other escape sequences, which
+    aren't modeled."""
+    if '\x1b' in _sgr_pattern.sub('', line):
+        return None, None
+    cells = []
+    pos = 0
+    for match in _sgr_pattern.finditer(line):
+        cells.extend((style, char) for char in line[pos:match.start()])
+        code = match.group()
+        style = '' if code in _sgr_resets else style + code
+        pos = match.end()
+    cells.extend((style, char) for char in line[pos:])
+    return cells, style
+
+def _ansi_delta(old_rows, new_rows):
+    """Terminal output turning a screen that shows old_rows (lists of
+    cells, as from _parse_ansi_line) into one that shows new_rows, by
+    moving the cursor to and rewriting only the cells that changed.
+    Assumes no SGR style is in effect beforehand, and leaves none."""
+    out = []
+    for row, cells in enumerate(new_rows):
+        old = old_rows[row] if row < len(old_rows) else []
+        changed = [col for col, cell in enumerate(cells) if col >= len(old) or old[col] != cell]
+        # Runs of changed cells; rewriting a few unchanged ones costs
+        # less than another cursor movement
+        runs = []
+        for col in changed:
+            if runs and col - runs[-1][1] <= 4:
+                runs[-1][1] = col + 1
+            else:
+                runs.append([col, col + 1])
+        for start, stop in runs:
+            out.append('\x1b[{};{}H'.format(row + 1, start + 1))
+            style = ''
+            for cell_style, char in cells[start:stop]:
+                if cell_style != style:
+                    if style:
+                        out.append('\x1b[0m')
+                    out.append(cell_style)
+                    style = cell_style
+                out.append(char)
+            if style:
+                out.append('\x1b[0m')
+        if len(cells) < len(old):
+            # Erase the rest of the old line
+            out.append('\x1b[{};{}H\x1b[K'.format(row + 1, len(cells) + 1))
+    for row in range(len(new_rows), len(old_rows)):
+        if old_rows[row]:
+            out.append('\x1b[{};1H\x1b[K'.format(row + 1))
+    return ''.join(out)
+
 class TextEncoder(object):
     """Store a moving picture made out of ANSI frames. Format adapted from
-    https://github.com/asciinema/asciinema/blob/master/doc/asciicast-v1.md"""
+    https://github.com/asciinema/asciinema/blob/master/doc/asciicast-v1.md
+
+    Frames are written out as they are captured, so memory use doesn't
+    grow with the length of the recording: the file starts with the
+    "stdout" events, and close() appends the rest of the header (whose
+    width, height and duration are only known at the end). Until
+    then, the file is not valid JSON.
+
+    By default, every event clears the screen and prints a whole
+    frame. With `keyframe_interval` set, only every that many frames
+    (starting with the first) is written this way, and the events in
+    between just rewrite the cells that changed since the previous
+    frame, using cursor movements. Players show the same thing either
+    way, but toy_text and algorithmic envs, whose frames differ by a
+    few cells, then take several times less space.
+
+    Args:
+        output_path (str): Where to write the recording
+        frames_per_sec (int): Frame rate of the env
+        keyframe_interval (Optional[int]): Write whole frames only this often
+    """
 
-    def __init__(self, output_path, frames_per_sec):
+    def __init__(self, output_path, frames_per_sec, keyframe_interval=None):
         self.output_path = output_path
         self.frames_per_sec = frames_per_sec
-        self.frames = []
+        self.keyframe_interval = keyframe_interval
+        #self.frame_duration = float(1) / self.frames_per_sec
+        self.frame_duration = .5
+        self.frame_count = 0
+        self.width = 0
+        self.height = 0
+        # With keyframe_interval, the cells of the previous frame, and
+        # the style it leaves in effect
+        self._rows = None
+        self._trailing_style = ''
+        self._file = open(output_path, 'w')
+        self._file.write('{"stdout": [')
 
     def capture_frame(self, frame):
         string = None
@@ -190,43 +323,153 @@ class TextEncoder(object):
         if '\r\n' in string:
             raise error.InvalidFrame('Frame contains carriage returns (only newlines are allowed: """{}"""'.format(string))
 
-        self.frames.append(string)
+        event = (self.frame_duration, self._encode(string))
+        if self.frame_count > 0:
+            self._file.write(', ')
+        self._file.write(json.dumps(event))
+        self.frame_count += 1
 
-    def close(self):
-        #frame_duration = float(1) / self.frames_per_sec
-        frame_duration = .5
+        # Track the frame size of the largest frames
+        self.height = max(self.height, string.count('\n'))
+        self.width = max(self.width, max(len(line) for line in string.split('\n')))
 
-        # Turn frames into events: clear screen beforehand
+    def _encode(self, string):
+        """The terminal output that displays the frame"""
+        # Turn the frame into an event: clear screen beforehand
         # https://rosettacode.org/wiki/Terminal_control/Clear_the_screen#Python
         # https://rosettacode.org/wiki/Terminal_control/Cursor_positioning#Python
         clear_code = "%c[2J\033[1;1H" % (27)
-        events = [ (frame_duration, clear_code+frame.replace('\n','\r\n')) for frame in self.frames ]
-
-        # Calculate frame size from the largest frames.
-        # Add some padding since we'll get cut off otherwise.
-        height = max([frame.count('\n') for frame in self.frames]) + 1
-        width = max([max([len(line) for line in frame.split('\n')])]) + 2
+        keyframe = clear_code+string.replace('\n','\r\n')
+        if self.keyframe_interval is None:
+            return keyframe
+
+        rows = []
+        style = ''
+        for line in string.split('\n')[:-1]:
+            cells, style = _parse_ansi_line(line, style)
+            if cells is None:
+                # Can't diff this one; start over from a keyframe
+                self._rows = None
+                return keyframe
+            rows.append(cells)
+
+        if self._rows is None or self.frame_count % self.keyframe_interval == 0:
+            output = keyframe
+        else:
+            output = _ansi_delta(self._rows, rows)
+            if self._trailing_style:
+                output = '\x1b[0m' + output
+        self._rows = rows
+        self._trailing_style = style
+        return output
 
-        data = {
+    def close(self):
+        # Add some padding to the frame size since we'll get cut off otherwise.
+        header = {
             "version": 1,
-            "width": width,
-            "height": height,
-            "duration": len(self.frames)*frame_duration,
+            "width": self.width + 2,
+            "height": self.height + 1,
+            "duration": self.frame_count*self.frame_duration,
             "command": "-",
             "title": "gym VideoRecorder episode",
             "env": {}, # could add some env metadata here
-            "stdout": events,
         }
-
-        with open(self.output_path, 'w') as f:
-            json.dump(data, f)
+        # Splice the header's fields in after the events
+        self._file.write('], ' + json.dumps(header)[1:])
+        self._file.close()
 
     @property
     def version_info(self):
-        return {'backend':'TextEncoder','version':1}
+        info = {'backend':'TextEncoder','version':1}
+        if self.keyframe_interval is not None:
+            info['keyframe_interval'] = self.keyframe_interval
+        return info
+
+# Probing for the encoder binary and asking it for its version each
+# take a subprocess or a PATH scan, so do each once per process.
+_backend = []
+_backend_versions = {}
+
+def find_backend():
+    """Returns 'ffmpeg' or 'avconv', whichever is installed, or None"""
+    if not _backend:
+        if distutils.spawn.find_executable('ffmpeg') is not None:
+            _backend.append('ffmpeg')
+        elif distutils.spawn.find_executable('avconv') is not None:
+            _backend.append('avconv')
+        else:
+            _backend.append(None)
+    return _backend[0]
+
+def backend_version(backend):
+    if backend not in _backend_versions:
+        _backend_versions[backend] = subprocess.check_output([backend, '-version'])
+    return _backend_versions[backend]
+
+def frame_layout(frame):
+    """Works out how `frame`'s pixels can be handed to the encoder
+    without copying them, returning (pix_fmt, vflip, array): the
+    encoder's input pixel format, whether it must flip the image
+    vertically, and the C-contiguous array whose bytes to send.
+
+    Besides contiguous frames, this recognizes (h, w, 3) views of the
+    first three channels of an (h, w, 4) buffer -- as returned by
+    Viewer.get_array (rows flipped, since OpenGL reads bottom-up) and
+    atari's to_rgb (channels reversed, since ALE writes BGRA) -- and
+    sends the whole buffer as RGBA/BGRA. Returns None for any other
+    layout, which then needs a copy.
+    """
+    if not isinstance(frame, np.ndarray) or frame.dtype != np.uint8 or frame.ndim != 3:
+        return None
+    if frame.flags.c_contiguous:
+        return ('rgb32' if frame.shape[-1] == 4 else 'rgb24'), False, frame
+
+    base = frame.base
+    if frame.shape[2] != 3 or not isinstance(base, np.ndarray) or \
+       base.dtype != np.uint8 or not base.flags.c_contiguous:
+        return None
+    h, w = frame.shape[:2]
+    if base.size != h * w * 4:
+        return None
+    vflip = frame.strides[0] < 0
+    reverse = frame.strides[2] < 0
+    if frame.strides != ((-4*w if vflip else 4*w), 4, (-1 if reverse else 1)):
+        return None
+    offset = frame.__array_interface__['data'][0] - base.__array_interface__['data'][0]
+    if offset != (h-1) * w * 4 * vflip + 2 * reverse:
+        return None
+    return ('bgra' if reverse else 'rgba'), vflip, base
+
+def frame_data(frame, pix_fmt, vflip, copy=False):
+    """Returns `frame`'s pixels laid out for an encoder fed with
+    pix_fmt (and flipping them back if vflip is set). If the frame is
+    already laid out that way (see frame_layout) and `copy` is not
+    set, this is a buffer over the frame's own memory, valid only as
+    long as that isn't overwritten."""
+    layout = frame_layout(frame)
+    if layout is not None and layout[:2] == (pix_fmt, vflip):
+        array = layout[2]
+        return array.tobytes() if copy else array.data
+
+    if vflip:
+        frame = frame[::-1]
+    if pix_fmt in ('rgba', 'bgra'):
+        converted = np.zeros(frame.shape[:2] + (4,), dtype=np.uint8)
+        converted[:, :, :3] = frame[:, :, ::-1] if pix_fmt == 'bgra' else frame
+        return converted.tobytes()
+    return np.ascontiguousarray(frame).tobytes()
 
 class ImageEncoder(object):
-    def __init__(self, output_path, frame_shape, frames_per_sec):
+    """Pipes raw frames into an ffmpeg (or avconv) process.
+
+    Args:
+        output_path (str): Where to write the video
+        frame_shape (tuple): The (h, w, 3) or (h, w, 4) shape of every frame
+        frames_per_sec (int): The video's frame rate
+        input_layout (Optional[tuple]): The (pix_fmt, vflip) to feed the encoder, as given by frame_layout; pick the layout of the frames you'll capture to avoid copying them
+    """
+
+    def __init__(self, output_path, frame_shape, frames_per_sec, input_layout=None):
         self.proc = None
         self.output_path = output_path
         # Frame shape should be lines-first, so w and h are swapped
@@ -237,19 +480,20 @@ class ImageEncoder(object):
         self.includes_alpha = (pixfmt == 4)
         self.frame_shape = frame_shape
         self.frames_per_sec = frames_per_sec
+        self.final_path = None
+        if input_layout is None:
+            input_layout = ('rgb32' if self.includes_alpha else 'rgb24'), False
+        self.pix_fmt, self.vflip = input_layout
 
-        if distutils.spawn.find_executable('ffmpeg') is not None:
-            self.backend = 'ffmpeg'
-        elif distutils.spawn.find_executable('avconv') is not None:
-            self.backend = 'avconv'
-        else:
+        self.backend = find_backend()
+        if self.backend is None:
             raise error.DependencyNotInstalled("""Found neither the ffmpeg nor avconv executables. On OS X, you can install ffmpeg via `brew install ffmpeg`. On most Ubuntu variants, `sudo apt-get install ffmpeg` should do it. On Ubuntu 14.04, however, you'll need to install avconv with `sudo apt-get install libav-tools`.""")
 
         self.start()
 
     @property
     def version_info(self):
-        return {'backend':self.backend,'version':subprocess.check_output([self.backend, '-version']),'cmdline':self.cmdline}
+        return {'backend':self.backend,'version':backend_version(self.backend),'cmdline':self.cmdline}
 
     def start(self):
         self.cmdline = (self.backend,
@@ -261,10 +505,11 @@ class ImageEncoder(object):
                      # input
                      '-f', 'rawvideo',
                      '-s:v', '{}x{}'.format(*self.wh),
-                     '-pix_fmt',('rgb32' if self.includes_alpha else 'rgb24'),
+                     '-pix_fmt', self.pix_fmt,
                      '-i', '/dev/stdin',
 
                      # output
+                     ) + (('-vf', 'vflip') if self.vflip else ()) + (
                      '-vcodec', 'libx264',
                      '-pix_fmt', 'yuv420p',
                      self.output_path
@@ -274,17 +519,193 @@ class ImageEncoder(object):
         self.proc = subprocess.Popen(self.cmdline, stdin=subprocess.PIPE)
 
     def capture_frame(self, frame):
+        self.write_frame(self.prepare_frame(frame))
+
+    def _check_frame(self, frame):
         if not isinstance(frame, (np.ndarray, np.generic)):
             raise error.InvalidFrame('Wrong type {} for {} (must be np.ndarray or np.generic)'.format(type(frame), frame))
         if frame.shape != self.frame_shape:
-            raise error.InvalidFrame("Your frame has shape {}, but the VideoRecorder is configured for shape {}.".format(frame_shape, self.frame_shape))
+            raise error.InvalidFrame("Your frame has shape {}, but the VideoRecorder is configured for shape {}.".format(frame.shape, self.frame_shape))
         if frame.dtype != np.uint8:
             raise error.InvalidFrame("Your frame has data type {}, but we require uint8 (i.e. RGB values from 0-255).".format(frame.dtype))
 
-        self.proc.stdin.write(frame.tobytes())
+    def prepare_frame(self, frame, copy=False):
+        """Checks the frame, and returns the bytes that capture_frame
+        would send to the encoder (see frame_data)."""
+        self._check_frame(frame)
+        return frame_data(frame, self.pix_fmt, self.vflip, copy=copy)
+
+    def write_frame(self, data):
+        """Sends bytes from prepare_frame to the encoder."""
+        self.proc.stdin.write(data)
+
+    def retarget(self, output_path):
+        """Makes close() move the finished video to output_path. Used
+        by ImageEncoderPool to hand out encoders started ahead of
+        time."""
+        self.final_path = output_path
 
     def close(self):
         self.proc.stdin.close()
         ret = self.proc.wait()
         if ret != 0:
             logger.error("VideoRecorder encoder exited with status {}".format(ret))
+        if self.final_path is not None and os.path.exists(self.output_path):
+            os.rename(self.output_path, self.final_path)
+            self.output_path, self.final_path = self.final_path, None
+
+    def discard(self):
+        """Stops the encoder without producing a video."""
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.stdin.close()
+        self.proc.wait()
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+
+class ImageEncoderPool(object):
+    """Hands out ImageEncoders whose encoder process is already
+    running, so that starting a video doesn't wait on spawning one.
+
+    For every (frame shape, frames per second, output directory, input
+    layout) that
+    has been asked for, the pool keeps one spare encoder, started in
+    the background and writing to a hidden temporary file in that
+    directory. acquire() hands out the spare, retargeted so that its
+    video is renamed to the requested path when it is closed, and
+    starts a new spare in its place. Each episode still gets its own
+    process and file; only the startup is moved off the critical path.
+
+    Call close() to stop the spares.
+    """
+
+    def __init__(self):
+        self._spares = {}
+        self._count = 0
+
+    def acquire(self, output_path, frame_shape, frames_per_sec, input_layout=None):
+        directory = os.path.dirname(os.path.abspath(output_path))
+        key = (tuple(frame_shape), frames_per_sec, directory, input_layout)
+        spare = self._spares.pop(key, None)
+        encoder = spare.get() if spare is not None else None
+        if encoder is not None and encoder.proc.poll() is not None:
+            logger.warn('Spare video encoder exited early with status %s; starting a new one', encoder.proc.returncode)
+            encoder.discard()
+            encoder = None
+
+        if encoder is None:
+            encoder = ImageEncoder(output_path, frame_shape, frames_per_sec, input_layout)
+        else:
+            encoder.retarget(output_path)
+
+        self._count += 1
+        spare_path = os.path.join(directory, '.openaigym.spare.{}.{}.{}.mp4'.format(os.getpid(), id(self), self._count))
+        self._spares[key] = _SpareEncoder(spare_path, frame_shape, frames_per_sec, input_layout)
+        return encoder
+
+    def close(self):
+        spares, self._spares = self._spares, {}
+        for spare in spares.values():
+            encoder = spare.get()
+            if encoder is not None:
+                encoder.discard()
+
+class _SpareEncoder(object):
+    """Starts an ImageEncoder on a background thread."""
+
+    def __init__(self, *args):
+        self._encoder = None
+        self._thread = threading.Thread(target=self._start, args=args)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _start(self, *args):
+        try:
+            self._encoder = ImageEncoder(*args)
+        except Exception as e:
+            logger.error('Could not start a spare video encoder: %s', e)
+
+    def get(self):
+        """Waits for the encoder, returning None if it failed to start"""
+        self._thread.join()
+        return self._encoder
+
+class AsyncEncoder(object):
+    """Wraps an ImageEncoder so that frames are written to it by a
+    background thread, through a queue of at most `max_queued_frames`.
+
+    capture_frame still checks each frame (raising InvalidFrame right
+    away) and copies it, since the env may reuse its frame buffer; the
+    slow write into the encoder process happens on the thread.
+
+    When the queue is full, `backpressure` decides what happens:
+
+        'block': wait for room, so no frame is lost
+        'drop_oldest': discard the longest-waiting frame
+        'drop_newest': discard the frame being captured
+
+    Dropped frames are counted in `dropped_frames`. close() waits for
+    every queued frame to be written before closing the encoder.
+    """
+
+    BACKPRESSURE_MODES = ['block', 'drop_oldest', 'drop_newest']
+
+    def __init__(self, encoder, max_queued_frames=64, backpressure='block'):
+        if backpressure not in self.BACKPRESSURE_MODES:
+            raise error.Error('Unsupported backpressure mode {!r}; expected one of {}'.format(backpressure, self.BACKPRESSURE_MODES))
+        self.encoder = encoder
+        self.backpressure = backpressure
+        self.dropped_frames = 0
+        self.failure = None
+        self._queue = six.moves.queue.Queue(maxsize=max_queued_frames)
+        self._thread = threading.Thread(target=self._run, name='AsyncEncoder({})'.format(getattr(encoder, 'output_path', '')))
+        self._thread.daemon = True
+        self._thread.start()
+
+    @property
+    def version_info(self):
+        return self.encoder.version_info
+
+    def capture_frame(self, frame):
+        data = self.encoder.prepare_frame(frame, copy=True)
+        if self.failure is not None:
+            # The encoder is gone; nothing will drain the queue
+            return
+        if self.backpressure == 'block':
+            self._queue.put(data)
+        elif self.backpressure == 'drop_newest':
+            try:
+                self._queue.put_nowait(data)
+            except six.moves.queue.Full:
+                self.dropped_frames += 1
+        else:
+            while True:
+                try:
+                    self._queue.put_nowait(data)
+                    break
+                except six.moves.queue.Full:
+                    try:
+                        self._queue.get_nowait()
+                        self.dropped_frames += 1
+                    except six.moves.queue.Empty:
+                        pass
+
+    def _run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            if self.failure is not None:
+                continue
+            try:
+                self.encoder.write_frame(data)
+            except Exception as e:
+                logger.error('Video encoder failed while writing a frame, dropping the rest: %s', e)
+                self.failure = e
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self.dropped_frames:
+            logger.warn('Dropped %d video frames because the encoder could not keep up', self.dropped_frames)
+        self.encoder.close()
@@ -1,6 +1,9 @@
 """A set of common utilities used within the environments. These are
 not intended as API functions, and will not remain stable over time.
 """
+import contextlib
+import os
+import threading
 
 color2num = dict(
     gray=30,
@@ -53,3 +56,26 @@ class EzPickle(object):
     def __setstate__(self, d):
         out = type(self)(*d["_ezpickle_args"], **d["_ezpickle_kwargs"])
         self.__dict__.update(out.__dict__)
+
+@contextlib.contextmanager
+def atomic_write(path, mode='w'):
+    """Opens a temporary file next to `path` for writing, and renames it
+    to `path` once the with block completes, so readers only ever see
+    the complete file (or none). If the block raises, the temporary
+    file is removed and `path` is left alone.
+
+    The temporary file's name starts with a dot, so that scans for our
+    'openaigym.' prefix don't pick it up.
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, '.{}.{}.{}.tmp'.format(name, os.getpid(), threading.current_thread().ident))
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, path)
+    except:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
@@ -0,0 +1,13 @@
+from gym.vector.vector_env import VectorEnv, SyncVectorEnv, BatchedVectorEnv
+from gym.vector.subproc_vector_env import SubprocVectorEnv
+
+def make(id, num_envs, asynchronous=False, **kwargs):
+    """Make a vectorized environment holding `num_envs` copies of the
+    registered environment `id`. With asynchronous=True, the copies
+    are spread across worker processes (see SubprocVectorEnv for the
+    extra keyword arguments)."""
+    if asynchronous:
+        return SubprocVectorEnv(id, num_envs, **kwargs)
+    return SyncVectorEnv(id, num_envs, **kwargs)
+
+__all__ = ["VectorEnv", "SyncVectorEnv", "BatchedVectorEnv", "SubprocVectorEnv", "make"]
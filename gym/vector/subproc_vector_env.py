@@ -0,0 +1,197 @@
+import ctypes
+import logging
+import multiprocessing
+import numpy as np
+import random
+import traceback
+
+from gym import configuration, error
+from gym.vector.vector_env import VectorEnv, SyncVectorEnv, _lookup_spec
+
+logger = logging.getLogger(__name__)
+
+def _worker(remote, parent_remote, env_id, num_envs, seed, obs_buffer, obs_shape, obs_dtype, start):
+    """Runs in the child process: owns a SyncVectorEnv over a contiguous
+    slice of the sub-environments and writes its observations straight
+    into the shared buffer."""
+    parent_remote.close()
+    # Forked children inherit the parent's RNG state, so every worker
+    # would otherwise produce the same trajectories.
+    if seed is None:
+        configuration.seed()
+    else:
+        random.seed(seed)
+        np.random.seed(seed)
+    try:
+        venv = SyncVectorEnv(env_id, num_envs)
+        shared = np.frombuffer(obs_buffer, dtype=obs_dtype).reshape(obs_shape)
+        venv._observations = shared[start:start+num_envs]
+        remote.send((True, None))
+    except Exception:
+        remote.send((False, traceback.format_exc()))
+        remote.close()
+        return
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            try:
+                if cmd == 'step':
+                    infos = venv._step_all(data)
+                    result = (venv._rewards, venv._dones, infos)
+                elif cmd == 'reset':
+                    venv._reset_all()
+                    result = None
+                elif cmd == 'close':
+                    venv.close()
+                    remote.send((True, None))
+                    break
+                else:
+                    raise error.Error('Unknown command: {}'.format(cmd))
+            except Exception:
+                remote.send((False, traceback.format_exc()))
+            else:
+                remote.send((True, result))
+    except (KeyboardInterrupt, EOFError):
+        pass
+    finally:
+        remote.close()
+
+class SubprocVectorEnv(VectorEnv):
+    """Spreads `num_envs` copies of an environment across worker
+    processes, so that pure-Python environments can use more than one
+    core.
+
+    Each worker owns a contiguous slice of the sub-environments, which
+    it creates from the registry by ID. Actions, rewards, dones and
+    infos travel over a pipe per worker; observations are written by
+    the workers into one shared-memory buffer, so they are never
+    pickled.
+
+    Use `step_async` and `step_wait` to overlap your own computation
+    with environment stepping:
+
+        venv.step_async(actions)
+        ... # e.g. update your model
+        obs, rewards, dones, infos = venv.step_wait()
+
+    Args:
+        spec (str or EnvSpec): The ID or spec of a registered environment
+        num_envs (int): How many copies to hold
+        num_workers (Optional[int]): How many processes to spread them across (defaults to one per core, at most num_envs)
+        seed (Optional[int]): If given, worker i seeds its RNGs with seed+i; otherwise every worker seeds from the OS randomness source
+    """
+
+    def __init__(self, spec, num_envs, num_workers=None, seed=None):
+        # Until the workers are up there's nothing to close, even if
+        # __del__ runs on a half-built instance
+        self.closed = True
+        if num_envs < 1:
+            raise error.Error('A vectorized environment needs at least one sub-environment, but num_envs={}'.format(num_envs))
+        self.spec = _lookup_spec(spec)
+        self.num_envs = num_envs
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        num_workers = max(1, min(num_workers, num_envs))
+
+        # Probe a single copy for the spaces and the observation
+        # layout, so we can size the shared buffer before forking.
+        probe = self.spec.make()
+        self.action_space = probe.action_space
+        self.observation_space = probe.observation_space
+        observation = np.asarray(probe._reset())
+        try:
+            probe.render(close=True)
+        except Exception:
+            pass
+        del probe
+
+        obs_shape = (num_envs,) + observation.shape
+        obs_dtype = observation.dtype
+        obs_buffer = multiprocessing.RawArray(ctypes.c_char, int(np.prod(obs_shape)) * obs_dtype.itemsize)
+        self._observations = np.frombuffer(obs_buffer, dtype=obs_dtype).reshape(obs_shape)
+
+        sizes = [len(chunk) for chunk in np.array_split(np.arange(num_envs), num_workers)]
+        self._slices = []
+        self._remotes = []
+        self._processes = []
+        start = 0
+        for i, size in enumerate(sizes):
+            remote, worker_remote = multiprocessing.Pipe()
+            worker_seed = None if seed is None else seed + i
+            process = multiprocessing.Process(
+                target=_worker,
+                args=(worker_remote, remote, self.spec.id, size, worker_seed, obs_buffer, obs_shape, obs_dtype, start))
+            process.daemon = True # if the main process crashes, we should not cause things to hang
+            process.start()
+            worker_remote.close()
+            self._slices.append(slice(start, start + size))
+            self._remotes.append(remote)
+            self._processes.append(process)
+            start += size
+        self.closed = False
+        self.waiting = False
+        self.needs_reset = True
+        self._receive_all()
+
+    def _reset(self):
+        self._assert_not_waiting()
+        for remote in self._remotes:
+            remote.send(('reset', None))
+        self._receive_all()
+        self.needs_reset = False
+        return self._observations.copy()
+
+    def _step_async(self, actions):
+        self._assert_not_waiting()
+        if self.needs_reset:
+            raise error.ResetNeeded("Trying to step a vectorized environment before reset. You must call 'reset()' before taking an initial step.")
+        for remote, s in zip(self._remotes, self._slices):
+            remote.send(('step', actions[s]))
+        self.waiting = True
+
+    def _step_wait(self):
+        if not self.waiting:
+            raise error.Error('Called step_wait() without a pending step_async()')
+        # Cleared first: _receive_all reads every reply even when a
+        # worker failed, so there is nothing left to wait for
+        self.waiting = False
+        results = self._receive_all()
+        rewards = np.concatenate([r for r, _, _ in results])
+        dones = np.concatenate([d for _, d, _ in results])
+        infos = [info for _, _, i in results for info in i]
+        return self._observations.copy(), rewards, dones, infos
+
+    def _close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            if self.waiting:
+                self._receive_all()
+            for remote in self._remotes:
+                remote.send(('close', None))
+            self._receive_all()
+        except (error.Error, EOFError, IOError) as e:
+            logger.error('Error while closing %s: %s', self, e)
+        for process in self._processes:
+            process.join()
+        for remote in self._remotes:
+            remote.close()
+
+    def _receive_all(self):
+        results = []
+        failures = []
+        for remote in self._remotes:
+            ok, result = remote.recv()
+            if ok:
+                results.append(result)
+            else:
+                failures.append(result)
+        if failures:
+            raise error.Error('Worker of {} raised an exception:\n{}'.format(self, failures[0]))
+        return results
+
+    def _assert_not_waiting(self):
+        if self.waiting:
+            raise error.Error('Called reset() or step_async() while waiting for a pending step; call step_wait() first')
@@ -0,0 +1,125 @@
+import threading
+
+import numpy as np
+
+from gym import envs, error
+from gym.vector import SyncVectorEnv, SubprocVectorEnv
+
+def test_stacked_shapes():
+    venv = SyncVectorEnv('CartPole-v0', 3)
+    obs = venv.reset()
+    assert obs.shape == (3, 4)
+    obs, rewards, dones, infos = venv.step([venv.action_space.sample() for _ in xrange(3)])
+    assert obs.shape == (3, 4)
+    assert rewards.shape == (3,) and rewards.dtype == np.float64
+    assert dones.shape == (3,) and dones.dtype == np.bool_
+    assert len(infos) == 3
+    venv.close()
+
+def test_discrete_observations():
+    venv = SyncVectorEnv(envs.spec('FrozenLake-v0'), 4)
+    obs = venv.reset()
+    assert obs.shape == (4,)
+    assert (obs == 0).all()
+
+def test_auto_reset_and_timestep_limit():
+    venv = SyncVectorEnv('Pendulum-v0', 2)
+    venv.reset()
+    limit = venv.spec.timestep_limit
+    for t in xrange(limit):
+        obs, rewards, dones, infos = venv.step(np.zeros((2, 1)))
+        if t < limit - 1:
+            assert not dones.any()
+    # Pendulum never terminates on its own, so this is the timestep limit
+    assert dones.all()
+    for info in infos:
+        assert info['terminal_observation'].shape == (3,)
+
+def test_step_before_reset():
+    venv = SyncVectorEnv('CartPole-v0', 2)
+    try:
+        venv.step([0, 0])
+    except error.ResetNeeded:
+        pass
+    else:
+        assert False
+
+def test_wrong_number_of_actions():
+    venv = SyncVectorEnv('CartPole-v0', 2)
+    venv.reset()
+    try:
+        venv.step([0])
+    except error.Error:
+        pass
+    else:
+        assert False
+
+def test_subproc_matches_sync():
+    venv = SubprocVectorEnv('CartPole-v0', 5, num_workers=2, seed=0)
+    try:
+        obs = venv.reset()
+        assert obs.shape == (5, 4)
+        for _ in xrange(50):
+            venv.step_async(np.ones(5, dtype=int))
+            obs, rewards, dones, infos = venv.step_wait()
+            assert obs.shape == (5, 4)
+            assert rewards.shape == (5,) and (rewards == 1.0).all()
+            assert dones.shape == (5,)
+            assert len(infos) == 5
+            for i in np.nonzero(dones)[0]:
+                assert 'terminal_observation' in infos[i]
+        # Workers are seeded differently, so they shouldn't all agree
+        assert not (obs == obs[0]).all()
+    finally:
+        venv.close()
+    assert all(not p.is_alive() for p in venv._processes)
+
+def test_subproc_discrete_observations():
+    venv = SubprocVectorEnv('FrozenLake-v0', 3, num_workers=3)
+    try:
+        obs = venv.reset()
+        assert obs.shape == (3,)
+        obs, rewards, dones, infos = venv.step([0, 1, 2])
+        assert obs.shape == (3,)
+    finally:
+        venv.close()
+
+def test_subproc_close_after_worker_error():
+    venv = SubprocVectorEnv('CartPole-v0', 2, num_workers=2)
+    venv.reset()
+    try:
+        # CartPole asserts its actions are valid
+        venv.step([0, 5])
+    except error.Error:
+        pass
+    else:
+        assert False
+    assert not venv.waiting
+    # close() used to wait for replies that had already been read
+    closer = threading.Thread(target=venv.close)
+    closer.daemon = True
+    closer.start()
+    closer.join(10)
+    assert not closer.is_alive()
+
+def test_subproc_step_before_reset():
+    venv = SubprocVectorEnv('CartPole-v0', 2, num_workers=1)
+    try:
+        venv.step([0, 0])
+    except error.ResetNeeded:
+        pass
+    else:
+        assert False
+    finally:
+        venv.close()
+
+def test_subproc_needs_an_env():
+    venv = SubprocVectorEnv.__new__(SubprocVectorEnv)
+    try:
+        venv.__init__('CartPole-v0', 0)
+    except error.Error:
+        pass
+    else:
+        assert False, 'Expected num_envs=0 to be rejected'
+    # As __del__ does on the half-built instance
+    venv.close()
@@ -0,0 +1,275 @@
+import logging
+import numpy as np
+import six
+
+from gym import error
+from gym.envs.registration import EnvSpec, registry
+
+logger = logging.getLogger(__name__)
+
+class VectorEnv(object):
+    """Steps a batch of independent copies of an environment in lockstep.
+
+    The main API methods that users of this class need to know are:
+
+        reset
+        step
+        step_async
+        step_wait
+        close
+
+    Observations, rewards and dones are returned stacked along a
+    leading axis of size `num_envs`. A sub-environment whose episode
+    ends is automatically reset; the observation returned for it is
+    then the first observation of its next episode, and the final
+    observation of the finished episode is stored in its info dict
+    under 'terminal_observation'.
+
+    When implementing a vectorized environment, override the following
+    methods in your subclass:
+
+        _reset
+        _step_async
+        _step_wait
+        _close
+        _render (optional)
+
+    And set the following attributes:
+
+        num_envs: The number of sub-environments
+        action_space: The Space object corresponding to valid actions of a single sub-environment
+        observation_space: The Space object corresponding to valid observations of a single sub-environment
+    """
+
+    num_envs = None
+    action_space = None
+    observation_space = None
+
+    # Override in ALL subclasses
+    def _reset(self): raise NotImplementedError
+    def _step_async(self, actions): raise NotImplementedError
+    def _step_wait(self): raise NotImplementedError
+    def _close(self): pass
+    def _render(self, mode): raise error.UnsupportedMode('{} does not support rendering (requested mode: {})'.format(self, mode))
+
+    def reset(self):
+        """Resets every sub-environment.
+
+        Outputs
+        -------
+        observations (np.ndarray): the stacked initial observations, of shape (num_envs,) + observation shape
+        """
+        return self._reset()
+
+    def step_async(self, actions):
+        """Starts stepping every sub-environment with the given
+        actions. Call `step_wait()` to collect the results; in between
+        you are free to do other work.
+
+        Input
+        -----
+        actions : a sequence of `num_envs` actions, one per sub-environment
+        """
+        if len(actions) != self.num_envs:
+            raise error.Error('Expected {} actions, but got {}'.format(self.num_envs, len(actions)))
+        self._step_async(actions)
+
+    def step_wait(self):
+        """Waits for the step started by `step_async()`.
+
+        Outputs
+        -------
+        (observations, rewards, dones, infos)
+
+        observations (np.ndarray): the stacked observations
+        rewards (np.ndarray): float array of shape (num_envs,)
+        dones (np.ndarray): boolean array of shape (num_envs,)
+        infos (list): one info dict per sub-environment
+        """
+        return self._step_wait()
+
+    def step(self, actions):
+        """Run one timestep of every sub-environment. Equivalent to
+        `step_async(actions)` followed by `step_wait()`.
+        """
+        self.step_async(actions)
+        return self.step_wait()
+
+    def render(self, mode='rgb_array'):
+        """Renders every sub-environment.
+
+        Outputs
+        -------
+        frames (np.ndarray): for mode='rgb_array', the stacked frames, of shape (num_envs, height, width, 3)
+        """
+        return self._render(mode)
+
+    def close(self):
+        """Release any resources (rendering windows, worker processes)."""
+        self._close()
+
+    def __del__(self):
+        self.close()
+
+    def __str__(self):
+        return '<{}({}) instance>'.format(type(self).__name__, self.num_envs)
+
+def _lookup_spec(spec):
+    if isinstance(spec, six.string_types):
+        return registry.spec(spec)
+    elif isinstance(spec, EnvSpec):
+        return spec
+    raise error.Error('Expected an environment ID or EnvSpec, but got {!r}'.format(spec))
+
+class SyncVectorEnv(VectorEnv):
+    """Holds `num_envs` copies of an environment in the current process and
+    steps them one after the other.
+
+    The copies are built via `EnvSpec.make()`. They are stepped
+    through their underscored `_step`/`_reset` methods, so none of the
+    per-call monitor bookkeeping of `Env.step` is paid. Instead, the
+    spec's `timestep_limit` is enforced here the same way
+    `Monitor._after_step` does: an episode is marked done on the step
+    which would exceed the limit.
+
+    Args:
+        spec (str or EnvSpec): The ID or spec of the environment to copy
+        num_envs (int): How many copies to hold
+
+    Example:
+
+        venv = SyncVectorEnv('CartPole-v0', 16)
+        obs = venv.reset()
+        obs, rewards, dones, infos = venv.step([venv.action_space.sample() for _ in xrange(16)])
+    """
+
+    def __init__(self, spec, num_envs):
+        if num_envs < 1:
+            raise error.Error('A vectorized environment needs at least one sub-environment, but num_envs={}'.format(num_envs))
+        self.spec = _lookup_spec(spec)
+        self.num_envs = num_envs
+        self.envs = [self.spec.make() for _ in range(num_envs)]
+        self.action_space = self.envs[0].action_space
+        self.observation_space = self.envs[0].observation_space
+        self.timestep_limit = self.spec.timestep_limit
+
+        self._observations = None
+        self._rewards = np.zeros(num_envs, dtype=np.float64)
+        self._dones = np.zeros(num_envs, dtype=np.bool_)
+        self._elapsed_steps = np.zeros(num_envs, dtype=np.int64)
+        self._actions = None
+
+    def _reset(self):
+        self._reset_all()
+        return self._observations.copy()
+
+    def _step_async(self, actions):
+        self._actions = actions
+
+    def _step_wait(self):
+        if self._observations is None:
+            raise error.ResetNeeded("Trying to step a vectorized environment before reset. You must call 'reset()' before taking an initial step.")
+        actions, self._actions = self._actions, None
+        infos = self._step_all(actions)
+        return self._observations.copy(), self._rewards.copy(), self._dones.copy(), infos
+
+    # The following two write straight into the preallocated buffers
+    # without copying them out, which lets subprocess workers point
+    # _observations at shared memory.
+
+    def _reset_all(self):
+        self._elapsed_steps[:] = 0
+        for i, env in enumerate(self.envs):
+            self._store_observation(i, env._reset())
+
+    def _step_all(self, actions):
+        infos = []
+        for i, env in enumerate(self.envs):
+            observation, reward, done, info = env._step(actions[i])
+            # Add 1 since we just took another step
+            self._elapsed_steps[i] += 1
+            if self.timestep_limit is not None and self._elapsed_steps[i] >= self.timestep_limit:
+                done = True
+            if done:
+                info = dict(info, terminal_observation=observation)
+                observation = env._reset()
+                self._elapsed_steps[i] = 0
+            self._store_observation(i, observation)
+            self._rewards[i] = reward
+            self._dones[i] = done
+            infos.append(info)
+        return infos
+
+    def _store_observation(self, i, observation):
+        if self._observations is None:
+            # Size the buffer from the first observation we see
+            observation = np.asarray(observation)
+            self._observations = np.zeros((self.num_envs,) + observation.shape, dtype=observation.dtype)
+        self._observations[i] = observation
+
+    def _render(self, mode):
+        if mode != 'rgb_array':
+            return super(SyncVectorEnv, self)._render(mode)
+        return np.stack([env.render(mode=mode) for env in self.envs])
+
+    def _close(self):
+        for env in getattr(self, 'envs', []):
+            try:
+                env.render(close=True)
+            except Exception as e:
+                # As in Monitor.close, failing to close a renderer
+                # shouldn't stop us from closing the rest.
+                logger.error('Could not close renderer for %s: %s', self.spec.id, e)
+        self.envs = []
+
+class BatchedVectorEnv(VectorEnv):
+    """Base class for environments whose dynamics are written directly
+    against a (num_envs, ...) array of states, instead of looping over
+    scalar copies.
+
+    Subclasses hold their state in arrays and override:
+
+        _reset_rows(rows): draw new initial states for the given row indices (in increasing order)
+        _step_batch(actions): advance every row, returning (rewards, dones) arrays
+        _get_obs(): the stacked observations for the current states
+
+    This class takes care of the bookkeeping shared with
+    SyncVectorEnv: the optional `timestep_limit`, the
+    'terminal_observation' info entry, and resetting only the rows
+    whose episodes ended.
+    """
+
+    timestep_limit = None
+
+    def _reset_rows(self, rows): raise NotImplementedError
+    def _step_batch(self, actions): raise NotImplementedError
+    def _get_obs(self): raise NotImplementedError
+
+    def _reset(self):
+        self._elapsed_steps = np.zeros(self.num_envs, dtype=np.int64)
+        self._reset_rows(np.arange(self.num_envs))
+        return self._get_obs()
+
+    def _step_async(self, actions):
+        self._actions = np.asarray(actions)
+
+    def _step_wait(self):
+        if getattr(self, '_elapsed_steps', None) is None:
+            raise error.ResetNeeded("Trying to step a vectorized environment before reset. You must call 'reset()' before taking an initial step.")
+        actions, self._actions = self._actions, None
+        rewards, dones = self._step_batch(actions)
+        # Add 1 since we just took another step
+        self._elapsed_steps += 1
+        if self.timestep_limit is not None:
+            dones |= self._elapsed_steps >= self.timestep_limit
+
+        observations = self._get_obs()
+        infos = [{} for _ in range(self.num_envs)]
+        if dones.any():
+            rows = np.nonzero(dones)[0]
+            for i in rows:
+                infos[i]['terminal_observation'] = observations[i].copy()
+            self._reset_rows(rows)
+            self._elapsed_steps[rows] = 0
+            observations[rows] = self._get_obs()[rows]
+        return observations, rewards, dones, infos